@@ -0,0 +1,81 @@
+import argparse
+import contextlib
+import io
+import logging
+import time
+from cache import ContainerMetricsCache
+from connections import SSHConnectionPool
+from main import run_cycle, suggest_migrations
+from simulator import SimulatedCluster
+
+DEFAULT_SIZES = '3x30,10x300,50x2500,200x10000,500x50000'
+
+def run_benchmark(hosts, containers, default_params, latency=0.0, handshake_latency=0.0, seed=0):
+    """
+    Run one balancing cycle against a simulated cluster and measure it.
+    :return: Dictionary with the cycle time, remote calls, handshakes, planner time and suggestion count.
+    """
+    cluster = SimulatedCluster(hosts, containers, seed=seed, latency=latency, handshake_latency=handshake_latency)
+    config = {'proxmox_hosts': cluster.hosts_config(load_per_core=0.75), 'default_params': default_params, 'api': {'transport': 'pvesh'}}
+    logger = logging.getLogger('benchmark')
+    cache = ContainerMetricsCache(ttl=3600)
+
+    with SSHConnectionPool(connect=cluster.connect) as pool, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        hosts_state, suggestions = run_cycle(config, pool, logger, cache=cache)
+        cycle_time = time.perf_counter() - start
+        calls = cluster.total_calls()
+        handshakes = cluster.handshakes
+
+        # Same planning again from the warm cache: no remote calls, only the planner itself
+        start = time.perf_counter()
+        suggest_migrations(hosts_state, default_params, pool=pool, cache=cache)
+        planner_time = time.perf_counter() - start
+
+    return {
+        'hosts': hosts,
+        'containers': containers,
+        'cycle_time': cycle_time,
+        'remote_calls': calls,
+        'calls_by_kind': dict(cluster.calls),
+        'handshakes': handshakes,
+        'planner_time': planner_time,
+        'suggestions': len(suggestions),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark collection and planning against a simulated Proxmox cluster.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"Comma separated HOSTSxCONTAINERS sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latency of every remote command")
+    parser.add_argument('--handshake-ms', type=float, default=0.0, help="Latency of every SSH handshake")
+    parser.add_argument('--collector', default='ssh', choices=('ssh', 'api', 'stream'))
+    parser.add_argument('--container-source', default='cgroup', choices=('cgroup', 'pct'))
+    parser.add_argument('--strategy', default='load_based', choices=('load_based', 'global'))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--shards', type=int, default=0, help="Shard planning from this many hosts on (0 disables)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Print the remote calls by command kind")
+    args = parser.parse_args()
+
+    default_params = {
+        'cpu_threshold': 1.0,  # Overridden per host: 0.75 load per core
+        'memory_threshold': 0.8,
+        'migration_strategy': args.strategy,
+        'collection_concurrency': args.concurrency,
+        'container_metrics_source': args.container_source,
+        'collector': args.collector,
+        'planning_shards': args.shards,
+    }
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'hosts':>6} {'CTs':>7} {'cycle (s)':>10} {'remote calls':>13} {'handshakes':>11} {'planner (s)':>12} {'suggestions':>12}")
+    for size in args.sizes.split(','):
+        hosts, containers = (int(value) for value in size.lower().split('x'))
+        result = run_benchmark(hosts, containers, default_params, args.latency_ms / 1000, args.handshake_ms / 1000, args.seed)
+        print(f"{result['hosts']:>6} {result['containers']:>7} {result['cycle_time']:>10.3f} {result['remote_calls']:>13} "
+              f"{result['handshakes']:>11} {result['planner_time']:>12.3f} {result['suggestions']:>12}")
+        if args.verbose:
+            print(f"       calls by kind: {result['calls_by_kind']}")
+
+if __name__ == "__main__":
+    main()
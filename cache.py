@@ -0,0 +1,115 @@
+import threading
+import time
+
+class ContainerMetricsCache:
+    """
+    Cycle-scoped snapshot cache of container configuration and metrics, keyed by (host, vmid).
+    Collection fills it once per container and every later scoring pass reads from it,
+    so no container is fetched from its host twice within the TTL.
+    The configured cores of each container are kept separately, without TTL: they stay valid as long
+    as the modification time of the container's config file does not change.
+    """
+
+    def __init__(self, ttl=60, clock=time.monotonic):
+        """
+        :param ttl: Seconds an entry stays valid.
+        :param clock: Monotonic clock function, replaceable for testing.
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self._configs = {}   # (host, vmid) -> (config mtime, cores)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.config_hits = 0
+
+    def get(self, host, vmid):
+        """
+        Return the cached (container_config, container_metrics) pair, or None if missing or expired.
+        :param host: Host name.
+        :param vmid: The VMID of the container.
+        """
+        with self._lock:
+            entry = self._entries.get((host, vmid))
+            if entry is not None and self._clock() - entry[0] <= self.ttl:
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[(host, vmid)]
+            self.misses += 1
+            return None
+
+    def put(self, host, vmid, value):
+        """
+        Store a freshly fetched (container_config, container_metrics) pair.
+        :param host: Host name.
+        :param vmid: The VMID of the container.
+        :param value: Tuple of (container_config, container_metrics).
+        """
+        with self._lock:
+            self._entries[(host, vmid)] = (self._clock(), value)
+            self.fetches += 1
+
+    def config_cores(self, host, vmid, mtime):
+        """
+        Return the known cores of a container whose config file still has the given modification time.
+        :param host: Host name.
+        :param vmid: The VMID of the container.
+        :param mtime: Current modification time of the config file, or None when unknown.
+        :return: Cores, or None if unknown or the config changed since.
+        """
+        if mtime is None:
+            return None
+        with self._lock:
+            entry = self._configs.get((host, vmid))
+            if entry is None or entry[0] != mtime:
+                return None
+            self.config_hits += 1
+            return entry[1]
+
+    def put_config(self, host, vmid, mtime, cores):
+        """
+        Remember the cores read from a container config with the given modification time.
+        """
+        if mtime is not None and cores is not None:
+            with self._lock:
+                self._configs[(host, vmid)] = (mtime, cores)
+
+    def configs(self):
+        """
+        :return: Dictionary of (host, vmid) -> (config mtime, cores), e.g. for a snapshot.
+        """
+        with self._lock:
+            return dict(self._configs)
+
+    def restore_configs(self, configs):
+        """
+        Restore config entries saved with configs().
+        """
+        with self._lock:
+            self._configs.update(configs)
+
+    def invalidate(self, host=None):
+        """
+        Drop every entry, or only the entries of one host.
+        :param host: Optional host name.
+        """
+        with self._lock:
+            if host is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == host]:
+                    del self._entries[key]
+
+    def stats(self):
+        """
+        :return: Dictionary with hit, miss and remote fetch counters.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'fetches': self.fetches, 'entries': len(self._entries),
+                    'config_hits': self.config_hits}
+
+    def __len__(self):
+        return len(self._entries)
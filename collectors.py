@@ -0,0 +1,273 @@
+import json
+import logging
+import ssl
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functions import get_host_metrics, get_host_metrics_batched, build_host_state, run_command, deadline
+from instrumentation import METRICS
+from model import ContainerState, HostState
+
+MB = 1024 * 1024
+
+class Collector:
+    """
+    Interface of the cluster collectors.
+    A collector turns the configured hosts into HostState objects. Backends that also know the
+    container metrics return ContainerState objects with metrics, so no per-container fetch is needed.
+    """
+    name = None
+
+    def collect(self, hosts):
+        """
+        :param hosts: List of host entries from the configuration.
+        :return: Dictionary of host name -> HostState, in configuration order.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release what the collector keeps open between cycles.
+        """
+        pass
+
+    def forget(self, names):
+        """
+        Release what the collector keeps for hosts that were removed or whose connection settings changed.
+        """
+        pass
+
+class SSHCollector(Collector):
+    """
+    Collects every host over SSH (one composite command per host in batched mode), in parallel.
+    Each host has `host_timeout` seconds from its first command; a host that misses it is
+    abandoned (its connection is closed) and left out of the result, so one hung node cannot
+    stall the cycle.
+    """
+    name = 'ssh'
+
+    def __init__(self, default_params, pool, logger=None):
+        """
+        :param default_params: Default parameters from the configuration.
+        :param pool: SSHConnectionPool shared by all workers.
+        :param logger: Logger instance.
+        """
+        self.default_params = default_params
+        self.pool = pool
+        self.logger = logger or logging.getLogger(__name__)
+        self.host_timeout = default_params.get('host_timeout', 60)
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def collect_host(self, host):
+        """
+        Connect to a single Proxmox host and fetch its metrics.
+        :param host: Host entry from the configuration.
+        :return: HostState of the host, or None if the host could not be reached.
+        """
+        with self._lock:
+            self._started[host['name']] = time.monotonic()
+        self.logger.info(f"🔌 Connecting to {host['name']} ({host['address']})...")
+        try:
+            with deadline(self.host_timeout):
+                ssh = self.pool.get(host)
+                self.logger.info(f"📊 Fetching host metrics for {host['name']}...")
+                if self.default_params.get('batched_collection', True):
+                    host_metrics = get_host_metrics_batched(ssh)
+                else:
+                    host_metrics = get_host_metrics(ssh)
+            return build_host_state(host['name'], host, host_metrics, self.default_params)
+
+        except Exception as e:
+            self.logger.error(f"❌ Error connecting to {host['name']}: {str(e)}")
+            self.pool.discard(host)
+            return None
+
+    def collect(self, hosts):
+        """
+        Fetch metrics from all hosts concurrently.
+        The number of hosts contacted at the same time is bounded by
+        `default_params.collection_concurrency`.
+        """
+        max_workers = max(1, min(int(self.default_params.get('collection_concurrency', 8)), len(hosts) or 1))
+
+        results = {}
+        with self._lock:
+            for host in hosts:
+                self._started.pop(host['name'], None)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='collector')
+        futures = {executor.submit(self.collect_host, host): host for host in hosts}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=self._next_expiry(futures, pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                host_state = future.result()
+                if host_state is not None:
+                    results[futures[future]['name']] = host_state
+            now = time.monotonic()
+            for future in list(pending):
+                host = futures[future]
+                started = self._started.get(host['name'])
+                if self.host_timeout and started is not None and now - started > self.host_timeout:
+                    # Straggler: closing its connection makes its blocked reads fail, the thread is not waited for
+                    self.logger.error(f"⏱️  {host['name']} did not answer within {self.host_timeout}s, skipping it")
+                    pending.discard(future)
+                    self.pool.discard(host)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        # Keep the configuration order so the planner output is deterministic
+        return {host['name']: results[host['name']] for host in hosts if host['name'] in results}
+
+    def _next_expiry(self, futures, pending):
+        if not self.host_timeout:
+            return None
+        started = [self._started[futures[future]['name']] for future in pending if futures[future]['name'] in self._started]
+        if not started:
+            return self.host_timeout
+        # A small grace period lets the command timeouts fire first
+        return max(0.05, min(started) + self.host_timeout + 0.1 - time.monotonic())
+
+class ProxmoxAPICollector(Collector):
+    """
+    Collects the whole cluster with a single `/cluster/resources` request, either through the
+    Proxmox REST API (API token authentication) or through `pvesh get` on one of the hosts.
+    Nodes, LXC containers and VMs come back in one JSON document; nodes and containers are mapped
+    into the same HostState / ContainerState structures used by the SSH collector.
+    """
+    name = 'api'
+
+    def __init__(self, default_params, api_config, pool=None, logger=None):
+        """
+        :param default_params: Default parameters from the configuration.
+        :param api_config: The `api` section of the configuration: `transport` ('rest' or 'pvesh'),
+                           `url`, `token_id`, `token_secret`, `verify_ssl`, `timeout`.
+        :param pool: SSHConnectionPool, required by the 'pvesh' transport.
+        :param logger: Logger instance.
+        """
+        self.default_params = default_params
+        self.api_config = api_config
+        self.pool = pool
+        self.logger = logger or logging.getLogger(__name__)
+
+    def fetch_resources_rest(self):
+        url = self.api_config['url'].rstrip('/') + '/api2/json/cluster/resources'
+        request = urllib.request.Request(url, headers={
+            'Authorization': f"PVEAPIToken={self.api_config['token_id']}={self.api_config['token_secret']}",
+            'Accept': 'application/json'
+        })
+        context = None
+        if url.startswith('https://') and not self.api_config.get('verify_ssl', True):
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        start = METRICS.clock()
+        try:
+            with urllib.request.urlopen(request, timeout=self.api_config.get('timeout', 10), context=context) as response:
+                body = response.read()
+        except Exception:
+            METRICS.observe_command('api', 'cluster_resources', METRICS.clock() - start, error=True)
+            raise
+        METRICS.observe_command('api', 'cluster_resources', METRICS.clock() - start, len(body))
+        return json.loads(body.decode())['data']
+
+    def fetch_resources_pvesh(self, hosts):
+        # Any reachable host of the cluster can answer for the whole cluster
+        for host in hosts:
+            try:
+                ssh = self.pool.get(host)
+                output, error = run_command(ssh, "pvesh get /cluster/resources --output-format json", 'pvesh_resources')
+                if output.strip():
+                    return json.loads(output)
+                self.logger.error(f"❌ pvesh returned no data on {host['name']}: {error.strip()}")
+            except Exception as e:
+                self.logger.error(f"❌ Error running pvesh on {host['name']}: {str(e)}")
+                self.pool.discard(host)
+        raise RuntimeError("No host could answer /cluster/resources")
+
+    def fetch_resources(self, hosts):
+        """
+        :return: The list of resources returned by /cluster/resources.
+        """
+        if self.api_config.get('transport', 'rest') == 'pvesh':
+            return self.fetch_resources_pvesh(hosts)
+        return self.fetch_resources_rest()
+
+    def collect(self, hosts):
+        self.logger.info("📊 Fetching cluster resources from the Proxmox API...")
+        return parse_cluster_resources(self.fetch_resources(hosts), hosts, self.default_params)
+
+def parse_cluster_resources(resources, hosts, default_params):
+    """
+    Map the /cluster/resources document into HostState objects.
+    Load is derived from the CPU utilization (fraction of the node's cores) since the API does not
+    report load averages; memory is converted to MB. Only configured, online nodes are returned.
+    :param resources: List of resource dictionaries.
+    :param hosts: List of HostConfig (see config.compile_config).
+    :param default_params: Default parameters from the configuration.
+    :return: Dictionary of host name -> HostState, in configuration order.
+    """
+    nodes = {}
+    containers = {}
+    for resource in resources:
+        if resource.get('type') == 'node' and resource.get('status', 'online') == 'online':
+            nodes[resource['node']] = resource
+        elif resource.get('type') == 'lxc' and not resource.get('template'):
+            containers.setdefault(resource['node'], []).append(resource)
+
+    states = {}
+    for host in hosts:
+        node = nodes.get(host['name'])
+        if node is None or not node.get('maxmem'):
+            continue
+        cores = int(node.get('maxcpu', 0))
+        load = node.get('cpu', 0.0) * cores
+        state = HostState(
+            host['name'],
+            host['address'],
+            {key: host.get(key) for key in ('name', 'address', 'user', 'password', 'key_path')},
+            host.cpu_threshold,
+            host.memory_threshold,
+            cpu_cores=cores,
+            load_1=load,
+            load_5=load,
+            load_15=load,
+            memory_used=int(node.get('mem', 0)) // MB,
+            memory_total=int(node['maxmem']) // MB,
+            disk_used=int(node.get('disk', 0)),
+            disk_total=int(node.get('maxdisk', 0)),
+            containers=[_container_state(resource) for resource in containers.get(host['name'], [])],
+            network_threshold=host.network_threshold,
+            network_capacity=host.network_capacity_mbps
+        )
+        states[host['name']] = state
+    return states
+
+def _container_state(resource):
+    cores = int(resource.get('maxcpu', 0)) or None
+    container = ContainerState(
+        str(resource['vmid']),
+        name=resource.get('name', ''),
+        status=resource.get('status', ''),
+        lock=resource.get('lock', '')
+    )
+    if cores is None:
+        return container
+    return container.with_metrics(
+        cores,
+        resource.get('cpu', 0.0) * cores,
+        int(resource.get('mem', 0)) // MB,
+        int(resource.get('maxmem', 0)) // MB
+    )
+
+def create_collector(config, default_params, pool, logger=None):
+    """
+    Build the collector selected by `default_params.collector` ('ssh', 'api' or 'stream').
+    """
+    collector = default_params.get('collector', 'ssh')
+    if collector == 'api':
+        return ProxmoxAPICollector(default_params, config.get('api', {}), pool, logger)
+    if collector == 'stream':
+        from streaming import StreamingCollector  # streaming builds on this module
+        return StreamingCollector(default_params, pool, logger)
+    return SSHCollector(default_params, pool, logger)
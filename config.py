@@ -1,6 +1,256 @@
+import os
 import yaml
 
+class ConfigError(ValueError):
+    """
+    Invalid configuration. The message lists every problem found.
+    """
+
+# Defaults of the optional default_params, resolved once when the configuration is compiled
+DEFAULTS = {
+    'network_threshold': 0.8,
+    'network_capacity_mbps': 1000,
+    'network_weight': 0.0,
+    'migration_strategy': 'load_based',
+    'collector': 'ssh',
+    'collection_concurrency': 8,
+    'command_timeout': 30,
+    'host_timeout': 60,
+    'batched_collection': True,
+    'container_metrics_source': 'pct',
+    'container_cache_ttl': 60,
+    'placement_engine': 'numpy',
+    'max_migrations': None,
+    'max_bytes_moved': None,
+    'planning_time_budget': 2.0,
+    'planning_shards': 0,
+    'shard_by': 'auto',
+    'shard_size': 50,
+    'shard_workers': None,
+    'shard_reconcile': 2,
+    'load_signal': 'instant',
+    'history_size': 30,
+    'history_alpha': 0.3,
+    'history_dir': None,
+    'snapshot_path': None,
+    'metrics_port': None,
+    'metrics_address': '0.0.0.0',
+    'metrics_summary_top': 3,
+    'poll_interval': 30,
+    'poll_min_interval': 10,
+    'poll_max_interval': 300,
+    'poll_backoff': 1.5,
+    'replan_threshold': 0.05,
+    'incremental_planning': True,
+    'replan_epsilon': 0.01,
+    'stream_interval': 1.0,
+    'stream_full_interval': 60,
+    'stream_retry': 5.0,
+    'stream_start_timeout': 10,
+    'execute_migrations': False,
+    'migration_online': False,
+    'migration_restart': True,
+    'migration_timeout': None,
+    'migration_max_parallel': 2,
+    'migration_max_per_source': 1,
+    'migration_max_per_target': 1,
+    'migration_stop_on_failure': True,
+    'watch_config': True,
+    'config_watch_interval': 5,
+}
+
+CHOICES = {
+    'collector': ('ssh', 'api', 'stream'),
+    'container_metrics_source': ('cgroup', 'pct'),
+    'migration_strategy': ('load_based', 'global'),
+    'placement_engine': ('numpy', 'python'),
+}
+
+POSITIVE = (
+    'cpu_threshold', 'network_capacity_mbps', 'collection_concurrency', 'command_timeout', 'host_timeout',
+    'planning_time_budget', 'shard_size', 'history_size', 'poll_interval', 'poll_min_interval', 'poll_max_interval',
+    'poll_backoff', 'stream_interval', 'migration_max_parallel', 'migration_max_per_source', 'migration_max_per_target',
+    'config_watch_interval', 'stream_full_interval',
+)
+
+FRACTIONS = ('memory_threshold', 'network_threshold', 'history_alpha')
+
+class HostConfig:
+    """
+    Compiled settings of one host, with the thresholds resolved against default_params.
+    It can also be read like the host entry it was compiled from (host['name'], host.get('zone')),
+    so it is accepted wherever a host entry is expected.
+    """
+    __slots__ = ('name', 'address', 'user', 'password', 'key_path',
+                 'cpu_threshold', 'memory_threshold', 'network_threshold', 'network_capacity_mbps', 'extra')
+
+    def __init__(self, name, address, user, password=None, key_path=None, cpu_threshold=1.0, memory_threshold=0.8,
+                 network_threshold=0.8, network_capacity_mbps=1000, extra=None):
+        self.name = name
+        self.address = address
+        self.user = user
+        self.password = password
+        self.key_path = key_path
+        self.cpu_threshold = cpu_threshold
+        self.memory_threshold = memory_threshold
+        self.network_threshold = network_threshold
+        self.network_capacity_mbps = network_capacity_mbps
+        self.extra = extra or {}  # Other keys of the host entry (e.g. zone)
+
+    def get(self, key, default=None):
+        if key in self.__slots__ and key != 'extra':
+            return getattr(self, key)
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key):
+        if key in self.__slots__ and key != 'extra':
+            return getattr(self, key)
+        return self.extra[key]
+
+    def connection_changed(self, other):
+        return (self.address, self.user, self.password, self.key_path) != (other.address, other.user, other.password, other.key_path)
+
+    def thresholds_changed(self, other):
+        return ((self.cpu_threshold, self.memory_threshold, self.network_threshold, self.network_capacity_mbps)
+                != (other.cpu_threshold, other.memory_threshold, other.network_threshold, other.network_capacity_mbps))
+
+    def __repr__(self):
+        return f"HostConfig(name={self.name!r}, address={self.address!r}, cpu_threshold={self.cpu_threshold}, memory_threshold={self.memory_threshold})"
+
+def _check_number(problems, where, key, value, fraction=False):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        problems.append(f"{where}: {key} must be a number, got {value!r}")
+    elif fraction and not 0 < value <= 1:
+        problems.append(f"{where}: {key} must be between 0 and 1, got {value}")
+    elif not fraction and value <= 0:
+        problems.append(f"{where}: {key} must be positive, got {value}")
+
+def compile_config(config):
+    """
+    Validate a configuration and compile it: default_params get every default filled in and every
+    host entry becomes a HostConfig with its thresholds resolved. Compiling a compiled configuration
+    again is cheap and returns an equivalent one.
+    :param config: Configuration as loaded from YAML.
+    :return: New configuration dictionary.
+    :raises ConfigError: If the configuration is invalid.
+    """
+    problems = []
+    if not isinstance(config, dict):
+        raise ConfigError("The configuration must be a mapping")
+
+    params = config.get('default_params') or {}
+    if not isinstance(params, dict):
+        raise ConfigError("default_params must be a mapping")
+    for key in ('cpu_threshold', 'memory_threshold'):
+        if key not in params:
+            problems.append(f"default_params: {key} is required")
+    params = {**DEFAULTS, **{key: value for key, value in params.items() if value is not None or key not in DEFAULTS}}
+
+    for key, value in params.items():
+        if key in CHOICES and value not in CHOICES[key]:
+            problems.append(f"default_params: {key} must be one of {', '.join(CHOICES[key])}, got {value!r}")
+        elif value is not None and key in POSITIVE:
+            _check_number(problems, 'default_params', key, value)
+        elif value is not None and key in FRACTIONS:
+            _check_number(problems, 'default_params', key, value, fraction=True)
+    signal = params['load_signal']
+    if signal not in ('instant', 'ewma') and not (isinstance(signal, str) and signal[:1] == 'p' and signal[1:].isdigit()):
+        problems.append(f"default_params: load_signal must be 'instant', 'ewma' or a percentile such as 'p95', got {signal!r}")
+    if isinstance(params['poll_min_interval'], (int, float)) and isinstance(params['poll_max_interval'], (int, float)) \
+            and params['poll_min_interval'] > params['poll_max_interval']:
+        problems.append("default_params: poll_min_interval must not be greater than poll_max_interval")
+
+    hosts = []
+    entries = config.get('proxmox_hosts')
+    if not isinstance(entries, list) or not entries:
+        problems.append("proxmox_hosts must be a non-empty list")
+        entries = []
+    names = set()
+    for index, entry in enumerate(entries):
+        if isinstance(entry, HostConfig):
+            entry = {**entry.extra, **{key: getattr(entry, key) for key in HostConfig.__slots__ if key != 'extra'}}
+        if not isinstance(entry, dict):
+            problems.append(f"proxmox_hosts[{index}] must be a mapping")
+            continue
+        where = f"proxmox_hosts[{index}] ({entry.get('name', '?')})"
+        missing = [key for key in ('name', 'address', 'user') if not entry.get(key)]
+        if missing:
+            problems.append(f"{where}: {', '.join(missing)} required")
+            continue
+        if entry['name'] in names:
+            problems.append(f"{where}: duplicate host name")
+        names.add(entry['name'])
+
+        settings = {}
+        for key, fallback in (('cpu_threshold', 'cpu_threshold'), ('memory_threshold', 'memory_threshold'),
+                              ('network_threshold', 'network_threshold'), ('network_capacity_mbps', 'network_capacity_mbps')):
+            value = entry.get(key)
+            settings[key] = params.get(fallback) if value is None else value
+            if value is not None:
+                _check_number(problems, where, key, value, fraction=key in FRACTIONS)
+        hosts.append(HostConfig(
+            entry['name'], entry['address'], entry['user'],
+            password=entry.get('password'), key_path=entry.get('key_path'),
+            extra={key: value for key, value in entry.items() if key not in HostConfig.__slots__},
+            **settings
+        ))
+
+    api = config.get('api') or {}
+    if params['collector'] == 'api' and api.get('transport', 'rest') not in ('rest', 'pvesh'):
+        problems.append(f"api: transport must be 'rest' or 'pvesh', got {api.get('transport')!r}")
+
+    if problems:
+        raise ConfigError("Invalid configuration:\n  - " + "\n  - ".join(problems))
+    return {**config, 'default_params': params, 'proxmox_hosts': hosts}
+
 def load_config(config_file='config.yaml'):
+    """
+    Load, validate and compile the configuration (see compile_config).
+    """
     with open(config_file, 'r') as file:
-        config = yaml.safe_load(file)
-    return config
+        try:
+            config = yaml.safe_load(file)
+        except yaml.YAMLError as e:
+            raise ConfigError(f"Invalid YAML in {config_file}: {str(e)}")
+    return compile_config(config)
+
+class ConfigWatcher:
+    """
+    Watches the configuration file for changes, for hot reloading in long-running processes.
+    """
+
+    def __init__(self, config_file='config.yaml'):
+        self.config_file = config_file
+        self._stamp = self._current_stamp()
+
+    def _current_stamp(self):
+        try:
+            stat = os.stat(self.config_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def poll(self):
+        """
+        :return: The new compiled configuration if the file changed since the last poll, otherwise None.
+        :raises ConfigError: If the changed file is invalid (it is not read again until it changes once more).
+        """
+        stamp = self._current_stamp()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        return load_config(self.config_file)
+
+def diff_hosts(old_hosts, new_hosts):
+    """
+    Compare the hosts of two compiled configurations.
+    :return: Tuple of (added, removed, reconnect, rethreshold) host name lists: hosts whose connection
+             settings changed must be reconnected, hosts whose thresholds changed re-evaluated.
+    """
+    old = {host.name: host for host in old_hosts}
+    new = {host.name: host for host in new_hosts}
+    added = [name for name in new if name not in old]
+    removed = [name for name in old if name not in new]
+    reconnect = [name for name in new if name in old and new[name].connection_changed(old[name])]
+    rethreshold = [name for name in new if name in old and new[name].thresholds_changed(old[name])]
+    return added, removed, reconnect, rethreshold
@@ -0,0 +1,124 @@
+import logging
+import threading
+from functions import ssh_connect
+from instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+class SSHConnectionPool:
+    """
+    Keeps one authenticated SSH transport per host and hands it out to callers.
+    Every `exec_command` on a pooled client opens a new channel on the shared
+    transport, so the handshake is only paid once per host instead of once per call.
+    The pool can live for a single balancing cycle or across cycles in long-running use.
+    """
+
+    def __init__(self, connect=ssh_connect, keepalive=30):
+        """
+        :param connect: Factory with the signature of `functions.ssh_connect`.
+        :param keepalive: Seconds between transport keepalive packets (0 to disable).
+        """
+        self._connect = connect
+        self._keepalive = keepalive
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host):
+        return (host['address'], host['user'])
+
+    def _host_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def is_healthy(client):
+        """
+        Check whether a pooled client still has a usable transport.
+        :param client: SSH client object.
+        :return: True if the transport is active, False otherwise.
+        """
+        get_transport = getattr(client, 'get_transport', None)
+        if get_transport is None:
+            return True  # Clients without a transport (e.g. test doubles) are always reusable
+        transport = get_transport()
+        return transport is not None and transport.is_active()
+
+    def get(self, host):
+        """
+        Return a connected client for the host, reconnecting if the pooled one went stale.
+        :param host: Dictionary with 'address', 'user' and optional 'password'/'key_path'.
+        :return: SSH client object.
+        """
+        key = self._key(host)
+        with self._host_lock(key):
+            client = self._clients.get(key)
+            if client is not None and self.is_healthy(client):
+                return client
+            if client is not None:
+                logger.info(f"♻️  Reconnecting to {host['address']} (stale transport)")
+                self._safe_close(client)
+
+            label = host.get('name', host['address'])
+            start = METRICS.clock()
+            try:
+                client = self._connect(
+                    host['address'],
+                    host['user'],
+                    password=host.get('password'),
+                    key_path=host.get('key_path')
+                )
+            except Exception:
+                METRICS.observe_connect(label, METRICS.clock() - start, error=True)
+                raise
+            METRICS.observe_connect(label, METRICS.clock() - start)
+            METRICS.label_client(client, label)
+            get_transport = getattr(client, 'get_transport', None)
+            transport = get_transport() if get_transport else None
+            if transport is not None and self._keepalive:
+                transport.set_keepalive(self._keepalive)
+            self._clients[key] = client
+            return client
+
+    def open_channel(self, host):
+        """
+        Open a new session channel on the pooled transport of a host.
+        :param host: Dictionary with the host connection details.
+        :return: Paramiko channel.
+        """
+        return self.get(host).get_transport().open_session()
+
+    def discard(self, host):
+        """
+        Close and forget the pooled connection of a host (e.g. after a command failure).
+        :param host: Dictionary with the host connection details.
+        """
+        key = self._key(host)
+        with self._host_lock(key):
+            client = self._clients.pop(key, None)
+        if client is not None:
+            self._safe_close(client)
+
+    def close_all(self):
+        """
+        Close every pooled connection.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            self._safe_close(client)
+
+    @staticmethod
+    def _safe_close(client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close_all()
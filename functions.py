@@ -1,15 +1,87 @@
 import paramiko
 import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from instrumentation import METRICS
+from model import ContainerState, HostState
 
 def ssh_connect(host, user, password=None, key_path=None):
+    # An unresponsive sshd must not block forever: the handshake gets the same timeout as a command
+    timeout = command_timeout()
+    timeouts = {'timeout': timeout, 'banner_timeout': timeout, 'auth_timeout': timeout}
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     if key_path:
-        ssh.connect(host, username=user, key_filename=key_path)
+        ssh.connect(host, username=user, key_filename=key_path, **timeouts)
     else:
-        ssh.connect(host, username=user, password=password)
+        ssh.connect(host, username=user, password=password, **timeouts)
     return ssh
 
+# Seconds a single remote command may stay silent before it is abandoned (see set_command_timeout)
+COMMAND_TIMEOUT = 30.0
+_deadline = threading.local()
+
+def set_command_timeout(seconds):
+    """
+    Set the default timeout of every remote command (None or 0 to disable it).
+    """
+    global COMMAND_TIMEOUT
+    COMMAND_TIMEOUT = seconds or None
+
+@contextmanager
+def deadline(seconds):
+    """
+    Bound the remote commands run by the current thread inside the block to `seconds` in total.
+    Nested deadlines can only shorten the outer one. Without `seconds` the block is not bounded.
+    """
+    previous = getattr(_deadline, 'at', None)
+    if seconds:
+        at = time.monotonic() + seconds
+        _deadline.at = at if previous is None else min(previous, at)
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+def command_timeout():
+    """
+    :return: Timeout of the next remote command: the default timeout, shortened to what is left of the current deadline.
+    :raises TimeoutError: If the current deadline has already passed.
+    """
+    timeout = COMMAND_TIMEOUT
+    at = getattr(_deadline, 'at', None)
+    if at is not None:
+        remaining = at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Host deadline exceeded")
+        timeout = min(timeout, remaining) if timeout else remaining
+    return timeout
+
+def run_command(ssh, command, name, bounded=True):
+    """
+    Run a remote command and read its output, recording its latency, bytes read and errors.
+    The command is abandoned with a TimeoutError once it stays silent for longer than its
+    timeout (see command_timeout).
+    :param ssh: SSH connection object.
+    :param command: Shell command to run.
+    :param name: Short command name used as metric label (e.g. 'pct_exec'), never the full command line.
+    :param bounded: Apply the command timeout and the current deadline. Commands that legitimately stay
+                    silent for minutes, such as `pct migrate`, run unbounded.
+    :return: Tuple of (stdout, stderr) as strings.
+    """
+    host = METRICS.client_label(ssh)
+    start = METRICS.clock()
+    try:
+        stdin, stdout, stderr = ssh.exec_command(command, timeout=command_timeout() if bounded else None)
+        output = stdout.read()
+        error = stderr.read()
+    except Exception:
+        METRICS.observe_command(host, name, METRICS.clock() - start, error=True)
+        raise
+    METRICS.observe_command(host, name, METRICS.clock() - start, len(output) + len(error), bool(error.strip()))
+    return output.decode(), error.decode()
+
 def get_host_metrics(ssh):
     """
     Fetch the metrics specific to the host (CPU load, memory, disk, etc.).
@@ -28,14 +100,15 @@ def get_host_metrics(ssh):
         'network_interfaces': (
             "awk -F: '$1 !~ /lo/ && $1 ~ /^(eth|eno|vmbr)/ {print $1}' /proc/net/dev"
         ),  # Get network interface names excluding 'lo'
-        'containers': "pct list | tail -n +2"  # Get list of containers
+        'containers': "pct list | tail -n +2",  # Get list of containers
+        'config_mtimes': "stat -c '%Y %n' /etc/pve/lxc/*.conf"  # Get the modification times of the container configs
     }
 
     metrics = {}
     for key, cmd in commands.items():
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        output = stdout.read().decode().strip()
-        error = stderr.read().decode().strip()
+        output, error = run_command(ssh, cmd, key)
+        output = output.strip()
+        error = error.strip()
 
         if error:
             print(f"Error fetching {key}: {error}")
@@ -48,10 +121,8 @@ def get_host_metrics(ssh):
         network_metrics = {}
         for iface in interfaces:
             iface = iface.strip()  # Remove any extra whitespace
-            stdin, stdout, stderr = ssh.exec_command(
-                f"awk '/^{iface}/ {{print $1, $2, $10}}' /proc/net/dev"
-            )
-            line = stdout.read().decode().strip()
+            line, _ = run_command(ssh, f"awk '/^{iface}/ {{print $1, $2, $10}}' /proc/net/dev", 'net_dev')
+            line = line.strip()
             if line:
                 iface_name, rx_bytes, tx_bytes = line.split()
                 iface_name = iface_name.strip(':')  # Remove trailing colon
@@ -65,27 +136,156 @@ def get_host_metrics(ssh):
 
     # Process container metrics
     if 'containers' in metrics and isinstance(metrics['containers'], str):
-        container_metrics = []
-        lines = metrics['containers'].splitlines()
-        for line in lines:
-            parts = line.split(None, 3)
-            if len(parts) == 3:
-                vmid, status, name = parts
-                lock = ''
-            elif len(parts) == 4:
-                vmid, status, lock, name = parts
-            else:
-                continue  # Skip lines that don't have at least 3 parts
-            container_metrics.append({
-                'vmid': vmid,
-                'status': status,
-                'lock': lock,
-                'name': name.strip()
-            })
-        metrics['containers'] = container_metrics
+        metrics['containers'] = parse_container_list(metrics['containers'])
+    metrics['config_mtimes'] = parse_config_mtimes(metrics.get('config_mtimes', ''))
+
+    return metrics
+
+def parse_container_list(output):
+    """
+    Parse the output of `pct list` (without its header line).
+    :param output: Raw command output.
+    :return: List of ContainerState objects (without metrics).
+    """
+    container_metrics = []
+    for line in output.splitlines():
+        parts = line.split(None, 3)
+        if len(parts) == 3:
+            vmid, status, name = parts
+            lock = ''
+        elif len(parts) == 4:
+            vmid, status, lock, name = parts
+        else:
+            continue  # Skip lines that don't have at least 3 parts
+        container_metrics.append(ContainerState(vmid, name=name.strip(), status=status, lock=lock))
+    return container_metrics
+
+def parse_config_mtimes(output):
+    """
+    Parse the output of `stat -c '%Y %n' /etc/pve/lxc/*.conf`.
+    :param output: Raw command output.
+    :return: Dictionary of VMID -> modification time of its configuration file.
+    """
+    mtimes = {}
+    for line in output.splitlines():
+        parts = line.split(None, 1)
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].strip().endswith('.conf'):
+            mtimes[parts[1].strip().rsplit('/', 1)[-1][:-len('.conf')]] = int(parts[0])
+    return mtimes
+
+# Composite script used by the batched collection mode. Every section starts with a
+# '@@<name>' marker line so the whole host snapshot can be fetched over a single channel.
+HOST_METRICS_SCRIPT = (
+    "echo '@@cpu_cores'; nproc; "
+    "echo '@@loadavg'; cat /proc/loadavg; "
+    "echo '@@free'; free -m; "
+    "echo '@@df'; df -h / | tail -1; "
+    "echo '@@netdev'; tail -n +3 /proc/net/dev; "
+    "echo '@@containers'; pct list | tail -n +2; "
+    "echo '@@confmtime'; stat -c '%Y %n' /etc/pve/lxc/*.conf 2>/dev/null; "
+    "echo '@@end'"
+)
+
+NETWORK_INTERFACE_PREFIXES = ('eth', 'eno', 'vmbr')
+
+def split_sections(output):
+    """
+    Split sectioned script output into a dictionary of section name -> list of lines.
+    :param output: Raw output with '@@<name>' marker lines.
+    :return: Dictionary with the lines of each section.
+    """
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith('@@'):
+            current = line[2:].strip()
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return sections
+
+def parse_host_metrics_output(output):
+    """
+    Parse the output of HOST_METRICS_SCRIPT into the same structure returned by get_host_metrics.
+    :param output: Raw sectioned output of the composite script.
+    :return: Dictionary with host metrics.
+    """
+    sections = split_sections(output)
+    metrics = {}
+
+    cpu_cores = [line.strip() for line in sections.get('cpu_cores', []) if line.strip()]
+    if cpu_cores:
+        metrics['cpu_cores'] = cpu_cores[0]
+
+    loadavg = ' '.join(sections.get('loadavg', [])).split()
+    if len(loadavg) >= 3:
+        metrics['cpu'] = ' '.join(loadavg[:3])
+
+    for line in sections.get('free', []):
+        parts = line.split()
+        if parts and parts[0] == 'Mem:' and len(parts) >= 3:
+            metrics['total_memory'] = parts[1]
+            metrics['used_memory'] = parts[2]
+            metrics['memory'] = f"{parts[2]} {parts[1]}"
+            break
+    meminfo = {}
+    for line in sections.get('meminfo', []):
+        # e.g. "MemTotal:       65843240 kB"
+        key, _, value = line.partition(':')
+        if value.split() and value.split()[0].isdigit():
+            meminfo[key.strip()] = int(value.split()[0]) // 1024
+    if 'MemTotal' in meminfo and 'MemAvailable' in meminfo:
+        total = meminfo['MemTotal']
+        used = total - meminfo['MemAvailable']
+        metrics['total_memory'] = str(total)
+        metrics['used_memory'] = str(used)
+        metrics['memory'] = f"{used} {total}"
+
+    df = ' '.join(sections.get('df', [])).split()
+    if len(df) >= 3:
+        metrics['total_disk'] = df[1]
+        metrics['used_disk'] = df[2]
+        metrics['disk'] = f"{df[2]} {df[1]}"
+
+    interfaces = []
+    network_metrics = {}
+    for line in sections.get('netdev', []):
+        if ':' not in line:
+            continue
+        iface, counters = line.split(':', 1)
+        iface = iface.strip()
+        if iface == 'lo' or not iface.startswith(NETWORK_INTERFACE_PREFIXES):
+            continue
+        counters = counters.split()
+        if len(counters) < 9:
+            continue
+        interfaces.append(iface)
+        network_metrics[iface] = {
+            'received_bytes': int(counters[0]),
+            'transmitted_bytes': int(counters[8])
+        }
+    metrics['network_interfaces'] = '\n'.join(interfaces)
+    metrics['network'] = network_metrics
+
+    metrics['containers'] = parse_container_list('\n'.join(sections.get('containers', [])))
+    metrics['config_mtimes'] = parse_config_mtimes('\n'.join(sections.get('confmtime', [])))
 
     return metrics
 
+def get_host_metrics_batched(ssh):
+    """
+    Fetch the host metrics with a single remote command instead of one command per metric.
+    :param ssh: SSH connection object.
+    :return: Dictionary with host metrics (same keys as get_host_metrics).
+    """
+    output, error = run_command(ssh, HOST_METRICS_SCRIPT, 'host_batch')
+    error = error.strip()
+
+    if error:
+        print(f"Error fetching batched host metrics: {error}")
+
+    return parse_host_metrics_output(output)
+
 def get_container_metrics(ssh, vmid):
     """
     Fetch metrics specific to a container.
@@ -100,9 +300,9 @@ def get_container_metrics(ssh, vmid):
 
     metrics = {}
     for key, cmd in commands.items():
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        output = stdout.read().decode().strip()
-        error = stderr.read().decode().strip()
+        output, error = run_command(ssh, cmd, f'pct_exec_{key}')
+        output = output.strip()
+        error = error.strip()
 
         if error:
             print(f"Error fetching {key} for container {vmid}: {error}")
@@ -119,9 +319,9 @@ def get_container_config(ssh, vmid):
     :return: Dictionary with container-specific configuration.
     """
     try:
-        stdin, stdout, stderr = ssh.exec_command(f"pct config {vmid} | grep cores | awk '{{print $2}}'")
-        output = stdout.read().decode().strip()
-        error = stderr.read().decode().strip()
+        output, error = run_command(ssh, f"pct config {vmid} | grep cores | awk '{{print $2}}'", 'pct_config')
+        output = output.strip()
+        error = error.strip()
 
         if error:
             print(f"Error retrieving config for VMID {vmid}: {error}")
@@ -133,3 +333,264 @@ def get_container_config(ssh, vmid):
     except Exception as e:
         print(f"Failed to retrieve config for VMID {vmid}: {str(e)}")
         return None
+
+# Default locations of the LXC cgroup v2 tree and of the container configs on a Proxmox host.
+LXC_CGROUP_ROOT = '/sys/fs/cgroup/lxc'
+LXC_CONFIG_DIR = '/etc/pve/lxc'
+
+def container_config_script(config_dir=LXC_CONFIG_DIR):
+    """
+    Only the current configuration is read: the lines of a config file stop at its first section header
+    (e.g. '[snapshot1]'), whose values are those of the snapshot and would otherwise replace the current ones.
+    :return: Shell snippet printing the configured cores and memory of every container as an '@@config' section.
+    """
+    return ("echo '@@config'; "
+            "awk 'FNR == 1 { current = 1 } /^\\[/ { current = 0 } "
+            f"current && /^(cores|memory):/ {{ print FILENAME \":\" $0 }}' {config_dir}/*.conf; ")
+
+def container_cgroup_script(cgroup_root=LXC_CGROUP_ROOT, config_dir=LXC_CONFIG_DIR, interval=1.0, with_config=True):
+    """
+    Build the shell script that reads CPU, memory and configured cores for every container in one pass.
+    CPU usage is sampled twice, `interval` seconds apart, so it can be turned into a rate.
+    :param cgroup_root: Directory holding one cgroup per container, named by VMID.
+    :param config_dir: Directory holding the <vmid>.conf container configurations.
+    :param interval: Seconds between the two CPU usage samples.
+    :param with_config: Also read the configured cores and memory from the container configs.
+    :return: Shell script string.
+    """
+    return (
+        f"cd {cgroup_root} || exit 1; "
+        "echo '@@t0'; cat /proc/uptime; "
+        "echo '@@cpu0'; grep -H '^usage_usec' [0-9]*/cpu.stat; "
+        f"sleep {interval}; "
+        "echo '@@t1'; cat /proc/uptime; "
+        "echo '@@cpu1'; grep -H '^usage_usec' [0-9]*/cpu.stat; "
+        "echo '@@memory'; grep -H . [0-9]*/memory.current [0-9]*/memory.max; "
+        + (container_config_script(config_dir) if with_config else '')
+        + "echo '@@end'"
+    )
+
+def _parse_usage_usec(lines):
+    usage = {}
+    for line in lines:
+        # e.g. "101/cpu.stat:usage_usec 123456"
+        path, _, value = line.partition(':')
+        vmid = path.split('/')[0]
+        fields = value.split()
+        if len(fields) == 2 and fields[1].isdigit():
+            usage[vmid] = int(fields[1])
+    return usage
+
+def _parse_uptime(lines):
+    fields = ' '.join(lines).split()
+    return float(fields[0]) if fields else None
+
+def parse_container_cgroup_output(output):
+    """
+    Parse the output of container_cgroup_script.
+    :param output: Raw sectioned output.
+    :return: Dictionary keyed by VMID with 'cpu' (cores in use), 'memory' ("used total" in MB)
+             and 'cores' (configured cores, None when unlimited).
+    """
+    sections = split_sections(output)
+
+    t0 = _parse_uptime(sections.get('t0', []))
+    t1 = _parse_uptime(sections.get('t1', []))
+    cpu0 = _parse_usage_usec(sections.get('cpu0', []))
+    cpu1 = _parse_usage_usec(sections.get('cpu1', []))
+    elapsed = (t1 - t0) if t0 is not None and t1 is not None else 0
+
+    memory_current = {}
+    memory_max = {}
+    for line in sections.get('memory', []):
+        # e.g. "101/memory.current:52428800" or "101/memory.max:max"
+        path, _, value = line.partition(':')
+        vmid, _, name = path.partition('/')
+        value = value.strip()
+        if name == 'memory.current' and value.isdigit():
+            memory_current[vmid] = int(value)
+        elif name == 'memory.max' and value.isdigit():
+            memory_max[vmid] = int(value)
+
+    configured_cores = {}
+    configured_memory = {}
+    for line in sections.get('config', []):
+        # e.g. "/etc/pve/lxc/101.conf:cores: 2"
+        path, _, entry = line.partition(':')
+        vmid = path.rsplit('/', 1)[-1][:-len('.conf')]
+        key, _, value = entry.partition(':')
+        value = value.strip()
+        if key == 'cores' and value.isdigit():
+            configured_cores[vmid] = int(value)
+        elif key == 'memory' and value.isdigit():
+            configured_memory[vmid] = int(value)
+
+    containers = {}
+    for vmid, used_bytes in memory_current.items():
+        if vmid in cpu0 and vmid in cpu1 and elapsed > 0:
+            cpu = max(cpu1[vmid] - cpu0[vmid], 0) / (elapsed * 1_000_000)
+        else:
+            cpu = 0.0
+        used_mb = used_bytes // (1024 * 1024)
+        if vmid in memory_max:
+            total_mb = memory_max[vmid] // (1024 * 1024)
+        else:
+            total_mb = configured_memory.get(vmid, used_mb)
+        containers[vmid] = {
+            'cpu': f"{cpu:.2f}",
+            'memory': f"{used_mb} {total_mb}",
+            'cores': configured_cores.get(vmid)
+        }
+    return containers
+
+def get_container_cgroup_metrics(ssh, cgroup_root=LXC_CGROUP_ROOT, config_dir=LXC_CONFIG_DIR, interval=1.0):
+    """
+    Fetch CPU, memory and configured cores of every running container on a host in a single command,
+    reading the host's cgroup v2 tree instead of running `pct exec` inside each container.
+    :param ssh: SSH connection object.
+    :return: Dictionary keyed by VMID (see parse_container_cgroup_output).
+    """
+    output, error = run_command(ssh, container_cgroup_script(cgroup_root, config_dir, interval), 'cgroup_batch')
+    error = error.strip()
+
+    if error:
+        print(f"Error fetching container cgroup metrics: {error}")
+
+    return parse_container_cgroup_output(output)
+
+def read_container_cgroup_metrics(cgroup_root, config_dir, interval=0):
+    """
+    Run the cgroup collection script locally, e.g. against a fixture directory.
+    :param cgroup_root: Directory laid out like /sys/fs/cgroup/lxc.
+    :param config_dir: Directory laid out like /etc/pve/lxc.
+    :param interval: Seconds between the two CPU usage samples.
+    :return: Dictionary keyed by VMID (see parse_container_cgroup_output).
+    """
+    result = subprocess.run(
+        ['sh', '-c', container_cgroup_script(cgroup_root, config_dir, interval)],
+        capture_output=True, text=True
+    )
+    return parse_container_cgroup_output(result.stdout)
+
+# Host metrics read by the streaming agent on every record: /proc files only, no process start-up on the host
+STREAM_FAST_SCRIPT = (
+    "echo '@@loadavg'; cat /proc/loadavg; "
+    "echo '@@meminfo'; grep -E '^(MemTotal|MemAvailable):' /proc/meminfo; "
+    "echo '@@netdev'; cat /proc/net/dev; "
+)
+
+def streaming_agent_script(interval=1.0, cgroup_root=LXC_CGROUP_ROOT, config_dir=LXC_CONFIG_DIR, full_every=60):
+    """
+    Build the shell loop run once per host by the streaming collector.
+    Every iteration writes one record on a single line, with the original line breaks replaced by
+    the ASCII record separator (\\x1e). A record holds the load, memory and network counters from
+    /proc and the cgroup metrics of the containers (see STREAM_FAST_SCRIPT and container_cgroup_script).
+    The expensive parts (HOST_METRICS_SCRIPT with `pct list`, `df` and the config mtimes, and the
+    configured cores) are only added to a full record, which starts with an '@@full' line: the first
+    record, every `full_every` records, and whenever the set of container cgroups changes (a container
+    was started, stopped or migrated). The CPU sampling window of the cgroup script paces the loop,
+    so a record is written every `interval` seconds. The loop ends when the channel is closed.
+    :param interval: Seconds between two records (also the container CPU sampling window).
+    :param full_every: Records between two full records.
+    :return: Shell script string.
+    """
+    return (
+        f"n=0; last=; every={max(1, int(full_every))}; while :; do "
+        f"ids=$(cd {cgroup_root} 2>/dev/null && echo [0-9]*); full=; "
+        "if [ $n -le 0 ] || [ \"$ids\" != \"$last\" ]; then full=1; n=$every; last=$ids; fi; n=$((n - 1)); "
+        f"{{ if [ -n \"$full\" ]; then echo '@@full'; {HOST_METRICS_SCRIPT}; {container_config_script(config_dir)}fi; "
+        f"{STREAM_FAST_SCRIPT}( {container_cgroup_script(cgroup_root, config_dir, interval, with_config=False)} ) || sleep {interval}; }}"
+        " | tr '\\n' '\\036' && echo || exit 0; "
+        "done"
+    )
+
+def parse_stream_record(line):
+    """
+    Parse one record written by streaming_agent_script.
+    :param line: Record line. Sections repeated later in the line replace the earlier ones, so the
+                 latest full record followed by a newer record parses as the newer state.
+    :return: Tuple of (host metrics as returned by parse_host_metrics_output,
+             container metrics as returned by parse_container_cgroup_output).
+    """
+    output = line.rstrip('\n').replace('\x1e', '\n')
+    return parse_host_metrics_output(output), parse_container_cgroup_output(output)
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4, 'P': 1024 ** 5}
+
+def parse_size(value):
+    """
+    Convert a human readable size as printed by `df -h` (e.g. "94G", "1.5T") to bytes.
+    :param value: Size string.
+    :return: Size in bytes, or 0 if it cannot be parsed.
+    """
+    value = value.strip().upper().rstrip('I').rstrip('B') if value else ''
+    if not value:
+        return 0
+    unit = value[-1] if value[-1] in _SIZE_UNITS else ''
+    number = value[:-1] if unit else value
+    try:
+        return int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        return 0
+
+def build_host_state(name, host, metrics, default_params):
+    """
+    Parse the raw host metrics once into a typed HostState.
+    :param name: Host name.
+    :param host: HostConfig of the host (see config.compile_config).
+    :param metrics: Raw metrics from get_host_metrics / get_host_metrics_batched.
+    :param default_params: Default parameters from the configuration.
+    :return: HostState object.
+    """
+    load = [float(value) for value in metrics['cpu'].split()[:3]]
+    load += [0.0] * (3 - len(load))
+    memory_used, memory_total = (int(value) for value in metrics['memory'].split()[:2])
+    disk = metrics.get('disk', '').split()
+    containers = metrics.get('containers', [])
+    for container in containers:
+        container.config_mtime = metrics.get('config_mtimes', {}).get(container.vmid)
+
+    return HostState(
+        name,
+        host['address'],
+        {key: host.get(key) for key in ('name', 'address', 'user', 'password', 'key_path')},
+        host.cpu_threshold,
+        host.memory_threshold,
+        cpu_cores=int(metrics['cpu_cores']),
+        load_1=load[0],
+        load_5=load[1],
+        load_15=load[2],
+        memory_used=memory_used,
+        memory_total=memory_total,
+        disk_used=parse_size(disk[0]) if len(disk) > 0 else 0,
+        disk_total=parse_size(disk[1]) if len(disk) > 1 else 0,
+        network={
+            iface: (counters['received_bytes'], counters['transmitted_bytes'])
+            for iface, counters in metrics.get('network', {}).items()
+        },
+        containers=containers,
+        network_threshold=host.network_threshold,
+        network_capacity=host.network_capacity_mbps
+    )
+
+def build_container_state(container, config, metrics, default_cores=None):
+    """
+    Parse the raw container configuration and metrics once into a typed ContainerState.
+    :param container: ContainerState from the container list.
+    :param config: Container configuration (get_container_config), may be None.
+    :param metrics: Container metrics (get_container_metrics / get_container_cgroup_metrics), may be None.
+    :param default_cores: Cores to assume when the container has no core limit.
+    :return: ContainerState with metrics, or None if the data is incomplete.
+    """
+    if not config or not metrics or 'cpu' not in metrics or 'memory' not in metrics:
+        return None
+    cores = config.get('cores') or default_cores
+    if cores is None:
+        return None
+    memory = metrics['memory'].split()
+    return container.with_metrics(
+        int(cores),
+        float(metrics['cpu'].split()[0]),
+        int(memory[0]),
+        int(memory[1]) if len(memory) > 1 else None
+    )
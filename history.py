@@ -0,0 +1,357 @@
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+class RingBuffer:
+    """
+    Fixed-size ring buffer of float samples with an incrementally maintained EWMA.
+    Appending is O(1); percentile queries sort at most `capacity` samples.
+    The samples can live in memory or in a slot of a memory-mapped SeriesFile so history survives restarts.
+    """
+    _HEADER = struct.Struct('<4sIIId')  # magic, capacity, position, count, ewma
+    _MAGIC = b'PCBR'
+
+    def __init__(self, capacity, alpha=0.3, mapping=None, offset=0):
+        """
+        :param capacity: Number of samples kept.
+        :param alpha: EWMA smoothing factor (weight of the newest sample).
+        :param mapping: Optional memory map holding the buffer at `offset` (see SeriesFile.allocate).
+        """
+        self.capacity = capacity
+        self.alpha = alpha
+        self._mmap = mapping
+        self._offset = offset
+        if mapping is not None:
+            # No memoryview is kept on the map, so the SeriesFile can still grow it
+            magic, stored_capacity, position, count, ewma = self._HEADER.unpack_from(mapping, offset)
+            if magic != self._MAGIC or stored_capacity != capacity:
+                position, count, ewma = 0, 0, math.nan
+            self._position, self._count, self._ewma = position, count, ewma
+            self._samples = None
+            self._write_header()
+        else:
+            self._samples = array('d', [0.0]) * capacity
+            self._position = 0
+            self._count = 0
+            self._ewma = math.nan
+
+    def _write_header(self):
+        if self._mmap is not None:
+            self._HEADER.pack_into(self._mmap, self._offset, self._MAGIC, self.capacity, self._position, self._count, self._ewma)
+
+    def _load(self, start, stop):
+        if self._mmap is None:
+            return list(self._samples[start:stop])
+        if stop <= start:
+            return []
+        return list(struct.unpack_from(f'<{stop - start}d', self._mmap, self._offset + self._HEADER.size + 8 * start))
+
+    def append(self, value):
+        """
+        Add a sample, overwriting the oldest one when the buffer is full.
+        """
+        if self._mmap is None:
+            self._samples[self._position] = value
+        else:
+            struct.pack_into('<d', self._mmap, self._offset + self._HEADER.size + 8 * self._position, value)
+        self._position = (self._position + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self._ewma = value if math.isnan(self._ewma) else self.alpha * value + (1 - self.alpha) * self._ewma
+        self._write_header()
+
+    def values(self):
+        """
+        :return: Samples from oldest to newest.
+        """
+        if self._count < self.capacity:
+            return self._load(0, self._count)
+        return self._load(self._position, self.capacity) + self._load(0, self._position)
+
+    def last(self):
+        if not self._count:
+            return None
+        index = (self._position - 1) % self.capacity
+        return self._load(index, index + 1)[0]
+
+    def ewma(self):
+        return None if math.isnan(self._ewma) else self._ewma
+
+    def percentile(self, q):
+        """
+        :param q: Percentile between 0 and 100.
+        :return: The q-th percentile (nearest rank) of the stored samples, or None when empty.
+        """
+        if not self._count:
+            return None
+        ordered = sorted(self._load(0, self._count))
+        rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+        return ordered[rank]
+
+    def restore(self, values, ewma=None):
+        """
+        Refill the buffer with saved samples (oldest first) and their EWMA.
+        """
+        for value in values[-self.capacity:]:
+            self.append(value)
+        if ewma is not None:
+            self._ewma = ewma
+            self._write_header()
+
+    def close(self):
+        # The map belongs to the SeriesFile, which flushes and closes it
+        self._mmap = None
+
+    def __len__(self):
+        return self._count
+
+class SeriesFile:
+    """
+    Memory-mapped file holding every series of one host in fixed-size slots (a name and a RingBuffer),
+    so a host costs one file descriptor and one mapping however many containers it has. The slots of
+    dropped series are reused; the file only grows when every slot is taken.
+    """
+    _HEADER = struct.Struct('<4sII')  # magic, capacity, slots
+    _MAGIC = b'PCBH'
+    _NAME = 64
+
+    def __init__(self, path, capacity):
+        """
+        :param path: File of the host's series.
+        :param capacity: Samples per series; a file written with another capacity is started over.
+        """
+        self.path = path
+        self.capacity = capacity
+        self.slot_size = self._NAME + RingBuffer._HEADER.size + 8 * capacity
+        self.slots = {}  # Series name -> slot index
+        self._free = []
+        with open(path, 'a+b') as file:
+            file.seek(0)
+            header = file.read(self._HEADER.size)
+            valid = len(header) == self._HEADER.size and self._HEADER.unpack(header)[:2] == (self._MAGIC, capacity)
+            if not valid:
+                file.truncate(0)
+                file.write(self._HEADER.pack(self._MAGIC, capacity, 0))
+                file.flush()
+            size = os.path.getsize(path)
+            # The map keeps its own descriptor; the file object is closed right away
+            self._mmap = mmap.mmap(file.fileno(), size)
+        count = min(self._HEADER.unpack_from(self._mmap, 0)[2], (size - self._HEADER.size) // self.slot_size)
+        self._count = count
+        for slot in range(count):
+            start = self._slot_offset(slot)
+            name = bytes(self._mmap[start:start + self._NAME]).rstrip(b'\0').decode(errors='replace')
+            if name:
+                self.slots[name] = slot
+            else:
+                self._free.append(slot)
+
+    def _slot_offset(self, slot):
+        return self._HEADER.size + slot * self.slot_size
+
+    def allocate(self, name):
+        """
+        :param name: Series name (at most 64 bytes), e.g. 'container/101/load'.
+        :return: Tuple of (memory map, offset) of the series' RingBuffer.
+        """
+        slot = self.slots.get(name)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                start = self._slot_offset(slot)
+                self._mmap[start + self._NAME:start + self.slot_size] = bytes(self.slot_size - self._NAME)
+            else:
+                slot = self._count
+                self._count += 1
+                self._mmap.resize(self._slot_offset(self._count))
+                self._HEADER.pack_into(self._mmap, 0, self._MAGIC, self.capacity, self._count)
+            start = self._slot_offset(slot)
+            self._mmap[start:start + self._NAME] = name.encode()[:self._NAME].ljust(self._NAME, b'\0')
+            self.slots[name] = slot
+        return self._mmap, self._slot_offset(slot) + self._NAME
+
+    def release(self, name):
+        """
+        Drop a series; its slot is reused by the next allocation.
+        """
+        slot = self.slots.pop(name, None)
+        if slot is not None:
+            start = self._slot_offset(slot)
+            self._mmap[start:start + self._NAME] = bytes(self._NAME)
+            self._free.append(slot)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+
+class MetricsHistory:
+    """
+    Per-host and per-container history of load and memory usage samples.
+    Keys are ('host', name, metric) or ('container', host, vmid, metric); each gets its own RingBuffer.
+    With a directory, the series of each host live in one memory-mapped SeriesFile.
+    """
+
+    def __init__(self, capacity=30, alpha=0.3, directory=None):
+        """
+        :param capacity: Samples kept per series (e.g. 30 cycles).
+        :param alpha: EWMA smoothing factor.
+        :param directory: Optional directory for memory-mapped series files.
+        """
+        self.capacity = capacity
+        self.alpha = alpha
+        self.directory = directory
+        self._series = {}
+        self._files = {}  # Host name -> SeriesFile
+        self._recorded = {}  # (host, vmid) -> ContainerState last recorded
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _series_name(key):
+        # Name of a series inside its host's file: the key without the host name
+        return '/'.join(str(part) for part in key[:1] + key[2:])
+
+    def _host_file(self, host_name):
+        series_file = self._files.get(host_name)
+        if series_file is None:
+            path = os.path.join(self.directory, f"{host_name}.series")
+            series_file = self._files[host_name] = SeriesFile(path, self.capacity)
+        return series_file
+
+    def series(self, *key):
+        with self._lock:
+            buffer = self._series.get(key)
+            if buffer is None:
+                if self.directory:
+                    mapping, offset = self._host_file(key[1]).allocate(self._series_name(key))
+                    buffer = RingBuffer(self.capacity, self.alpha, mapping, offset)
+                else:
+                    buffer = RingBuffer(self.capacity, self.alpha)
+                self._series[key] = buffer
+            return buffer
+
+    def prune(self, hosts, known=None):
+        """
+        Drop the series of containers that are no longer on their host and, with `known`, every
+        series (and the history file) of hosts that are no longer configured.
+        :param hosts: Dictionary of host name -> freshly collected HostState. The container series of
+                      other hosts (e.g. hosts that did not answer) are kept.
+        :param known: Optional collection of the configured host names.
+        :return: Number of series dropped.
+        """
+        live = {name: {container.vmid for container in host.containers} for name, host in hosts.items()}
+
+        def dropped(key):
+            if known is not None and key[1] not in known:
+                return True
+            return key[0] == 'container' and key[1] in live and key[2] not in live[key[1]]
+
+        count = 0
+        with self._lock:
+            for key in [key for key in self._recorded if dropped(('container',) + key)]:
+                del self._recorded[key]
+            for key in [key for key in self._series if dropped(key)]:
+                self._series.pop(key).close()
+                if key[1] in self._files:
+                    self._files[key[1]].release(self._series_name(key))
+                count += 1
+            if not self.directory:
+                return count
+            if known is not None:
+                for file_name in os.listdir(self.directory):
+                    host_name = file_name[:-len('.series')]
+                    if file_name.endswith('.series') and host_name not in known:
+                        series_file = self._files.pop(host_name, None)
+                        if series_file is not None:
+                            series_file.close()
+                        os.remove(os.path.join(self.directory, file_name))
+            for host_name in live:
+                series_file = self._files.get(host_name)
+                if series_file is None and os.path.exists(os.path.join(self.directory, f"{host_name}.series")):
+                    series_file = self._host_file(host_name)
+                if series_file is None:
+                    continue
+                for name in list(series_file.slots):
+                    parts = name.split('/')
+                    if parts[0] == 'container' and parts[1] not in live[host_name]:
+                        series_file.release(name)
+                        count += 1
+        return count
+
+    def record_host(self, host):
+        """
+        Append the current samples of a HostState (1-minute load and memory usage).
+        """
+        self.series('host', host.name, 'load').append(host.load_1)
+        self.series('host', host.name, 'memory').append(host.memory_usage)
+
+    def record_container(self, host_name, container):
+        """
+        Append the current samples of a ContainerState. A sample that was already recorded (the
+        same ContainerState, e.g. served again from the container cache) is skipped, so it cannot
+        weigh more than once in the EWMA and percentiles.
+        """
+        if self._recorded.get((host_name, container.vmid)) is container:
+            return
+        self._recorded[(host_name, container.vmid)] = container
+        if container.has_metrics:
+            self.series('container', host_name, container.vmid, 'load').append(container.cpu_load)
+            self.series('container', host_name, container.vmid, 'memory').append(container.memory_used)
+
+    def value(self, key, current, mode='instant', percentile=95):
+        """
+        Return the value of a series according to the signal mode.
+        :param key: Series key.
+        :param current: Instantaneous value, returned for 'instant' or when there is no history.
+        :param mode: 'instant', 'ewma' or 'p95' (any 'pNN' percentile).
+        :return: Smoothed, percentile or instantaneous value.
+        """
+        if mode == 'instant':
+            return current
+        with self._lock:
+            buffer = self._series.get(key)
+        if buffer is None or not len(buffer):
+            return current
+        if mode == 'ewma':
+            return buffer.ewma()
+        if mode.startswith('p') and mode[1:].isdigit():
+            return buffer.percentile(int(mode[1:]))
+        return current
+
+    def state(self):
+        """
+        :return: Dictionary of series key -> (samples oldest first, EWMA), e.g. for persisting them between runs.
+        """
+        with self._lock:
+            series = list(self._series.items())
+        return {key: (buffer.values(), buffer.ewma()) for key, buffer in series if len(buffer)}
+
+    def restore(self, state):
+        """
+        Restore series saved with state(). Series that already hold samples are left untouched.
+        """
+        for key, (values, ewma) in state.items():
+            buffer = self.series(*key)
+            if not len(buffer):
+                buffer.restore(values, ewma)
+
+    def host_load(self, host, mode='instant'):
+        return self.value(('host', host.name, 'load'), host.load_1, mode)
+
+    def host_memory_usage(self, host, mode='instant'):
+        return self.value(('host', host.name, 'memory'), host.memory_usage, mode)
+
+    def close(self):
+        with self._lock:
+            for buffer in self._series.values():
+                buffer.close()
+            self._series.clear()
+            for series_file in self._files.values():
+                series_file.close()
+            self._files.clear()
+            self._recorded.clear()
@@ -0,0 +1,328 @@
+import bisect
+from placement import CPU_WEIGHT, MEMORY_WEIGHT, np, _as_number, relieved
+
+# Rows scored at once by the vectorized rescans, bounds the size of the temporary matrices
+CHUNK_ROWS = 4096
+
+class IncrementalPlanner:
+    """
+    Load-based placement that is kept up to date across planning rounds instead of being rebuilt.
+
+    The planner keeps a snapshot of every host (load, memory, free capacity, thresholds) and every
+    migration candidate, the hosts ordered by balance score, and each candidate's best target in
+    the snapshot state. On every round only the hosts and candidates whose values changed by more
+    than `epsilon` are taken over into the snapshot:
+
+    - changed candidates, and candidates whose best target changed, are rescored against all hosts;
+    - every other candidate only compares its cached best target with the changed hosts.
+
+    The greedy pass that assigns candidates in priority order then only rescores a candidate
+    against the hosts touched by the moves planned before it. The plan is the same as the one of
+    PlacementEngine for the snapshot state, at a cost that follows the size of the change.
+    """
+
+    def __init__(self, epsilon=0.01, network_weight=0.0, use_numpy=True):
+        """
+        :param epsilon: Relative change (of a host's base score and free memory, or of a container's
+                        CPU load and memory) below which the previous values are kept.
+        :param network_weight: Weight of the network utilization in the target score.
+        :param use_numpy: Use NumPy for the rescans when it is installed.
+        """
+        self.epsilon = epsilon
+        self.network_weight = network_weight
+        self.vectorized = use_numpy and np is not None
+        self.hosts = {}        # Host name -> snapshot dict
+        self.order = []        # Sorted list of (-balance score, host name)
+        self.scores = {}       # Host name -> balance score in self.order
+        self.candidates = {}   # (source host, vmid) -> snapshot dict with the cached 'best' (score, target) or None
+        self.rounds = 0
+        self.hosts_changed = 0
+        self.candidates_rescored = 0
+        self.candidates_compared = 0
+        self._arrays = None
+
+    # Hosts
+
+    def _host_snapshot(self, host):
+        memory_total = host.memory_total or 1
+        snapshot = {
+            'load': host.load_signal,
+            'memory_used': host.memory_signal * host.memory_total,
+            'free_memory': host.free_memory,
+            'free_cores': host.free_cores,
+            'memory_total': memory_total,
+            'cpu_threshold': host.cpu_threshold,
+            'memory_threshold': host.memory_threshold,
+            'network_score': host.network_utilization / host.network_threshold * self.network_weight,
+            'blocked': host.network_overloaded,
+        }
+        snapshot['base'] = (snapshot['load'] / snapshot['cpu_threshold'] * CPU_WEIGHT
+                            + snapshot['memory_used'] / memory_total * MEMORY_WEIGHT + snapshot['network_score'])
+        return snapshot
+
+    def _host_changed(self, old, new):
+        return (old['blocked'] != new['blocked']
+                or old['free_cores'] != new['free_cores']
+                or old['cpu_threshold'] != new['cpu_threshold']
+                or old['memory_threshold'] != new['memory_threshold']
+                or old['memory_total'] != new['memory_total']
+                or abs(new['base'] - old['base']) > self.epsilon * max(abs(old['base']), 1e-9)
+                or abs(new['free_memory'] - old['free_memory']) > self.epsilon * old['memory_total'])
+
+    def update_hosts(self, hosts):
+        """
+        Take the changed hosts over into the snapshot.
+        :param hosts: Iterable of HostState with the allocation fields filled in.
+        :return: Tuple of (names of changed or added hosts, names of removed hosts).
+        """
+        seen = set()
+        changed = set()
+        for host in hosts:
+            seen.add(host.name)
+            snapshot = self._host_snapshot(host)
+            old = self.hosts.get(host.name)
+            if old is None or self._host_changed(old, snapshot):
+                self.hosts[host.name] = snapshot
+                changed.add(host.name)
+        removed = set(self.hosts) - seen
+        for name in removed:
+            del self.hosts[name]
+        if changed or removed:
+            self._arrays = None
+        self.hosts_changed += len(changed)
+        return changed, removed
+
+    def order_hosts(self, hosts, balance_score):
+        """
+        Keep the hosts ordered by balance score; only hosts whose score changed are moved in the order.
+        :param hosts: Dictionary of host name -> HostState.
+        :param balance_score: Function HostState -> balance score.
+        :return: The hosts sorted by balance score, highest first.
+        """
+        for name, host in hosts.items():
+            score = balance_score(host)
+            if self.scores.get(name) != score:
+                self._reorder(name, score)
+        for name in [name for name in self.scores if name not in hosts]:
+            self._reorder(name, None)
+        return [hosts[name] for _, name in self.order]
+
+    def _reorder(self, name, score):
+        old = self.scores.pop(name, None)
+        if old is not None:
+            index = bisect.bisect_left(self.order, (-old, name))
+            del self.order[index]
+        if score is not None:
+            self.scores[name] = score
+            bisect.insort(self.order, (-score, name))
+
+    # Candidates
+
+    @staticmethod
+    def _key(candidate):
+        return (candidate['source_host'], candidate['container_id'])
+
+    def _candidate_changed(self, old, candidate):
+        return (old['cores'] != candidate['container_cores']
+                or abs(candidate['container_cpu_load'] - old['cpu']) > self.epsilon * max(abs(old['cpu']), 1e-9)
+                or abs(candidate['container_memory'] - old['memory']) > self.epsilon * max(abs(old['memory']), 1))
+
+    def update_candidates(self, candidates, changed_hosts, removed_hosts):
+        """
+        Take the changed candidates over into the snapshot and refresh the cached best targets.
+        :return: List of snapshot entries in the order of `candidates`.
+        """
+        entries = []
+        rescore = []
+        compare = []
+        current = set()
+        stale = changed_hosts | removed_hosts
+        for candidate in candidates:
+            key = self._key(candidate)
+            current.add(key)
+            entry = self.candidates.get(key)
+            if entry is None or self._candidate_changed(entry, candidate):
+                entry = {
+                    'source': candidate['source_host'],
+                    'cpu': candidate['container_cpu_load'],
+                    'memory': candidate['container_memory'],
+                    'cores': candidate['container_cores'],
+                    'best': None,
+                }
+                self.candidates[key] = entry
+                rescore.append(entry)
+            elif entry['best'] is not None and entry['best'][1] in stale:
+                rescore.append(entry)
+            elif changed_hosts:
+                compare.append(entry)
+            entry['candidate'] = candidate
+            entries.append(entry)
+        for key in [key for key in self.candidates if key not in current]:
+            del self.candidates[key]
+
+        names = list(self.hosts)
+        if rescore:
+            for entry, best in zip(rescore, self._best_targets(rescore, names)):
+                entry['best'] = best
+        if compare:
+            changed = [name for name in names if name in changed_hosts]
+            for entry, best in zip(compare, self._best_targets(compare, changed)):
+                if best is not None and (entry['best'] is None or best < entry['best']):
+                    entry['best'] = best
+        self.candidates_rescored += len(rescore)
+        self.candidates_compared += len(compare)
+        return entries
+
+    def _host_arrays(self):
+        if self._arrays is None:
+            names = list(self.hosts)
+            snapshots = [self.hosts[name] for name in names]
+            arrays = {'index': {name: j for j, name in enumerate(names)}}
+            for field in ('base', 'free_memory', 'free_cores', 'cpu_threshold', 'memory_total'):
+                arrays[field] = np.asarray([snapshot[field] for snapshot in snapshots], dtype=np.float64)
+            arrays['blocked'] = np.asarray([snapshot['blocked'] for snapshot in snapshots], dtype=bool)
+            arrays['cpu_weight'] = CPU_WEIGHT / arrays['cpu_threshold']
+            arrays['memory_weight'] = MEMORY_WEIGHT / arrays['memory_total']
+            self._arrays = arrays
+        return self._arrays
+
+    def _best_targets(self, entries, names):
+        """
+        Best feasible target among `names` for each entry, in the snapshot state.
+        :return: List of (score, host name) or None when no host fits.
+        """
+        if not names:
+            return [None] * len(entries)
+        if not self.vectorized:
+            return [self._best_target(entry, names) for entry in entries]
+
+        arrays = self._host_arrays()
+        columns = np.asarray([arrays['index'][name] for name in names])
+        base = arrays['base'][columns]
+        cpu_weight = arrays['cpu_weight'][columns]
+        memory_weight = arrays['memory_weight'][columns]
+        free_memory = arrays['free_memory'][columns]
+        free_cores = arrays['free_cores'][columns]
+        blocked = arrays['blocked'][columns]
+        position = {name: k for k, name in enumerate(names)}
+
+        result = []
+        for start in range(0, len(entries), CHUNK_ROWS):
+            chunk = entries[start:start + CHUNK_ROWS]
+            cpu = np.asarray([entry['cpu'] for entry in chunk], dtype=np.float64)
+            memory = np.asarray([entry['memory'] for entry in chunk], dtype=np.float64)
+            cores = np.asarray([entry['cores'] for entry in chunk], dtype=np.float64)
+            scores = base + np.outer(cpu, cpu_weight) + np.outer(memory, memory_weight)
+            scores[(free_memory < memory[:, None]) | (free_cores < cores[:, None]) | blocked] = np.inf
+            for row, entry in enumerate(chunk):
+                source = position.get(entry['source'])
+                if source is not None:
+                    scores[row, source] = np.inf
+            best = np.argmin(scores, axis=1)
+            for row, column in enumerate(best):
+                value = scores[row, column]
+                result.append(None if value == np.inf else (float(value), names[column]))
+        return result
+
+    def _best_target(self, entry, names, projected=None):
+        best = None
+        for name in names:
+            if name == entry['source']:
+                continue
+            score = self._target_score(entry, name, projected)
+            if score is not None and (best is None or (score, name) < best):
+                best = (score, name)
+        return best
+
+    def _state(self, name, projected):
+        if projected is not None and name in projected:
+            return projected[name]
+        return self.hosts[name]
+
+    def _target_score(self, entry, name, projected=None):
+        host = self._state(name, projected)
+        if host['blocked'] or host['free_memory'] < entry['memory'] or host['free_cores'] < entry['cores']:
+            return None
+        return ((host['load'] + entry['cpu']) / host['cpu_threshold'] * CPU_WEIGHT
+                + (host['memory_used'] + entry['memory']) / host['memory_total'] * MEMORY_WEIGHT + host['network_score'])
+
+    # Planning
+
+    def plan(self, hosts, candidates, stop_when_relieved=True):
+        """
+        Update the snapshot with the current hosts and candidates, then assign each candidate, in
+        order, to the feasible target with the lowest projected score (see PlacementEngine.plan).
+        :param hosts: Iterable of HostState with the allocation fields filled in.
+        :param candidates: Migration candidates sorted by priority.
+        :param stop_when_relieved: Skip candidates whose source host is no longer overloaded.
+        :return: List of placements (same structure as PlacementEngine.plan).
+        """
+        self.rounds += 1
+        changed_hosts, removed_hosts = self.update_hosts(hosts)
+        entries = self.update_candidates(candidates, changed_hosts, removed_hosts)
+
+        placements = []
+        projected = {}   # Host name -> projected snapshot of the hosts touched by planned moves
+        for entry in entries:
+            source = entry['source']
+            if source not in self.hosts:
+                continue
+            if stop_when_relieved and self._relieved(self._state(source, projected)):
+                continue
+
+            best = entry['best']
+            if best is not None and best[1] in projected:
+                best = self._best_target(entry, list(self.hosts), projected)
+            elif projected:
+                touched = self._best_target(entry, list(projected), projected)
+                if touched is not None and (best is None or touched < best):
+                    best = touched
+            if best is None:
+                continue
+
+            target = best[1]
+            host = self._state(target, projected)
+            cpu_score = (host['load'] + entry['cpu']) / host['cpu_threshold']
+            memory_score = (host['memory_used'] + entry['memory']) / host['memory_total']
+            placements.append({
+                'candidate': entry['candidate'],
+                'target_host': target,
+                'free_memory': _as_number(host['free_memory']),
+                'free_cores': _as_number(host['free_cores']),
+                'cpu_score': float(cpu_score),
+                'memory_score': float(memory_score),
+                'total_score': float(cpu_score * CPU_WEIGHT + memory_score * MEMORY_WEIGHT + host['network_score']),
+                'balance_score_after_migration': float(
+                    cpu_score * CPU_WEIGHT + memory_score / host['memory_threshold'] * MEMORY_WEIGHT + host['network_score']
+                ),
+            })
+            self._project(projected, target, entry, 1)
+            self._project(projected, source, entry, -1)
+        return placements
+
+    def _project(self, projected, name, entry, sign):
+        if name not in projected:
+            projected[name] = dict(self.hosts[name])
+        host = projected[name]
+        host['load'] += sign * entry['cpu']
+        host['memory_used'] += sign * entry['memory']
+        host['free_memory'] -= sign * entry['memory']
+        host['free_cores'] -= sign * entry['cores']
+        if sign < 0:
+            host['moves_out'] = host.get('moves_out', 0) + 1
+
+    @staticmethod
+    def _relieved(host):
+        return relieved(host['load'], host['cpu_threshold'], host['memory_used'] / host['memory_total'],
+                        host['memory_threshold'], host['blocked'], host.get('moves_out', 0))
+
+    def stats(self):
+        """
+        :return: Dictionary with the work done so far (rounds, changed hosts, rescored and compared candidates).
+        """
+        return {
+            'rounds': self.rounds,
+            'hosts_changed': self.hosts_changed,
+            'candidates_rescored': self.candidates_rescored,
+            'candidates_compared': self.candidates_compared,
+        }
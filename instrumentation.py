@@ -0,0 +1,256 @@
+import bisect
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (Prometheus style: cumulative buckets, count and sum).
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimate a quantile from the buckets (upper bound of the bucket holding it).
+        :param q: Quantile between 0 and 1.
+        :return: Latency in seconds (the observed maximum for the +Inf bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def cumulative(self):
+        """
+        :return: List of (upper bound label, cumulative count), ending with '+Inf'.
+        """
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class Metrics:
+    """
+    Registry of the balancer's own performance metrics:
+    SSH connect and remote command latencies (by host and command), bytes read, errors,
+    and wall time of the cycle phases (collection, container fetch, planning, ...).
+    Totals are kept for the /metrics endpoint; a per-cycle copy feeds the end-of-cycle log summary.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        """
+        :param clock: Monotonic clock function, replaceable for testing.
+        """
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._labels = weakref.WeakKeyDictionary()
+        self.commands = {}     # (host, command) -> Histogram
+        self.connects = {}     # host -> Histogram
+        self.bytes_read = {}   # (host, command) -> bytes
+        self.errors = {}       # (host, command) -> count
+        self.phases = {}       # phase -> Histogram
+        self.cycles = 0
+        self.start_cycle()
+
+    def start_cycle(self):
+        """
+        Reset the per-cycle figures used by summary().
+        """
+        with self._lock:
+            self.cycle_commands = {}
+            self.cycle_phases = {}
+            self.cycle_bytes = 0
+            self.cycle_errors = 0
+
+    def label_client(self, client, host):
+        """
+        Remember which host an SSH client belongs to, so its commands are labeled with the host name.
+        """
+        try:
+            self._labels[client] = host
+        except TypeError:
+            pass  # Clients that cannot be weakly referenced stay unlabeled
+
+    def client_label(self, client):
+        try:
+            return self._labels.get(client, 'unknown')
+        except TypeError:
+            return 'unknown'
+
+    def observe_connect(self, host, seconds, error=False):
+        with self._lock:
+            self.connects.setdefault(host, Histogram()).observe(seconds)
+            self._add_command(host, 'connect', seconds, 0, error)
+
+    def observe_command(self, host, command, seconds, bytes_read=0, error=False):
+        """
+        Record one remote command.
+        :param host: Host name.
+        :param command: Short command name (e.g. 'host_batch', 'pct_exec'), not the full command line.
+        :param seconds: Time from sending the command until its output was read.
+        :param bytes_read: Bytes read from stdout and stderr.
+        :param error: Whether the command failed or wrote to stderr.
+        """
+        with self._lock:
+            self.commands.setdefault((host, command), Histogram()).observe(seconds)
+            self._add_command(host, command, seconds, bytes_read, error)
+
+    def _add_command(self, host, command, seconds, bytes_read, error):
+        key = (host, command)
+        self.bytes_read[key] = self.bytes_read.get(key, 0) + bytes_read
+        if error:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        entry = self.cycle_commands.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        self.cycle_bytes += bytes_read
+        self.cycle_errors += 1 if error else 0
+
+    def observe_phase(self, phase, seconds):
+        with self._lock:
+            self.phases.setdefault(phase, Histogram()).observe(seconds)
+            self.cycle_phases[phase] = self.cycle_phases.get(phase, 0.0) + seconds
+            if phase == 'cycle':
+                self.cycles += 1
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager timing a phase of the cycle.
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe_phase(name, self.clock() - start)
+
+    def summary(self, top=3):
+        """
+        Summarize the current cycle for the log.
+        :param top: Number of slowest hosts and commands to list.
+        :return: List of summary lines.
+        """
+        with self._lock:
+            phases = dict(self.cycle_phases)
+            commands = {key: list(value) for key, value in self.cycle_commands.items()}
+            cycle_bytes = self.cycle_bytes
+            cycle_errors = self.cycle_errors
+
+        calls = sum(entry[0] for entry in commands.values())
+        lines = [
+            "Cycle phases: " + ', '.join(f"{name} {seconds:.3f}s" for name, seconds in phases.items()),
+            f"Remote commands: {calls} calls, {cycle_bytes} bytes read, {cycle_errors} errors"
+        ]
+
+        by_host = {}
+        for (host, _), (count, total, _) in commands.items():
+            by_host[host] = by_host.get(host, 0.0) + total
+        slowest_hosts = sorted(by_host.items(), key=lambda item: item[1], reverse=True)[:top]
+        if slowest_hosts:
+            lines.append("Slowest hosts: " + ', '.join(f"{host} {total:.3f}s" for host, total in slowest_hosts))
+
+        slowest_commands = sorted(commands.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        if slowest_commands:
+            lines.append("Slowest commands: " + ', '.join(
+                f"{command}@{host} max {maximum:.3f}s ({count} calls)" for (host, command), (count, _, maximum) in slowest_commands
+            ))
+        return lines
+
+    def render(self):
+        """
+        :return: All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = []
+            self._render_histograms(lines, 'balancer_ssh_command_seconds', 'Remote command latency.',
+                                    {(('host', host), ('command', command)): histogram for (host, command), histogram in self.commands.items()})
+            self._render_histograms(lines, 'balancer_ssh_connect_seconds', 'SSH connection setup latency.',
+                                    {(('host', host),): histogram for host, histogram in self.connects.items()})
+            self._render_histograms(lines, 'balancer_phase_seconds', 'Wall time of the balancing cycle phases.',
+                                    {(('phase', phase),): histogram for phase, histogram in self.phases.items()})
+            self._render_counter(lines, 'balancer_ssh_bytes_read_total', 'Bytes read from remote commands.', self.bytes_read)
+            self._render_counter(lines, 'balancer_ssh_errors_total', 'Failed remote commands and connections.', self.errors)
+            lines.append('# HELP balancer_cycles_total Completed balancing cycles.')
+            lines.append('# TYPE balancer_cycles_total counter')
+            lines.append(f'balancer_cycles_total {self.cycles}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels_text(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        escaped = (
+            f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in pairs
+        )
+        return '{' + ','.join(escaped) + '}'
+
+    def _render_histograms(self, lines, name, help_text, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, histogram in histograms.items():
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{self._labels_text(labels, [("le", bound)])} {count}')
+            lines.append(f'{name}_sum{self._labels_text(labels)} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{self._labels_text(labels)} {histogram.count}')
+
+    def _render_counter(self, lines, name, help_text, values):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (host, command), value in values.items():
+            lines.append(f'{name}{self._labels_text([("host", host), ("command", command)])} {value}')
+
+# Registry used by the collection and planning code
+METRICS = Metrics()
+
+def start_metrics_server(port, address='0.0.0.0', metrics=METRICS):
+    """
+    Serve the metrics on http://<address>:<port>/metrics from a background thread.
+    :param port: TCP port.
+    :param address: Address to bind to.
+    :param metrics: Metrics registry to export.
+    :return: The running HTTP server (call shutdown() to stop it).
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would flood the balancer log
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
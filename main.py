@@ -1,224 +1,324 @@
 from logger import setup_logging
-from config import load_config
-from functions import ssh_connect, get_host_metrics, get_container_metrics, get_container_config
+from config import load_config, compile_config, ConfigError, ConfigWatcher, diff_hosts
+from cache import ContainerMetricsCache
+from connections import SSHConnectionPool
+from history import MetricsHistory
+from incremental import IncrementalPlanner
+from instrumentation import METRICS, start_metrics_server
+from network import NetworkRateSampler, network_utilization
+from collectors import create_collector
+from functions import get_container_metrics, get_container_config, get_container_cgroup_metrics, build_container_state, deadline, set_command_timeout
+from placement import PlacementEngine
+from planner import GlobalPlanner
+from scenario import Scenario, run_scenario
+from scheduler import PollingScheduler, plan_changed
+from sharding import PlanningPool, ShardedPlanner, host_groups
+from snapshot import save_snapshot, load_snapshot, restore_snapshot
 from sensors import check_cpu_load, check_memory_usage
-from triggers import send_alert
+from triggers import send_alert, MigrationExecutor
 from utils import format_metrics_for_logging
+import argparse
 import logging
+import signal
+import threading
+import time
 from colorama import init, Fore, Style
 
 # Suppress paramiko INFO-level logs
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 
-def can_migrate(container_metrics, target_host_metrics):
-    container_memory = int(container_metrics['memory'].split()[0])
-    container_cpu_load = float(container_metrics['cpu'].split()[0])
+def can_migrate(container, target_host):
+    available_memory = target_host.memory_total - target_host.memory_used
+    available_cpu_cores = target_host.cpu_cores
 
-    available_memory = int(target_host_metrics['total_memory']) - int(target_host_metrics['used_memory'])
-    available_cpu_cores = int(target_host_metrics['cpu_cores'])
-
-    if container_memory <= available_memory and container_cpu_load < available_cpu_cores:
+    if container.memory_used <= available_memory and container.cpu_load < available_cpu_cores:
         return True
     return False
 
 # Initialize colorama
 init(autoreset=True)
 
-def suggest_migrations(hosts_metrics, default_params):
+def fetch_container_stats(pool, host, containers, default_params, cache):
+    """
+    Fetch the configuration and metrics of a set of containers on one host.
+    Containers already in the cache are served from it; only the missing ones are fetched.
+    With `container_metrics_source: cgroup` every missing container is read in a single pass from
+    the host's cgroup tree; containers missing from it fall back to `pct exec` / `pct config`.
+    :param pool: SSHConnectionPool used to reach the host.
+    :param host: HostState of the host the containers run on.
+    :param containers: ContainerState objects to fetch.
+    :param default_params: Default parameters from the configuration.
+    :param cache: ContainerMetricsCache shared by the whole cycle.
+    :return: Dictionary of VMID -> ContainerState (without metrics if they could not be fetched).
+    """
+    stats = {}
+    missing = []
+    for container in containers:
+        cached = cache.get(host.name, container.vmid)
+        if cached is not None:
+            stats[container.vmid] = cached
+        else:
+            missing.append(container)
+
+    if not missing:
+        return stats
+
+    with METRICS.phase('container_fetch'):
+        _fetch_missing_containers(pool, host, missing, stats, default_params, cache)
+    return stats
+
+def _fetch_missing_containers(pool, host, missing, stats, default_params, cache):
+    ssh = pool.get(host.connection)
+    if default_params.get('container_metrics_source', 'pct') == 'cgroup':
+        bulk = get_container_cgroup_metrics(ssh)
+        for container in missing:
+            if container.vmid in bulk:
+                metrics = bulk[container.vmid]
+                # No core limit means the container may use all host cores
+                state = build_container_state(container, {'cores': metrics['cores']}, metrics, default_cores=host.cpu_cores)
+                if state is not None:
+                    stats[container.vmid] = state
+                    cache.put(host.name, container.vmid, state)
+
+    for container in missing:
+        if container.vmid not in stats:
+            # `pct config` is skipped while the config file keeps the modification time its cores were read at
+            cores = cache.config_cores(host.name, container.vmid, container.config_mtime)
+            config = {'cores': cores} if cores is not None else get_container_config(ssh, container.vmid)
+            state = build_container_state(container, config, get_container_metrics(ssh, container.vmid))
+            if state is not None:
+                cache.put_config(host.name, container.vmid, container.config_mtime, state.cores)
+            stats[container.vmid] = state if state is not None else container
+            cache.put(host.name, container.vmid, stats[container.vmid])
+
+def calculate_balance_score(cpu_load, memory_usage, cpu_threshold, memory_threshold, network_utilization=0.0, network_threshold=1.0, network_weight=0.0):
+    cpu_score = cpu_load / cpu_threshold
+    memory_score = memory_usage / memory_threshold
+    network_score = network_utilization / network_threshold
+    return cpu_score * 0.7 + memory_score * 0.3 + network_score * network_weight
+
+def calculate_migration_suitability_score(target_host, free_memory, free_cores, balance_score_after_migration, original_balance_score):
+    score = 0
+
+    if free_memory > 0:
+        score += (free_memory / target_host.memory_total) * 30
+
+    if free_cores > 0:
+        score += (free_cores / target_host.cpu_cores) * 30
+
+    balance_improvement = original_balance_score - balance_score_after_migration
+    if balance_improvement > 0:
+        score += (balance_improvement / original_balance_score) * 40
+
+    return min(int(score), 100)
+
+def host_balance_score(host, network_weight=0.0):
+    return calculate_balance_score(
+        host.load_signal, host.memory_signal, host.cpu_threshold, host.memory_threshold,
+        host.network_utilization, host.network_threshold, network_weight
+    )
+
+def host_overloaded(host):
+    return host.load_signal > host.cpu_threshold or host.memory_signal > host.memory_threshold or host.network_overloaded
+
+def suggest_migrations(hosts, default_params, pool=None, cache=None, history=None, planner=None, groups=None, shard_pool=None):
+    """
+    Suggest container migrations from overloaded hosts to hosts with spare capacity.
+    :param hosts: Dictionary of host name -> HostState.
+    :param default_params: Default parameters from the configuration.
+    :param pool: Optional SSHConnectionPool (a private one is used otherwise).
+    :param cache: Optional ContainerMetricsCache (a private one is used otherwise).
+    :param history: Optional MetricsHistory; with `load_signal: ewma|p95` container loads are smoothed too.
+    :param planner: Optional IncrementalPlanner kept across calls, used instead of PlacementEngine by `load_based`.
+    :param groups: Optional dictionary of host name -> planning group for sharded planning (see sharding.host_groups).
+    :param shard_pool: Optional PlanningPool kept across calls for sharded planning.
+    :return: List of migration suggestions.
+    Stale hosts (see HostState.stale), and hosts that miss `host_timeout` while their containers are
+    fetched, are left out: they are neither migration targets nor sources (the source runs `pct migrate`).
+    """
+    owns_pool = pool is None
+    if owns_pool:
+        pool = SSHConnectionPool()
+    if cache is None:
+        cache = ContainerMetricsCache(ttl=default_params.get('container_cache_ttl', 60))
+
     suggestions = []
     migration_reasons = []
+    signal = default_params.get('load_signal', 'instant')
+    network_weight = default_params.get('network_weight', 0.0)
+    host_timeout = default_params.get('host_timeout', 60)
 
-    def calculate_balance_score(cpu_load, memory_usage, cpu_threshold, memory_threshold):
-        cpu_score = cpu_load / cpu_threshold
-        memory_score = memory_usage / memory_threshold
-        return cpu_score * 0.7 + memory_score * 0.3
-
-    def calculate_migration_suitability_score(free_memory, free_cores, balance_score_after_migration, original_balance_score):
-        score = 0
-
-        if free_memory > 0:
-            score += (free_memory / int(target_host_metrics['memory'].split()[1])) * 30
-
-        if free_cores > 0:
-            score += (free_cores / int(target_host_metrics['cpu_cores'])) * 30
-
-        balance_improvement = original_balance_score - balance_score_after_migration
-        if balance_improvement > 0:
-            score += (balance_improvement / original_balance_score) * 40
+    stale_hosts = [host.name for host in hosts.values() if host.stale]
+    if stale_hosts:
+        print(f"{Fore.YELLOW}⏱️  Leaving stale hosts out of planning: {', '.join(stale_hosts)}")
+    fresh_hosts = {name: host for name, host in hosts.items() if not host.stale}
 
-        return min(int(score), 100)
-
-    sorted_hosts = sorted(hosts_metrics.items(), key=lambda item: calculate_balance_score(
-        float(item[1]['cpu'].split()[0]),
-        int(item[1]['memory'].split()[0]) / int(item[1]['memory'].split()[1]),
-        item[1].get('cpu_threshold', default_params['cpu_threshold']),
-        item[1].get('memory_threshold', default_params['memory_threshold'])
-    ), reverse=True)
+    with METRICS.phase('scoring'):
+        if planner is not None:
+            sorted_hosts = planner.order_hosts(fresh_hosts, lambda host: host_balance_score(host, network_weight))
+        else:
+            sorted_hosts = sorted(fresh_hosts.values(), key=lambda host: host_balance_score(host, network_weight), reverse=True)
 
     overloaded_hosts = []
-    for host_name, host_metrics in sorted_hosts:
-        cpu_threshold = host_metrics.get('cpu_threshold', default_params['cpu_threshold'])
-        memory_threshold = host_metrics.get('memory_threshold', default_params['memory_threshold'])
-        cpu_overloaded = float(host_metrics['cpu'].split()[0]) > cpu_threshold
-        memory_overloaded = int(host_metrics['memory'].split()[0]) / int(host_metrics['memory'].split()[1]) > memory_threshold
+    host_stats = {}  # Host name -> container stats of the first pass, reused for the candidates
+    for host in sorted_hosts:
+        cpu_overloaded = host.load_signal > host.cpu_threshold
+        memory_overloaded = host.memory_signal > host.memory_threshold
+        network_overloaded = host.network_overloaded
 
         # Debug information
-        print(f"🔍 Host: {host_name}, CPU Overloaded: {cpu_overloaded}, Memory Overloaded: {memory_overloaded}")
+        print(f"🔍 Host: {host.name}, CPU Overloaded: {cpu_overloaded}, Memory Overloaded: {memory_overloaded}, Network Overloaded: {network_overloaded} ({host.network_utilization:.0%})")
 
-        total_cores = int(host_metrics['cpu_cores'])
         used_cores = 0
         total_container_memory = 0
         total_container_cpu_load = 0
 
-        ssh = ssh_connect(host_metrics['address'], host_metrics['user'], password=host_metrics.get('password'), key_path=host_metrics.get('key_path'))
-
-        for container in host_metrics['containers']:
-            if container['status'] == 'running':
-                container_config = get_container_config(ssh, container['vmid'])
-                container_metrics = get_container_metrics(ssh, container['vmid'])
-                if container_config and 'cores' in container_config and container_metrics:
-                    container_cores = int(container_config['cores'])
-                    container_memory = int(container_metrics['memory'].split()[0])
-                    container_cpu_load = float(container_metrics['cpu'].split()[0])
-
-                    used_cores += container_cores
-                    total_container_memory += container_memory
-                    total_container_cpu_load += container_cpu_load
+        try:
+            with deadline(host_timeout):
+                container_stats = fetch_container_stats(pool, host, host.running_containers(), default_params, cache)
+        except Exception as e:
+            print(f"{Fore.RED}⏱️  Could not fetch the containers of {host.name} ({str(e) or type(e).__name__}), leaving the host out of planning")
+            host.stale = True
+            pool.discard(host.connection)
+            continue
+        host_stats[host.name] = container_stats
+
+        for container in host.running_containers():
+            state = container_stats[container.vmid]
+            if history is not None:
+                history.record_container(host.name, state)
+            if state.has_metrics:
+                used_cores += state.cores
+                total_container_memory += state.memory_used
+                total_container_cpu_load += state.cpu_load
+
+                # Print container metrics
+                print(f"{Fore.CYAN}Container {state.vmid} metrics:")
+                print(f"   - Cores: {state.cores}")
+                print(f"   - Memory Usage: {state.memory_used} MB")
+                print(f"   - CPU Load: {state.cpu_load}%")
+
+        free_cores = host.cpu_cores - used_cores
+        free_memory = host.memory_total - total_container_memory
 
-                    # Print container metrics
-                    print(f"{Fore.CYAN}Container {container['vmid']} metrics:")
-                    print(f"   - Cores: {container_cores}")
-                    print(f"   - Memory Usage: {container_memory} MB")
-                    print(f"   - CPU Load: {container_cpu_load}%")
+        # Debug information
+        print(f"🖥️ Host: {host.name}, Free Cores: {free_cores}, Free Memory: {free_memory} MB")
 
-        free_cores = total_cores - used_cores
-        free_memory = int(host_metrics['memory'].split()[1]) - total_container_memory
+        host.used_cores = used_cores
+        host.free_cores = free_cores
+        host.total_container_memory = total_container_memory
+        host.total_container_cpu_load = total_container_cpu_load
+        host.free_memory = free_memory
+        host.balance_score = host_balance_score(host, network_weight)
 
-        # Debug information
-        print(f"🖥️ Host: {host_name}, Free Cores: {free_cores}, Free Memory: {free_memory} MB")
-
-        host_metrics.update({
-            'used_cores': used_cores,
-            'free_cores': free_cores,
-            'total_container_memory': total_container_memory,
-            'total_container_cpu_load': total_container_cpu_load,
-            'free_memory': free_memory,
-            'balance_score': calculate_balance_score(
-                float(host_metrics['cpu'].split()[0]),
-                int(host_metrics['memory'].split()[0]) / int(host_metrics['memory'].split()[1]),
-                cpu_threshold,
-                memory_threshold
-            )
-        })
-        ssh.close()
+        if cpu_overloaded or memory_overloaded or network_overloaded:
+            overloaded_hosts.append(host)
 
-        if cpu_overloaded or memory_overloaded:
-            overloaded_hosts.append((host_name, host_metrics))
+    sorted_hosts = [host for host in sorted_hosts if not host.stale]
 
     if not overloaded_hosts:
         print(f"{Fore.BLUE}ℹ️  No hosts are overloaded based on the given thresholds.")
     else:
-        print(f"{Fore.BLUE}Overloaded Hosts: {', '.join([host[0] for host in overloaded_hosts])}")
-
-    migration_candidates = []
-
-    for source_host_name, source_host_metrics in overloaded_hosts:
-        for container in source_host_metrics['containers']:
-            if container['status'] != 'running':
-                continue
+        print(f"{Fore.BLUE}Overloaded Hosts: {', '.join([host.name for host in overloaded_hosts])}")
 
-            container_id = container['vmid']
+    strategy = default_params.get('migration_strategy', 'load_based')
 
-            try:
-                ssh = ssh_connect(
-                    source_host_metrics['address'],
-                    source_host_metrics['user'],
-                    password=source_host_metrics.get('password'),
-                    key_path=source_host_metrics.get('key_path')
-                )
-                container_metrics = get_container_metrics(ssh, container_id)
-                container_config = get_container_config(ssh, container_id)
-                ssh.close()
-            except Exception as e:
-                print(f"{Fore.RED}❌ Error fetching metrics for container {container_id} on {source_host_name}: {str(e)}")
-                continue
+    migration_candidates = []
 
-            if not container_metrics or not container_config:
+    # The global planner may also move containers off non-overloaded hosts (e.g. to make room for a swap)
+    candidate_hosts = sorted_hosts if strategy == 'global' and overloaded_hosts else overloaded_hosts
+    for source_host in candidate_hosts:
+        container_stats = host_stats[source_host.name]
+        for container in source_host.running_containers():
+            state = container_stats[container.vmid]
+            if not state.has_metrics:
                 continue
 
-            container_cores = int(container_config['cores'])
-            container_memory = int(container_metrics['memory'].split()[0])
-            container_cpu_load = float(container_metrics['cpu'].split()[0])
+            container_cpu_load = state.cpu_load
+            if history is not None:
+                container_cpu_load = history.value(('container', source_host.name, state.vmid, 'load'), state.cpu_load, signal)
 
-            container_priority = container_cpu_load * 0.7 + container_memory / int(source_host_metrics['memory'].split()[1]) * 0.3
+            container_priority = container_cpu_load * 0.7 + state.memory_used / source_host.memory_total * 0.3
 
             migration_candidates.append({
-                'container_id': container_id,
-                'source_host': source_host_name,
+                'container_id': state.vmid,
+                'source_host': source_host.name,
                 'container_priority': container_priority,
-                'container_cores': container_cores,
-                'container_memory': container_memory,
+                'container_cores': state.cores,
+                'container_memory': state.memory_used,
                 'container_cpu_load': container_cpu_load,
             })
 
     migration_candidates.sort(key=lambda x: x['container_priority'], reverse=True)
 
-    for candidate in migration_candidates:
-        source_host_metrics = hosts_metrics[candidate['source_host']]
-        best_target = None
-        best_score = None
-        best_balance_score_after_migration = None
-        best_migration_suitability_score = None
-
-        for target_host_name, target_host_metrics in sorted_hosts:
-            if target_host_name == candidate['source_host']:
-                continue
-
-            available_memory = target_host_metrics['free_memory']
-            available_cores = target_host_metrics['free_cores']
-            projected_cpu_load = float(target_host_metrics['cpu'].split()[0]) + candidate['container_cpu_load']
-            projected_memory_usage = int(target_host_metrics['memory'].split()[0]) + candidate['container_memory']
-
-            cpu_score = projected_cpu_load / target_host_metrics['cpu_threshold']
-            memory_score = projected_memory_usage / int(target_host_metrics['memory'].split()[1])
-            total_score = cpu_score * 0.7 + memory_score * 0.3
-
-            balance_score_after_migration = calculate_balance_score(
-                projected_cpu_load,
-                projected_memory_usage / int(target_host_metrics['memory'].split()[1]),
-                target_host_metrics['cpu_threshold'],
-                target_host_metrics['memory_threshold']
-            )
-
-            migration_suitability_score = calculate_migration_suitability_score(
-                available_memory,
-                available_cores,
-                balance_score_after_migration,
-                target_host_metrics['balance_score']
-            )
-
-            # Debug information
-            print(f"🛠️  Evaluating migration to {target_host_name}: Suitability Score = {migration_suitability_score}/100")
-
-            if available_memory >= candidate['container_memory'] and available_cores >= candidate['container_cores']:
-                if best_score is None or total_score < best_score:
-                    best_target = target_host_name
-                    best_score = total_score
-                    best_balance_score_after_migration = balance_score_after_migration
-                    best_migration_suitability_score = migration_suitability_score
-
-        if best_target:
-            reason = f"Better resource distribution: free memory = {available_memory}, free cores = {available_cores}, migration suitability score = {best_migration_suitability_score}/100"
-            suggestions.append({
-                'container_id': candidate['container_id'],
-                'source_host': candidate['source_host'],
-                'target_host': best_target,
-                'reason': reason,
-                'detailed_calc': f"Container CPU Load: {candidate['container_cpu_load']}, Container Memory: {candidate['container_memory']} MB, Target CPU Score: {cpu_score:.2f}, Target Memory Score: {memory_score:.2f}, Total Score: {best_score:.2f}, Balance Score After Migration: {best_balance_score_after_migration:.2f}, Migration Suitability Score: {best_migration_suitability_score}/100"
-            })
-            migration_reasons.append(f"{Fore.YELLOW}🔄 Considering migrating container {Fore.CYAN}{candidate['container_id']} {Fore.YELLOW}from {Fore.RED}{candidate['source_host']} {Fore.YELLOW}to {Fore.GREEN}{best_target}")
-            migration_reasons.append(f"   {Fore.MAGENTA}Reason: {reason}{Style.RESET_ALL}")
-            migration_reasons.append(f"   {Fore.MAGENTA}Details: {suggestions[-1]['detailed_calc']}{Style.RESET_ALL}")
+    planning_start = METRICS.clock()
+    shard_from = default_params.get('planning_shards', 0)
+    if shard_from and len(sorted_hosts) >= shard_from:
+        sharded_planner = ShardedPlanner(
+            sorted_hosts,
+            strategy=strategy,
+            groups=groups,
+            shard_size=default_params.get('shard_size', 50),
+            workers=default_params.get('shard_workers'),
+            reconcile_shards=default_params.get('shard_reconcile', 2),
+            params={
+                'use_numpy': default_params.get('placement_engine', 'numpy') == 'numpy',
+                'network_weight': network_weight,
+                'max_migrations': default_params.get('max_migrations') if strategy == 'global' else None,
+                'max_bytes_moved': default_params.get('max_bytes_moved'),
+                'time_budget': default_params.get('planning_time_budget', 2.0),
+            },
+            pool=shard_pool
+        )
+        placements = sharded_planner.plan(migration_candidates) if overloaded_hosts else []
+        print(f"{Fore.BLUE}ℹ️  Sharded planner: {len(sharded_planner.shards)} groups, {sharded_planner.in_shard} in-group and {sharded_planner.cross_shard} cross-group migrations")
+    elif strategy == 'global':
+        global_planner = GlobalPlanner(
+            sorted_hosts,
+            migration_candidates,
+            max_migrations=default_params.get('max_migrations'),
+            max_bytes_moved=default_params.get('max_bytes_moved'),
+            time_budget=default_params.get('planning_time_budget', 2.0),
+            network_weight=network_weight
+        )
+        placements = global_planner.plan() if overloaded_hosts else []
+        if overloaded_hosts:
+            print(f"{Fore.BLUE}ℹ️  Global planner: peak balance score {global_planner.start_peak:.2f} -> {global_planner.final_peak:.2f} with {len(placements)} migrations ({global_planner.iterations} iterations{f', {global_planner.skipped} moves skipped, no order fits' if global_planner.skipped else ''}{', time budget reached' if global_planner.timed_out else ''})")
+    elif planner is not None:
+        placements = planner.plan(sorted_hosts, migration_candidates)
+        planner_stats = planner.stats()
+        print(f"{Fore.BLUE}ℹ️  Incremental planner: {planner_stats['hosts_changed']} host changes, {planner_stats['candidates_rescored']} candidates rescored, {planner_stats['candidates_compared']} compared against changed hosts ({planner_stats['rounds']} rounds)")
+    else:
+        engine = PlacementEngine(
+            sorted_hosts,
+            use_numpy=default_params.get('placement_engine', 'numpy') == 'numpy',
+            network_weight=network_weight
+        )
+        placements = engine.plan(migration_candidates)
+    METRICS.observe_phase('placement', METRICS.clock() - planning_start)
+
+    for placement in placements:
+        candidate = placement['candidate']
+        target_host = hosts[placement['target_host']]
+        migration_suitability_score = calculate_migration_suitability_score(
+            target_host,
+            placement['free_memory'],
+            placement['free_cores'],
+            placement['balance_score_after_migration'],
+            target_host.balance_score
+        )
+
+        reason = f"Better resource distribution: free memory = {placement['free_memory']}, free cores = {placement['free_cores']}, migration suitability score = {migration_suitability_score}/100"
+        suggestions.append({
+            'container_id': candidate['container_id'],
+            'source_host': candidate['source_host'],
+            'target_host': target_host.name,
+            'reason': reason,
+            'detailed_calc': f"Container CPU Load: {candidate['container_cpu_load']}, Container Memory: {candidate['container_memory']} MB, Target CPU Score: {placement['cpu_score']:.2f}, Target Memory Score: {placement['memory_score']:.2f}, Total Score: {placement['total_score']:.2f}, Balance Score After Migration: {placement['balance_score_after_migration']:.2f}, Migration Suitability Score: {migration_suitability_score}/100"
+        })
+        migration_reasons.append(f"{Fore.YELLOW}🔄 Considering migrating container {Fore.CYAN}{candidate['container_id']} {Fore.YELLOW}from {Fore.RED}{candidate['source_host']} {Fore.YELLOW}to {Fore.GREEN}{target_host.name}")
+        migration_reasons.append(f"   {Fore.MAGENTA}Reason: {reason}{Style.RESET_ALL}")
+        migration_reasons.append(f"   {Fore.MAGENTA}Details: {suggestions[-1]['detailed_calc']}{Style.RESET_ALL}")
 
     if not suggestions:
         print(f"{Fore.BLUE}ℹ️  No migrations suggested. All hosts are balanced.")
@@ -230,55 +330,410 @@ def suggest_migrations(hosts_metrics, default_params):
             print(f"   {Fore.YELLOW}Reason: {Fore.MAGENTA}{suggestion['reason']}{Style.RESET_ALL}")
             print(f"   {Fore.YELLOW}Details: {Fore.MAGENTA}{suggestion['detailed_calc']}{Style.RESET_ALL}")
 
-    return suggestions
+    cache_stats = cache.stats()
+    print(f"{Fore.BLUE}ℹ️  Container cache: {cache_stats['fetches']} fetches, {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['config_hits']} unchanged configs")
 
-def main():
-    logger = setup_logging()
-    config = load_config('config.yaml')
-    default_params = config.get('default_params', {})
+    if owns_pool:
+        pool.close_all()
 
-    hosts_metrics = {}
+    return suggestions
 
-    for host in config['proxmox_hosts']:
-        logger.info(f"🔌 Connecting to {host['name']} ({host['address']})...")
-        ssh = None
+def update_host_state(host_state, default_params, logger, history=None, network=None):
+    """
+    Post-process a freshly collected host: network rates, history signals, logging and alerts.
+    :param host_state: HostState returned by the collector.
+    :param default_params: Default parameters from the configuration.
+    :param logger: Logger instance.
+    :param history: Optional MetricsHistory the samples are recorded into.
+    :param network: Optional NetworkRateSampler turning the interface counters into rates.
+    """
+    if network is not None and host_state.network:
+        host_state.network_rates = network.sample(host_state.name, host_state.network, capacity_mbps=host_state.network_capacity)
+        host_state.network_utilization = network_utilization(host_state.network_rates, host_state.network_capacity)
+    if history is not None:
+        signal = default_params.get('load_signal', 'instant')
+        history.record_host(host_state)
+        host_state.load_signal = history.host_load(host_state, signal)
+        host_state.memory_signal = history.host_memory_usage(host_state, signal)
+
+    logger.info(f"🔍 Host metrics for {host_state.name}: {format_metrics_for_logging(host_state)}")
+
+    if check_cpu_load(host_state.load_signal, host_state.cpu_threshold):
+        print(f"{Fore.RED}⚠️  Alert! {host_state.name} has exceeded the threshold for CPU Load: {host_state.load_signal:.2f} (Threshold: {host_state.cpu_threshold})")
+
+    if check_memory_usage(host_state.memory_signal * host_state.memory_total, host_state.memory_total, host_state.memory_threshold * 100):
+        print(f"{Fore.RED}⚠️  Alert! {host_state.name} has exceeded the threshold for Memory Usage: {host_state.memory_used}/{host_state.memory_total} MB (Threshold: {host_state.memory_threshold})")
+
+def collect_cluster(collector, hosts_config, default_params, logger, cache, history=None, network=None, previous=None):
+    """
+    Run the collector and prepare the collected hosts for planning.
+    Containers the collector already returned with metrics (e.g. from the Proxmox API) are put in
+    the cache so the planner does not fetch them again.
+    Hosts that did not answer are returned with their previous state marked stale when there is
+    one (see HostState.stale), otherwise they are left out as unknown.
+    :param previous: Optional dictionary of host name -> HostState from an earlier cycle.
+    :return: Dictionary of host name -> HostState, in configuration order.
+    """
+    collected = collector.collect(hosts_config)
+    for host_state in collected.values():
+        update_host_state(host_state, default_params, logger, history, network)
+        for container in host_state.containers:
+            if container.has_metrics:
+                cache.put(host_state.name, container.vmid, container)
+    if history is not None:
+        # Containers that left their host and hosts that left the configuration take their series with them
+        history.prune(collected, known={host['name'] for host in hosts_config})
+
+    hosts = {}
+    missing = []
+    for host in hosts_config:
+        name = host['name']
+        if name in collected:
+            hosts[name] = collected[name]
+        elif previous is not None and name in previous:
+            previous[name].stale = True
+            hosts[name] = previous[name]
+            missing.append(f"{name} (stale)")
+        else:
+            missing.append(f"{name} (unknown)")
+    if missing:
+        logger.warning(f"⏱️  No fresh metrics from: {', '.join(missing)}")
+    return hosts
+
+def save_cycle_snapshot(default_params, hosts, cache, history, network, logger):
+    """
+    Save the cluster state to `snapshot_path` (see snapshot.save_snapshot), if configured.
+    """
+    path = default_params.get('snapshot_path')
+    if not path:
+        return
+    try:
+        size = save_snapshot(path, hosts, cache, history, network)
+        logger.debug(f"💾 Saved snapshot of {len(hosts)} hosts to {path} ({size} bytes)")
+    except Exception as e:
+        logger.error(f"❌ Failed to save snapshot to {path}: {str(e)}")
+
+def warm_start(config, logger, cache, history, network):
+    """
+    Load the snapshot of the previous run from `snapshot_path`, if there is one, and report it.
+    :return: Dictionary of host name -> stale HostState (empty without snapshot).
+    """
+    default_params = config.get('default_params', {})
+    path = default_params.get('snapshot_path')
+    snapshot = load_snapshot(path) if path else None
+    if snapshot is None:
+        return {}
+    hosts = restore_snapshot(snapshot, config['proxmox_hosts'], default_params, cache, history, network)
+    containers = sum(len(host.containers) for host in hosts.values())
+    logger.info(f"🗂️  Warm start from snapshot ({snapshot.age:.0f}s old): {len(hosts)} hosts, {containers} containers, {len(snapshot.configs)} container configs")
+    for host in hosts.values():
+        logger.info(f"🗂️  {host.name} (snapshot): load {host.load_1:.2f} on {host.cpu_cores} cores, memory {host.memory_used}/{host.memory_total} MB, {len(host.running_containers())} running containers")
+    return hosts
+
+def reload_config(config, new_config, hosts, scheduler, pool, collector, logger):
+    """
+    Apply a changed configuration to a running daemon in place, keeping the pooled connections and
+    the collected history. Added hosts are polled right away, removed hosts are dropped, hosts whose
+    connection settings changed are reconnected and new thresholds apply to the current host states.
+    :param config: Configuration in use, updated in place (so everything holding it sees the change).
+    :param new_config: New compiled configuration.
+    :param hosts: Dictionary of host name -> HostState of the daemon, updated in place.
+    :param scheduler: PollingScheduler of the daemon.
+    """
+    old_hosts = {host.name: host for host in config['proxmox_hosts']}
+    added, removed, reconnect, rethreshold = diff_hosts(config['proxmox_hosts'], new_config['proxmox_hosts'])
+    new_hosts = {host.name: host for host in new_config['proxmox_hosts']}
+
+    collector.forget(removed + reconnect)
+    for name in removed:
+        scheduler.remove(name)
+        hosts.pop(name, None)
+        pool.discard(old_hosts[name])
+    for name in reconnect:
+        pool.discard(old_hosts[name])
+        scheduler.add(name)
+    for name in added:
+        scheduler.add(name)
+    for name in rethreshold:
+        if name in hosts:
+            hosts[name].cpu_threshold = new_hosts[name].cpu_threshold
+            hosts[name].memory_threshold = new_hosts[name].memory_threshold
+            hosts[name].network_threshold = new_hosts[name].network_threshold
+            hosts[name].network_capacity = new_hosts[name].network_capacity_mbps
+
+    config['default_params'].clear()
+    config['default_params'].update(new_config['default_params'])
+    config['proxmox_hosts'][:] = new_config['proxmox_hosts']
+    for key, value in new_config.items():
+        if key not in ('default_params', 'proxmox_hosts'):
+            config[key] = value
+    set_command_timeout(config['default_params']['command_timeout'])
+    logger.info(f"🔧 Configuration reloaded: {len(added)} hosts added, {len(removed)} removed, "
+                f"{len(reconnect)} reconnected, {len(rethreshold)} with new thresholds")
+
+def run_cycle(config, pool, logger, cache=None, history=None, network=None, previous=None):
+    """
+    Run one balancing cycle: collect the cluster and suggest migrations.
+    :param config: Loaded configuration.
+    :param pool: SSHConnectionPool used for every remote command.
+    :param logger: Logger instance.
+    :param cache: Optional ContainerMetricsCache (a fresh one is used otherwise).
+    :param history: Optional MetricsHistory.
+    :param network: Optional NetworkRateSampler.
+    :param previous: Optional dictionary of host name -> HostState from an earlier run (e.g. a snapshot).
+    :return: Tuple of (hosts, migration suggestions).
+    """
+    config = compile_config(config)
+    default_params = config['default_params']
+    if cache is None:
+        cache = ContainerMetricsCache(ttl=default_params.get('container_cache_ttl', 60))
+
+    set_command_timeout(default_params.get('command_timeout', 30))
+    METRICS.start_cycle()
+    with METRICS.phase('cycle'):
+        collector = create_collector(config, default_params, pool, logger)
         try:
-            ssh = ssh_connect(
-                host['address'],
-                host['user'],
-                password=host.get('password'),
-                key_path=host.get('key_path')
-            )
-            logger.info("📊 Fetching host metrics...")
-            host_metrics = get_host_metrics(ssh)
-            host_metrics.update({
-                'address': host['address'],
-                'user': host['user'],
-                'password': host.get('password'),
-                'key_path': host.get('key_path'),
-                'cpu_threshold': host.get('cpu_threshold', default_params['cpu_threshold']),
-                'memory_threshold': host.get('memory_threshold', default_params['memory_threshold']),
-            })
-            hosts_metrics[host['name']] = host_metrics
-
-            logger.info(f"🔍 Host metrics for {host['name']}: {format_metrics_for_logging(host_metrics)}")
-
-            if check_cpu_load(host_metrics['cpu'], host_metrics['cpu_threshold']):
-                print(f"{Fore.RED}⚠️  Alert! {host['name']} has exceeded the threshold for CPU Load: {host_metrics['cpu']} (Threshold: {host_metrics['cpu_threshold']})")
-
-            if check_memory_usage(host_metrics['memory']):
-                print(f"{Fore.RED}⚠️  Alert! {host['name']} has exceeded the threshold for Memory Usage: {host_metrics['memory']} (Threshold: {host_metrics['memory_threshold']})")
-
-        except Exception as e:
-            logger.error(f"❌ Error connecting to {host['name']}: {str(e)}")
+            with METRICS.phase('collect'):
+                hosts = collect_cluster(collector, config['proxmox_hosts'], default_params, logger, cache, history, network, previous=previous)
         finally:
-            if ssh:
-                ssh.close()
+            collector.close()
+        with METRICS.phase('plan'):
+            migration_suggestions = suggest_migrations(hosts, default_params, pool=pool, cache=cache, history=history,
+                                                       groups=host_groups(config['proxmox_hosts'], default_params.get('shard_by', 'auto')))
+
+    for line in METRICS.summary(top=default_params.get('metrics_summary_top', 3)):
+        logger.info(f"⏱️  {line}")
+    save_cycle_snapshot(default_params, hosts, cache, history, network, logger)
+    return hosts, migration_suggestions
+
+def run_daemon(config, pool, logger, history=None, network=None, stop=None, max_cycles=None, cache=None, previous=None, watcher=None):
+    """
+    Keep polling the hosts on an adaptive per-host schedule (see PollingScheduler) and plan again
+    only when the cluster changed meaningfully since the last plan.
+    :param config: Loaded configuration.
+    :param pool: SSHConnectionPool kept open for the whole run.
+    :param logger: Logger instance.
+    :param history: Optional MetricsHistory.
+    :param network: Optional NetworkRateSampler.
+    :param stop: Optional threading.Event that ends the loop when set.
+    :param max_cycles: Optional number of polling rounds after which the loop returns.
+    :param cache: Optional ContainerMetricsCache (a fresh one is used otherwise).
+    :param previous: Optional dictionary of host name -> HostState from an earlier run (e.g. a snapshot).
+    :param watcher: Optional ConfigWatcher; changes of the configuration file are applied without a restart (see reload_config).
+    :return: Tuple of (hosts, last migration suggestions).
+    """
+    config = compile_config(config)
+    default_params = config['default_params']
+    stop = stop or threading.Event()
+    network_weight = default_params.get('network_weight', 0.0)
+    scheduler = PollingScheduler(
+        interval=default_params.get('poll_interval', 30),
+        min_interval=default_params.get('poll_min_interval', 10),
+        max_interval=default_params.get('poll_max_interval', 300),
+        backoff=default_params.get('poll_backoff', 1.5),
+        change_threshold=default_params.get('replan_threshold', 0.05)
+    )
+    set_command_timeout(default_params.get('command_timeout', 30))
+    # Entries are invalidated whenever their host is polled again, so they may live as long as a poll interval
+    if cache is None:
+        cache = ContainerMetricsCache()
+    cache.ttl = max(default_params.get('container_cache_ttl', 60), scheduler.max_interval)
+    collector = create_collector(config, default_params, pool, logger)
+    hosts_config = {host['name']: host for host in config['proxmox_hosts']}
+    groups = host_groups(config['proxmox_hosts'], default_params.get('shard_by', 'auto'))
+    for name in hosts_config:
+        scheduler.add(name)
+
+    def create_planner():
+        if not default_params['incremental_planning']:
+            return None
+        return IncrementalPlanner(
+            epsilon=default_params['replan_epsilon'],
+            network_weight=default_params['network_weight'],
+            use_numpy=default_params['placement_engine'] == 'numpy'
+        )
+
+    planner = create_planner()
+    shard_pool = PlanningPool(default_params['shard_workers'])
+    hosts = dict(previous or {})
+    planned = None
+    suggestions = []
+    cycles = 0
+    try:
+        while not stop.is_set():
+            new_config = None
+            if watcher is not None:
+                try:
+                    new_config = watcher.poll()
+                except ConfigError as e:
+                    logger.error(f"❌ Keeping the current configuration: {str(e)}")
+            if new_config is not None:
+                reload_config(config, new_config, hosts, scheduler, pool, collector, logger)
+                hosts_config = {host['name']: host for host in config['proxmox_hosts']}
+                groups = host_groups(config['proxmox_hosts'], default_params['shard_by'])
+                network_weight = default_params['network_weight']
+                planner = create_planner()
+                shard_pool.close()
+                shard_pool = PlanningPool(default_params['shard_workers'])
+                planned = None
+
+            due = scheduler.pop_due()
+            if due:
+                METRICS.start_cycle()
+                with METRICS.phase('cycle'):
+                    for name in due:
+                        cache.invalidate(name)
+                    with METRICS.phase('collect'):
+                        collected = collect_cluster(collector, [hosts_config[name] for name in due], default_params, logger, cache, history, network, previous=hosts)
+                    for name in due:
+                        if name in collected and not collected[name].stale:
+                            hosts[name] = collected[name]
+                            scheduler.record(name, host_balance_score(hosts[name], network_weight), host_overloaded(hosts[name]))
+                        else:
+                            # The old data of a host that stopped answering is kept for reporting only, it is not planned with
+                            scheduler.failed(name)
+                    hosts = {name: hosts[name] for name in hosts_config if name in hosts}
+
+                    current = {name: (host_balance_score(host, network_weight), host_overloaded(host)) for name, host in hosts.items() if not host.stale}
+                    if plan_changed(planned, current, default_params.get('replan_threshold', 0.05)):
+                        with METRICS.phase('plan'):
+                            suggestions = suggest_migrations(hosts, default_params, pool=pool, cache=cache, history=history, planner=planner, groups=groups,
+                                                              shard_pool=shard_pool)
+                        planned = current
+                        log_suggestions(logger, suggestions)
+                        if suggestions and default_params.get('execute_migrations', False):
+                            execute_migrations(config, pool, suggestions, logger)
+                            # Poll the hosts involved right away and plan again from their new state
+                            for name in {host for suggestion in suggestions for host in (suggestion['source_host'], suggestion['target_host'])}:
+                                scheduler.add(name)
+                            planned = None
+                    else:
+                        logger.info(f"💤 Polled {', '.join(due)}: no meaningful change, keeping the current plan")
+
+                for line in METRICS.summary(top=default_params.get('metrics_summary_top', 3)):
+                    logger.info(f"⏱️  {line}")
+                save_cycle_snapshot(default_params, hosts, cache, history, network, logger)
+                cycles += 1
+                if max_cycles is not None and cycles >= max_cycles:
+                    break
+
+            next_due = scheduler.next_due()
+            wait = max(0.0, next_due - time.monotonic()) if next_due is not None else scheduler.interval
+            if watcher is not None:
+                wait = min(wait, default_params['config_watch_interval'])
+            stop.wait(wait)
+    finally:
+        collector.close()
+        shard_pool.close()
+
+    return hosts, suggestions
+
+def execute_migrations(config, pool, suggestions, logger):
+    """
+    Run the suggested migrations with `pct migrate` (opt-in with `execute_migrations: true`).
+    :return: List of migration results (see MigrationExecutor.run).
+    """
+    default_params = config.get('default_params', {})
+    executor = MigrationExecutor(
+        pool,
+        config['proxmox_hosts'],
+        max_parallel=default_params.get('migration_max_parallel', 2),
+        max_per_source=default_params.get('migration_max_per_source', 1),
+        max_per_target=default_params.get('migration_max_per_target', 1),
+        online=default_params.get('migration_online', False),
+        restart=default_params.get('migration_restart', True),
+        timeout=default_params.get('migration_timeout'),
+        stop_on_failure=default_params.get('migration_stop_on_failure', True),
+        logger=logger
+    )
+    return executor.run(suggestions)
+
+def log_suggestions(logger, suggestions):
+    for suggestion in suggestions:
+        logger.info(f"🔄 Suggesting to migrate container {suggestion['container_id']} from {suggestion['source_host']} to {suggestion['target_host']}")
 
-    migration_suggestions = suggest_migrations(hosts_metrics, default_params)
+def evaluate_scenarios(default_params, hosts, cache, suggestions, specs, logger):
+    """
+    Evaluate what-if scenarios (see scenario.parse_scenario) on the collected cluster state and log the results.
+    :param hosts: Dictionary of host name -> HostState after suggest_migrations. Stale hosts are left out.
+    :param cache: ContainerMetricsCache of the cycle.
+    :param suggestions: Migration suggestions of the cycle, used by the 'plan' step.
+    :param specs: List of scenario specs.
+    :return: List of Scenario.evaluate() results.
+    """
+    base = Scenario({name: host for name, host in hosts.items() if not host.stale}, default_params, cache, name='current')
+    current = base.evaluate()
+    logger.info(f"🧪 Current cluster: peak balance score {current['peak_score']:.2f}, overloaded: {', '.join(current['overloaded']) or 'none'}")
+    results = []
+    for spec in specs:
+        try:
+            result = run_scenario(base, spec, suggestions)
+        except ValueError as e:
+            logger.error(f"❌ {str(e)}")
+            continue
+        results.append(result)
+        logger.info(f"🧪 Scenario {spec}: {'feasible' if result['feasible'] else 'NOT feasible'}, peak balance score {result['peak_score']:.2f} "
+                    f"({result['peak_score'] - current['peak_score']:+.2f}), {len(result['moves'])} moves, overloaded: {', '.join(result['overloaded']) or 'none'}")
+        for move in result['moves'][len(base.moves):]:
+            logger.info(f"   ➡️  Container {move['container_id']}: {move['source_host']} -> {move['target_host']}")
+        if result['unplaced']:
+            logger.warning(f"   ⚠️  No room for: {', '.join(f'{host}/{vmid}' for host, vmid in result['unplaced'])}")
+        if result['overcommitted']:
+            logger.warning(f"   ⚠️  Memory overcommitted on: {', '.join(result['overcommitted'])}")
+        if result['newly_overloaded']:
+            logger.warning(f"   ⚠️  Pushed over their thresholds: {', '.join(result['newly_overloaded'])}")
+        for error in result['errors']:
+            logger.warning(f"   ⚠️  {error}")
+    return results
 
-    for suggestion in migration_suggestions:
-        logger.info(f"🔄 Suggesting to migrate container {suggestion['container_id']} from {suggestion['source_host']} to {suggestion['target_host']}")
+def main():
+    parser = argparse.ArgumentParser(description="Proxmox cluster balancer.")
+    parser.add_argument('--daemon', action='store_true', help="Keep running and poll the hosts on an adaptive schedule")
+    parser.add_argument('--what-if', action='append', default=[], metavar='SCENARIO',
+                        help="Evaluate a scenario after the cycle, e.g. 'evacuate:pve3', 'add:pve9:64:262144+evacuate:pve3' or 'plan' (repeatable)")
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    try:
+        config = load_config('config.yaml')
+    except ConfigError as e:
+        logger.error(f"❌ {str(e)}")
+        raise SystemExit(1)
+    default_params = config['default_params']
+
+    if default_params.get('metrics_port'):
+        start_metrics_server(default_params['metrics_port'], default_params.get('metrics_address', '0.0.0.0'))
+        logger.info(f"📈 Serving metrics on port {default_params['metrics_port']} at /metrics")
+
+    history = MetricsHistory(
+        capacity=default_params.get('history_size', 30),
+        alpha=default_params.get('history_alpha', 0.3),
+        directory=default_params.get('history_dir')
+    )
+
+    network = NetworkRateSampler()
+    cache = ContainerMetricsCache(ttl=default_params.get('container_cache_ttl', 60))
+    previous = warm_start(config, logger, cache, history, network)
+
+    with SSHConnectionPool() as pool:
+        if args.daemon:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            logger.info("🔁 Running in daemon mode")
+            try:
+                watcher = ConfigWatcher('config.yaml') if default_params['watch_config'] else None
+                run_daemon(config, pool, logger, history=history, network=network, stop=stop, cache=cache, previous=previous, watcher=watcher)
+            except KeyboardInterrupt:
+                pass
+            logger.info("🛑 Daemon stopped")
+        else:
+            hosts, migration_suggestions = run_cycle(config, pool, logger, cache=cache, history=history, network=network, previous=previous)
+            log_suggestions(logger, migration_suggestions)
+            if args.what_if:
+                evaluate_scenarios(default_params, hosts, cache, migration_suggestions, args.what_if, logger)
+            if migration_suggestions and default_params.get('execute_migrations', False):
+                execute_migrations(config, pool, migration_suggestions, logger)
+    history.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,97 @@
+class ContainerState:
+    """
+    Typed snapshot of a single container. Metric fields are None until the container has been fetched.
+    """
+    __slots__ = ('vmid', 'name', 'status', 'lock', 'cores', 'cpu_load', 'memory_used', 'memory_total', 'config_mtime')
+
+    def __init__(self, vmid, name='', status='', lock='', cores=None, cpu_load=None, memory_used=None, memory_total=None, config_mtime=None):
+        self.vmid = vmid
+        self.name = name
+        self.status = status
+        self.lock = lock
+        self.cores = cores                # Configured cores
+        self.cpu_load = cpu_load          # 1-minute load (cores in use)
+        self.memory_used = memory_used    # MB
+        self.memory_total = memory_total  # MB
+        self.config_mtime = config_mtime  # Modification time of /etc/pve/lxc/<vmid>.conf, when collected
+
+    @property
+    def running(self):
+        return self.status == 'running'
+
+    @property
+    def has_metrics(self):
+        return self.cores is not None and self.cpu_load is not None and self.memory_used is not None
+
+    def with_metrics(self, cores, cpu_load, memory_used, memory_total):
+        """
+        :return: A copy of this container with the given metrics filled in.
+        """
+        return ContainerState(self.vmid, self.name, self.status, self.lock, cores, cpu_load, memory_used, memory_total, self.config_mtime)
+
+    def __repr__(self):
+        return f"ContainerState(vmid={self.vmid!r}, status={self.status!r}, cores={self.cores}, cpu_load={self.cpu_load}, memory_used={self.memory_used})"
+
+class HostState:
+    """
+    Typed snapshot of a Proxmox host, parsed once from the raw command output.
+    The allocation fields (used_cores, free_cores, ...) are filled in by the planner.
+    """
+    __slots__ = (
+        'name', 'address', 'connection', 'cpu_threshold', 'memory_threshold', 'network_threshold', 'network_capacity',
+        'cpu_cores', 'load_1', 'load_5', 'load_15', 'memory_used', 'memory_total',
+        'disk_used', 'disk_total', 'network', 'network_rates', 'network_utilization', 'containers', 'load_signal', 'memory_signal',
+        'used_cores', 'free_cores', 'total_container_memory', 'total_container_cpu_load', 'free_memory', 'balance_score',
+        'stale',
+    )
+
+    def __init__(self, name, address, connection, cpu_threshold, memory_threshold,
+                 cpu_cores=0, load_1=0.0, load_5=0.0, load_15=0.0, memory_used=0, memory_total=0,
+                 disk_used=0, disk_total=0, network=None, containers=None, network_threshold=0.8, network_capacity=1000):
+        self.name = name
+        self.address = address
+        self.connection = connection      # Host entry used to (re)connect: name, address, user, password, key_path
+        self.cpu_threshold = cpu_threshold
+        self.memory_threshold = memory_threshold
+        self.network_threshold = network_threshold  # Fraction of the link capacity
+        self.network_capacity = network_capacity    # Mbit/s per interface
+        self.cpu_cores = cpu_cores
+        self.load_1 = load_1
+        self.load_5 = load_5
+        self.load_15 = load_15
+        self.memory_used = memory_used    # MB
+        self.memory_total = memory_total  # MB
+        self.disk_used = disk_used        # Bytes
+        self.disk_total = disk_total      # Bytes
+        self.network = network if network is not None else {}            # Interface -> (rx_bytes, tx_bytes)
+        self.network_rates = {}                                          # Interface -> (rx_bytes/s, tx_bytes/s)
+        self.network_utilization = 0.0                                   # Busiest interface, fraction of capacity
+        self.containers = containers if containers is not None else []   # List of ContainerState
+        # Values the decisions are based on: instantaneous by default, smoothed when history is enabled
+        self.load_signal = load_1
+        self.memory_signal = self.memory_usage
+        self.used_cores = 0
+        self.free_cores = cpu_cores
+        self.total_container_memory = 0
+        self.total_container_cpu_load = 0.0
+        self.free_memory = memory_total
+        self.balance_score = 0.0
+        # Set when the host missed its deadline: the data is from an earlier cycle and the host is left out of planning
+        self.stale = False
+
+    @property
+    def memory_usage(self):
+        """
+        :return: Used memory as a fraction of the total memory.
+        """
+        return self.memory_used / self.memory_total if self.memory_total else 0.0
+
+    @property
+    def network_overloaded(self):
+        return self.network_utilization > self.network_threshold
+
+    def running_containers(self):
+        return [container for container in self.containers if container.running]
+
+    def __repr__(self):
+        return f"HostState(name={self.name!r}, load_1={self.load_1}, memory={self.memory_used}/{self.memory_total}, containers={len(self.containers)})"
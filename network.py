@@ -0,0 +1,98 @@
+import threading
+import time
+
+COUNTER_32BIT = 2 ** 32
+
+class NetworkRateSampler:
+    """
+    Turns the cumulative /proc/net/dev byte counters of each host into throughput rates.
+    The previous counter values and their timestamps are kept per (host, interface); every new
+    sample yields RX/TX bytes per second since the previous one.
+    """
+
+    def __init__(self, clock=time.time):
+        """
+        :param clock: Wall clock function (so saved counters stay valid across restarts), replaceable for testing.
+        """
+        self._clock = clock
+        self._previous = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def counter_delta(previous, current, max_delta=None):
+        """
+        Bytes transferred between two readings of a counter.
+        A counter that went backwards either wrapped around (32-bit counters) or was reset
+        (interface recreated, e.g. a bridge restarted). It is only taken as a wrap when the
+        bytes to the 32-bit limit and back could have been transferred at line rate; otherwise
+        it is a reset and everything counted since the reset is taken as the delta.
+        :param max_delta: Most bytes the link can carry between the two readings (None when unknown,
+                          then a counter going backwards is always a reset).
+        :return: Non-negative byte delta.
+        """
+        if current >= previous:
+            return current - previous
+        wrapped = COUNTER_32BIT - previous + current
+        if previous < COUNTER_32BIT and max_delta is not None and wrapped <= max_delta:
+            return wrapped
+        return current
+
+    def sample(self, host_name, counters, timestamp=None, capacity_mbps=None):
+        """
+        Record a new set of counters for a host.
+        :param host_name: Host name.
+        :param counters: Dictionary of interface -> (rx_bytes, tx_bytes).
+        :param timestamp: Sample time in seconds (defaults to the clock).
+        :param capacity_mbps: Link capacity in megabits per second, used to tell counter wraps from resets.
+        :return: Dictionary of interface -> (rx_bytes_per_second, tx_bytes_per_second) for the interfaces
+                 that have a previous sample.
+        """
+        timestamp = self._clock() if timestamp is None else timestamp
+        rates = {}
+        with self._lock:
+            seen = set()
+            for iface, (rx_bytes, tx_bytes) in counters.items():
+                key = (host_name, iface)
+                seen.add(key)
+                previous = self._previous.get(key)
+                self._previous[key] = (rx_bytes, tx_bytes, timestamp)
+                if previous is None:
+                    continue
+                elapsed = timestamp - previous[2]
+                if elapsed <= 0:
+                    continue
+                max_delta = capacity_mbps * 1_000_000 / 8 * elapsed if capacity_mbps else None
+                rates[iface] = (
+                    self.counter_delta(previous[0], rx_bytes, max_delta) / elapsed,
+                    self.counter_delta(previous[1], tx_bytes, max_delta) / elapsed
+                )
+            # Forget interfaces that disappeared from the host
+            for key in [key for key in self._previous if key[0] == host_name and key not in seen]:
+                del self._previous[key]
+        return rates
+
+    def state(self):
+        """
+        :return: Copy of the previous counters, e.g. for persisting them between runs.
+        """
+        with self._lock:
+            return dict(self._previous)
+
+    def restore(self, previous):
+        """
+        Restore counters saved with state().
+        """
+        with self._lock:
+            self._previous.update(previous)
+
+def network_utilization(rates, capacity_mbps):
+    """
+    Utilization of the busiest interface, as a fraction of the link capacity.
+    :param rates: Dictionary of interface -> (rx_bytes_per_second, tx_bytes_per_second).
+    :param capacity_mbps: Link capacity in megabits per second.
+    :return: Utilization (0.0 when there are no rates yet).
+    """
+    if not rates or not capacity_mbps:
+        return 0.0
+    capacity = capacity_mbps * 1_000_000 / 8
+    return max(max(rx, tx) for rx, tx in rates.values()) / capacity
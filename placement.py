@@ -0,0 +1,165 @@
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python engine is used without it
+    np = None
+
+CPU_WEIGHT = 0.7
+MEMORY_WEIGHT = 0.3
+# Moves a network-overloaded source may give away per plan: container traffic is not known, so a
+# move cannot be projected to relieve the link and the source would otherwise be emptied
+NETWORK_MOVES_PER_PLAN = 1
+
+def relieved(load, cpu_threshold, memory_usage, memory_threshold, network_blocked=False, moves_out=0):
+    """
+    :return: True once a source host is projected back under its CPU and memory thresholds and,
+             if its network is overloaded, has given away its NETWORK_MOVES_PER_PLAN moves.
+    """
+    return (load <= cpu_threshold and memory_usage <= memory_threshold
+            and (not network_blocked or moves_out >= NETWORK_MOVES_PER_PLAN))
+
+class PlacementEngine:
+    """
+    Placement engine for migration candidates.
+    Host capacity and load are kept as arrays. The candidate x host score matrix is separable:
+
+        score[i, j] = base[j] + cpu[i] * cpu_weight[j] + memory[i] * memory_weight[j]
+
+    so each row is evaluated with a few vector operations over all hosts instead of a Python loop.
+    After each accepted move the projected state of the source and target hosts is updated (which
+    only changes their `base` entries), so plans never overcommit a target.
+    """
+
+    def __init__(self, hosts, use_numpy=True, network_weight=0.0):
+        """
+        :param hosts: List of HostState with the allocation fields (free_memory, free_cores, balance_score) filled in.
+        :param use_numpy: Use the vectorized NumPy engine when NumPy is installed.
+        :param network_weight: Weight of the network utilization in the target score.
+        """
+        self.hosts = list(hosts)
+        self.index = {host.name: i for i, host in enumerate(self.hosts)}
+        self.vectorized = use_numpy and np is not None
+        self.load = [host.load_signal for host in self.hosts]
+        self.memory_used = [host.memory_signal * host.memory_total for host in self.hosts]
+        self.free_memory = [host.free_memory for host in self.hosts]
+        self.free_cores = [host.free_cores for host in self.hosts]
+        self.memory_total = [host.memory_total or 1 for host in self.hosts]
+        self.cpu_threshold = [host.cpu_threshold for host in self.hosts]
+        self.memory_threshold = [host.memory_threshold for host in self.hosts]
+        # Network does not change with the moves (container traffic is not known), it is a fixed penalty
+        self.network_score = [host.network_utilization / host.network_threshold * network_weight for host in self.hosts]
+        # Hosts whose links are already saturated are never chosen as targets
+        self.network_blocked = [host.network_overloaded for host in self.hosts]
+        self.moves_out = [0] * len(self.hosts)
+        if self.vectorized:
+            for name in ('load', 'memory_used', 'free_memory', 'free_cores', 'memory_total', 'cpu_threshold', 'memory_threshold', 'network_score'):
+                setattr(self, name, np.asarray(getattr(self, name), dtype=np.float64))
+            self.network_blocked = np.asarray(self.network_blocked, dtype=bool)
+            self.cpu_weight = CPU_WEIGHT / self.cpu_threshold
+            self.memory_weight = MEMORY_WEIGHT / self.memory_total
+            self.base = self.load * self.cpu_weight + self.memory_used * self.memory_weight + self.network_score
+
+    def score_matrix(self, cpu, memory):
+        """
+        Total score of moving each candidate (rows) to each host (columns) given the current
+        projected state; lower is better. Only used by callers that need the full matrix.
+        """
+        cpu = np.asarray(cpu, dtype=np.float64)
+        memory = np.asarray(memory, dtype=np.float64)
+        return self.base + np.outer(cpu, self.cpu_weight) + np.outer(memory, self.memory_weight)
+
+    def _score_row(self, cpu, memory):
+        return [
+            (self.load[j] + cpu) / self.cpu_threshold[j] * CPU_WEIGHT
+            + (self.memory_used[j] + memory) / self.memory_total[j] * MEMORY_WEIGHT
+            + self.network_score[j]
+            for j in range(len(self.hosts))
+        ]
+
+    def _apply_move(self, source, target, cpu, memory, cores):
+        self.load[target] += cpu
+        self.memory_used[target] += memory
+        self.free_memory[target] -= memory
+        self.free_cores[target] -= cores
+        if source is not None:
+            self.moves_out[source] += 1
+            self.load[source] -= cpu
+            self.memory_used[source] -= memory
+            self.free_memory[source] += memory
+            self.free_cores[source] += cores
+        if self.vectorized:
+            for j in (target,) if source is None else (target, source):
+                self.base[j] = self.load[j] * self.cpu_weight[j] + self.memory_used[j] * self.memory_weight[j] + self.network_score[j]
+
+    def source_relieved(self, source):
+        """
+        :return: True once the projected state of a source host is back under both thresholds (see relieved).
+        """
+        return relieved(self.load[source], self.cpu_threshold[source],
+                        self.memory_used[source] / self.memory_total[source], self.memory_threshold[source],
+                        bool(self.network_blocked[source]), self.moves_out[source])
+
+    def plan(self, candidates, stop_when_relieved=True):
+        """
+        Assign each candidate, in order, to the feasible target with the lowest projected score.
+        :param candidates: Migration candidates sorted by priority (dicts with 'source_host',
+                           'container_cpu_load', 'container_memory' and 'container_cores').
+        :param stop_when_relieved: Skip candidates whose source host is no longer overloaded.
+        :return: List of placements, one per accepted candidate, with the chosen target and its scores.
+        """
+        placements = []
+        if not candidates or not self.hosts:
+            return placements
+
+        cpu = [candidate['container_cpu_load'] for candidate in candidates]
+        memory = [candidate['container_memory'] for candidate in candidates]
+        cores = [candidate['container_cores'] for candidate in candidates]
+        sources = [self.index.get(candidate['source_host']) for candidate in candidates]
+
+        for i, candidate in enumerate(candidates):
+            source = sources[i]
+            if stop_when_relieved and source is not None and self.source_relieved(source):
+                continue
+
+            if self.vectorized:
+                row = self.base + cpu[i] * self.cpu_weight + memory[i] * self.memory_weight
+                row[(self.free_memory < memory[i]) | (self.free_cores < cores[i]) | self.network_blocked] = np.inf
+                if source is not None:
+                    row[source] = np.inf
+                target = int(np.argmin(row))
+                if row[target] == np.inf:
+                    continue
+            else:
+                row = self._score_row(cpu[i], memory[i])
+                target = None
+                for j in range(len(self.hosts)):
+                    if j == source or self.network_blocked[j] or self.free_memory[j] < memory[i] or self.free_cores[j] < cores[i]:
+                        continue
+                    if target is None or row[j] < row[target]:
+                        target = j
+                if target is None:
+                    continue
+
+            host = self.hosts[target]
+            cpu_score = (self.load[target] + cpu[i]) / self.cpu_threshold[target]
+            memory_score = (self.memory_used[target] + memory[i]) / self.memory_total[target]
+            placements.append({
+                'candidate': candidate,
+                'target_host': host.name,
+                'free_memory': _as_number(self.free_memory[target]),
+                'free_cores': _as_number(self.free_cores[target]),
+                'cpu_score': float(cpu_score),
+                'memory_score': float(memory_score),
+                'total_score': float(cpu_score * CPU_WEIGHT + memory_score * MEMORY_WEIGHT + self.network_score[target]),
+                'balance_score_after_migration': float(
+                    cpu_score * CPU_WEIGHT + memory_score / self.memory_threshold[target] * MEMORY_WEIGHT + self.network_score[target]
+                ),
+            })
+
+            self._apply_move(source, target, cpu[i], memory[i], cores[i])
+
+        return placements
+
+def _as_number(value):
+    # Keep integral capacities as int so they print without a trailing '.0'
+    value = float(value)
+    return int(value) if value.is_integer() else value
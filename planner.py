@@ -0,0 +1,275 @@
+import time
+from placement import CPU_WEIGHT, MEMORY_WEIGHT
+
+MB = 1024 * 1024
+
+class GlobalPlanner:
+    """
+    Whole-cluster rebalancing planner used by `migration_strategy: global`.
+
+    Instead of picking a target for each container on its own, it searches for the smallest set of
+    moves that lowers the highest balance score in the cluster:
+
+    1. Best-improvement descent: repeatedly move the container off the hottest host whose move
+       lowers the peak score the most (single moves first, then pairwise swaps when capacity
+       does not allow a plain move).
+    2. Pruning: every planned move is reverted again if the cluster peak does not get worse
+       without it, so no migration is kept that does not pay for itself.
+
+    The search respects a cap on the number of migrations and on the bytes moved (estimated from
+    container memory) and stops at the time budget, returning the best plan found so far.
+    Migrations run one after the other, so the plan is returned in an order where every move fits
+    its target when it runs; moves that cannot be ordered that way (a cycle of full hosts that would
+    need a temporary host) are left out of the plan and counted in `skipped`.
+    """
+
+    def __init__(self, hosts, candidates, max_migrations=None, max_bytes_moved=None, time_budget=2.0, epsilon=1e-6, network_weight=0.0):
+        """
+        :param hosts: List of HostState with the allocation fields (free_memory, free_cores) filled in.
+        :param candidates: Movable containers (dicts with 'container_id', 'source_host',
+                           'container_cpu_load', 'container_memory' and 'container_cores').
+        :param max_migrations: Maximum number of containers the plan may move (None for no cap).
+        :param max_bytes_moved: Maximum estimated bytes the plan may move (None for no cap).
+        :param time_budget: Seconds the search may run before returning its best plan.
+        :param epsilon: Minimum peak score improvement for a move to be accepted.
+        :param network_weight: Weight of the network utilization in the balance score.
+        """
+        self.hosts = list(hosts)
+        self.index = {host.name: j for j, host in enumerate(self.hosts)}
+        self.candidates = [candidate for candidate in candidates if candidate['source_host'] in self.index]
+        self.max_migrations = max_migrations
+        self.max_bytes_moved = max_bytes_moved
+        self.time_budget = time_budget
+        self.epsilon = epsilon
+
+        self.load = [host.load_signal for host in self.hosts]
+        self.memory_used = [host.memory_signal * host.memory_total for host in self.hosts]
+        self.free_memory = [host.free_memory for host in self.hosts]
+        self.free_cores = [host.free_cores for host in self.hosts]
+        self.memory_total = [host.memory_total or 1 for host in self.hosts]
+        self.cpu_threshold = [host.cpu_threshold for host in self.hosts]
+        self.memory_threshold = [host.memory_threshold for host in self.hosts]
+        self.network_score = [host.network_utilization / host.network_threshold * network_weight for host in self.hosts]
+        self.network_blocked = [host.network_overloaded for host in self.hosts]
+
+        self.origin = [self.index[candidate['source_host']] for candidate in self.candidates]
+        self.location = list(self.origin)
+        self.members = [set() for _ in self.hosts]
+        for c, j in enumerate(self.location):
+            self.members[j].add(c)
+
+        self.moved_count = 0
+        self.moved_bytes = 0
+        self.timed_out = False
+        self.iterations = 0
+        self.skipped = 0
+
+    def score(self, j, load_delta=0.0, memory_delta=0):
+        """
+        Balance score of host j after adding the given load and memory.
+        """
+        memory_usage = (self.memory_used[j] + memory_delta) / self.memory_total[j]
+        return ((self.load[j] + load_delta) / self.cpu_threshold[j] * CPU_WEIGHT
+                + memory_usage / self.memory_threshold[j] * MEMORY_WEIGHT + self.network_score[j])
+
+    def peak(self):
+        return max((self.score(j) for j in range(len(self.hosts))), default=0.0)
+
+    def migrations(self):
+        return self.moved_count
+
+    def bytes_moved(self):
+        return self.moved_bytes
+
+    def _fits(self, c, j, freed_memory=0, freed_cores=0):
+        candidate = self.candidates[c]
+        if self.network_blocked[j] and j != self.origin[c]:
+            return False  # Saturated links only take back their own containers
+        return (self.free_memory[j] + freed_memory >= candidate['container_memory']
+                and self.free_cores[j] + freed_cores >= candidate['container_cores'])
+
+    def _within_caps(self, moves):
+        # moves: list of (container, new host); checks the caps for the plan after applying them
+        migrations = self.moved_count
+        moved = self.moved_bytes
+        for c, j in moves:
+            size = self.candidates[c]['container_memory'] * MB
+            was_moved = self.location[c] != self.origin[c]
+            will_move = j != self.origin[c]
+            migrations += will_move - was_moved
+            moved += size * (will_move - was_moved)
+        if self.max_migrations is not None and migrations > self.max_migrations:
+            return False
+        if self.max_bytes_moved is not None and moved > self.max_bytes_moved:
+            return False
+        return True
+
+    def _at_cap(self):
+        # Once the cap is reached only containers that already moved may move again
+        return self.max_migrations is not None and self.moved_count >= self.max_migrations
+
+    def _move(self, c, j):
+        candidate = self.candidates[c]
+        source = self.location[c]
+        cpu, memory, cores = candidate['container_cpu_load'], candidate['container_memory'], candidate['container_cores']
+        self.load[source] -= cpu
+        self.memory_used[source] -= memory
+        self.free_memory[source] += memory
+        self.free_cores[source] += cores
+        self.load[j] += cpu
+        self.memory_used[j] += memory
+        self.free_memory[j] -= memory
+        self.free_cores[j] -= cores
+        self.members[source].discard(c)
+        self.members[j].add(c)
+        self.location[c] = j
+        delta = (j != self.origin[c]) - (source != self.origin[c])
+        self.moved_count += delta
+        self.moved_bytes += delta * memory * MB
+
+    def _best_single_move(self, hot, current_peak, scores, order):
+        # `order` lists the hosts by ascending score: a target can never end up below its current
+        # score, so the scan stops as soon as the remaining targets cannot beat the best move found
+        best = None
+        at_cap = self._at_cap()
+        for c in self.members[hot]:
+            if at_cap and self.location[c] == self.origin[c]:
+                continue
+            candidate = self.candidates[c]
+            cpu, memory = candidate['container_cpu_load'], candidate['container_memory']
+            hot_after = self.score(hot, -cpu, -memory)
+            bound = best[0][0] if best else current_peak - self.epsilon
+            if hot_after > bound:
+                continue
+            for j in order:
+                if scores[j] > bound:
+                    break
+                if j == hot or not self._fits(c, j):
+                    continue
+                target_after = self.score(j, cpu, memory)
+                pair_peak = max(hot_after, target_after)
+                if pair_peak >= current_peak - self.epsilon:
+                    continue
+                # On ties prefer moving a container back to its origin host (cancels a migration),
+                # then the target that ends up least loaded
+                key = (pair_peak, 0 if j == self.origin[c] else 1, target_after)
+                if (best is None or key < best[0]) and self._within_caps([(c, j)]):
+                    best = (key, [(c, j)])
+        return best
+
+    def _best_swap(self, hot, current_peak, scores, order, deadline):
+        best = None
+        at_cap = self._at_cap()
+        for c in self.members[hot]:
+            if at_cap and self.location[c] == self.origin[c]:
+                continue
+            a = self.candidates[c]
+            for j in order:
+                if scores[j] > (best[0][0] if best else current_peak - self.epsilon):
+                    break
+                if j == hot:
+                    continue
+                if time.monotonic() > deadline:
+                    self.timed_out = True
+                    return best
+                for d in self.members[j]:
+                    if at_cap and self.location[d] == self.origin[d]:
+                        continue
+                    b = self.candidates[d]
+                    cpu_delta = a['container_cpu_load'] - b['container_cpu_load']
+                    memory_delta = a['container_memory'] - b['container_memory']
+                    if cpu_delta <= 0 and memory_delta <= 0:
+                        continue  # Swapping would not relieve the hot host
+                    if not self._fits(c, j, b['container_memory'], b['container_cores']):
+                        continue
+                    if not self._fits(d, hot, a['container_memory'], a['container_cores']):
+                        continue
+                    if not (self._fits(c, j) or self._fits(d, hot)):
+                        continue  # Neither leg has room until the other one has run
+                    target_after = self.score(j, cpu_delta, memory_delta)
+                    pair_peak = max(self.score(hot, -cpu_delta, -memory_delta), target_after)
+                    if pair_peak >= current_peak - self.epsilon:
+                        continue
+                    key = (pair_peak, (j != self.origin[c]) + (hot != self.origin[d]), target_after)
+                    if (best is None or key < best[0]) and self._within_caps([(c, j), (d, hot)]):
+                        best = (key, [(c, j), (d, hot)])
+        return best
+
+    def _prune(self, deadline):
+        # Revert moves that are not needed to keep the peak score
+        target_peak = self.peak()
+        for c in sorted(range(len(self.candidates)), key=lambda c: self.candidates[c]['container_memory'], reverse=True):
+            if time.monotonic() > deadline:
+                self.timed_out = True
+                return
+            origin, current = self.origin[c], self.location[c]
+            if origin == current or not self._fits(c, origin):
+                continue
+            self._move(c, origin)
+            if self.peak() > target_peak + self.epsilon:
+                self._move(c, current)
+
+    def plan(self):
+        """
+        Run the search.
+        :return: List of placements (same format as PlacementEngine.plan), in the order they should run.
+        """
+        deadline = time.monotonic() + self.time_budget
+        start_peak = self.peak()
+
+        while True:
+            if time.monotonic() > deadline:
+                self.timed_out = True
+                break
+            self.iterations += 1
+            scores = [self.score(j) for j in range(len(self.hosts))]
+            hot = max(range(len(self.hosts)), key=scores.__getitem__)
+            current_peak = scores[hot]
+
+            order = sorted(range(len(self.hosts)), key=scores.__getitem__)
+            best = (self._best_single_move(hot, current_peak, scores, order)
+                    or self._best_swap(hot, current_peak, scores, order, deadline))
+            if best is None:
+                break
+            for c, j in best[1]:
+                self._move(c, j)
+
+        self._prune(deadline)
+        self.start_peak = start_peak
+        placements = self._placements()
+        self.final_peak = self.peak()
+        return placements
+
+    def _placements(self):
+        # Replay the final moves from the original state to report the projected scores of each step
+        moves = [c for c, j in enumerate(self.location) if j != self.origin[c]]
+        final = {c: self.location[c] for c in moves}
+        for c in moves:
+            self._move(c, self.origin[c])
+
+        placements = []
+        pending = list(moves)
+        while pending:
+            # Run moves whose target already has room first, so capacity is freed before it is needed
+            c = next((c for c in pending if self._fits(c, final[c])), None)
+            if c is None:
+                # Every remaining move waits for another one: they stay on their hosts
+                self.skipped = len(pending)
+                break
+            candidate = self.candidates[c]
+            j = final[c]
+            cpu_score = (self.load[j] + candidate['container_cpu_load']) / self.cpu_threshold[j]
+            memory_score = (self.memory_used[j] + candidate['container_memory']) / self.memory_total[j]
+            placements.append({
+                'candidate': candidate,
+                'target_host': self.hosts[j].name,
+                'free_memory': self.free_memory[j],
+                'free_cores': self.free_cores[j],
+                'cpu_score': cpu_score,
+                'memory_score': memory_score,
+                'total_score': cpu_score * CPU_WEIGHT + memory_score * MEMORY_WEIGHT + self.network_score[j],
+                'balance_score_after_migration': self.score(j, candidate['container_cpu_load'], candidate['container_memory']),
+            })
+            self._move(c, j)
+            pending.remove(c)
+        return placements
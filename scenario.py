@@ -0,0 +1,273 @@
+from model import HostState
+from placement import CPU_WEIGHT, MEMORY_WEIGHT, PlacementEngine
+
+def _copy(host):
+    # Writable copy of a host for a scenario; containers are shared, only the list is copied
+    copy = HostState(
+        host.name, host.address, host.connection, host.cpu_threshold, host.memory_threshold,
+        cpu_cores=host.cpu_cores, load_1=host.load_1, load_5=host.load_5, load_15=host.load_15,
+        memory_used=host.memory_used, memory_total=host.memory_total,
+        network_threshold=host.network_threshold, network_capacity=host.network_capacity,
+        containers=list(host.containers)
+    )
+    for field in ('load_signal', 'memory_signal', 'network_utilization', 'used_cores', 'free_cores',
+                  'total_container_memory', 'total_container_cpu_load', 'free_memory', 'balance_score'):
+        setattr(copy, field, getattr(host, field))
+    return copy
+
+def _overloaded(host):
+    return host.load_signal > host.cpu_threshold or host.memory_signal > host.memory_threshold or host.network_overloaded
+
+class Scenario:
+    """
+    What-if view of the cluster for drain and maintenance planning.
+
+    The collected hosts are shared by every scenario and never modified: a host is copied into the
+    scenario's overlay the first time the scenario changes it, and fork() starts a new scenario
+    from the current one without copying anything. Evaluating many scenarios therefore costs only
+    the hosts they touch, and sends no remote command: container metrics come from the hosts or
+    from the container cache of the cycle.
+    """
+
+    def __init__(self, hosts, default_params, cache=None, name='scenario'):
+        """
+        :param hosts: Dictionary of host name -> HostState with the allocation fields filled in (e.g. after suggest_migrations).
+        :param default_params: Default parameters from the configuration.
+        :param cache: Optional ContainerMetricsCache holding the container metrics of the cycle.
+        :param name: Name reported by evaluate().
+        """
+        self.base = hosts
+        self.default_params = default_params
+        self.cache = cache
+        self.name = name
+        self.network_weight = default_params.get('network_weight', 0.0)
+        self._overlay = {}      # Host name -> HostState copy (or added host)
+        self._owned = set()     # Overlay hosts this scenario may modify in place
+        self.draining = set()
+        self.moves = []
+        self.unplaced = []
+        self.errors = []
+
+    def fork(self, name=None):
+        """
+        :return: A new scenario starting from the state of this one. Both can be changed independently.
+        """
+        child = Scenario(self.base, self.default_params, self.cache, name or self.name)
+        child._overlay = dict(self._overlay)
+        self._owned = set()  # The overlay hosts are shared now: both sides copy them before changing them
+        child.draining = set(self.draining)
+        child.moves = list(self.moves)
+        child.unplaced = list(self.unplaced)
+        child.errors = list(self.errors)
+        return child
+
+    def host(self, name):
+        """
+        :return: The HostState of a host in this scenario, or None.
+        """
+        return self._overlay.get(name) or self.base.get(name)
+
+    def host_names(self):
+        return list(self.base) + [name for name in self._overlay if name not in self.base]
+
+    def _writable(self, name):
+        if name not in self._owned:
+            self._overlay[name] = _copy(self.host(name))
+            self._owned.add(name)
+        return self._overlay[name]
+
+    def _container(self, host_name, container):
+        # Container with metrics, from the host itself or the cache of the cycle
+        if container.has_metrics or self.cache is None:
+            return container
+        cached = self.cache.get(host_name, container.vmid)
+        return cached if cached is not None else container
+
+    def add_host(self, name, cpu_cores, memory_total, cpu_threshold=None, memory_threshold=None):
+        """
+        Add an empty host.
+        :param cpu_cores: Cores of the new host.
+        :param memory_total: Memory of the new host in MB.
+        :param cpu_threshold: CPU load threshold (defaults to the threshold per core of the cluster, see cpu_threshold_for).
+        :param memory_threshold: Memory usage threshold (defaults to the configured one).
+        :return: self, so calls can be chained.
+        """
+        if self.host(name) is not None:
+            self.errors.append(f"Host {name} already exists")
+            return self
+        host = HostState(
+            name, '', None,
+            cpu_threshold if cpu_threshold is not None else self.cpu_threshold_for(cpu_cores),
+            memory_threshold if memory_threshold is not None else self.default_params['memory_threshold'],
+            cpu_cores=cpu_cores, memory_total=memory_total,
+            network_threshold=self.default_params.get('network_threshold', 0.8),
+            network_capacity=self.default_params.get('network_capacity_mbps', 1000)
+        )
+        self._overlay[name] = host
+        self._owned.add(name)
+        return self
+
+    def cpu_threshold_for(self, cpu_cores):
+        """
+        CPU load threshold of a host with the given cores: the thresholds of the existing hosts per
+        core, so a larger host may carry more load. Without hosts with known cores, the configured threshold.
+        """
+        hosts = [self.host(name) for name in self.host_names()]
+        cores = sum(host.cpu_cores for host in hosts if host.cpu_cores)
+        if not cores:
+            return self.default_params['cpu_threshold']
+        return sum(host.cpu_threshold for host in hosts if host.cpu_cores) / cores * cpu_cores
+
+    def move(self, container_id, source_host, target_host):
+        """
+        Move one container, whether it fits or not (see evaluate() for the feasibility).
+        :return: True if the container and both hosts exist.
+        """
+        source = self.host(source_host)
+        if source is None or self.host(target_host) is None:
+            self.errors.append(f"Unknown host in the move of container {container_id}: {source_host} -> {target_host}")
+            return False
+        container = next((container for container in source.containers if container.vmid == container_id), None)
+        if container is None:
+            self.errors.append(f"Container {container_id} is not on {source_host}")
+            return False
+        container = self._container(source_host, container)
+        if not container.has_metrics:
+            self.errors.append(f"No metrics for container {container_id} on {source_host}")
+            return False
+
+        source = self._writable(source_host)
+        target = self._writable(target_host)
+        source.containers = [other for other in source.containers if other.vmid != container_id]
+        target.containers.append(container)
+        for host, sign in ((target, 1), (source, -1)):
+            host.load_signal += sign * container.cpu_load
+            host.memory_signal += sign * container.memory_used / (host.memory_total or 1)
+            host.free_memory -= sign * container.memory_used
+            host.free_cores -= sign * container.cores
+            host.used_cores += sign * container.cores
+            host.total_container_memory += sign * container.memory_used
+            host.total_container_cpu_load += sign * container.cpu_load
+        self.moves.append({'container_id': container_id, 'source_host': source_host, 'target_host': target_host})
+        return True
+
+    def apply_plan(self, suggestions):
+        """
+        Apply a migration plan.
+        :param suggestions: Migration suggestions as returned by suggest_migrations (container_id, source_host, target_host).
+        :return: self, so calls can be chained.
+        """
+        for suggestion in suggestions:
+            self.move(suggestion['container_id'], suggestion['source_host'], suggestion['target_host'])
+        return self
+
+    def evacuate(self, name):
+        """
+        Drain a host: place every running container on the other hosts (draining hosts are never
+        targets), largest first, with the placement engine. Containers that fit nowhere are
+        reported as unplaced.
+        :return: self, so calls can be chained.
+        """
+        source = self.host(name)
+        if source is None:
+            self.errors.append(f"Unknown host {name}")
+            return self
+        self.draining.add(name)
+
+        candidates = []
+        for container in source.running_containers():
+            container = self._container(name, container)
+            if not container.has_metrics:
+                self.unplaced.append((name, container.vmid))
+                continue
+            candidates.append({
+                'container_id': container.vmid,
+                'source_host': name,
+                'container_priority': container.cpu_load * CPU_WEIGHT + container.memory_used / (source.memory_total or 1) * MEMORY_WEIGHT,
+                'container_cores': container.cores,
+                'container_memory': container.memory_used,
+                'container_cpu_load': container.cpu_load,
+            })
+        candidates.sort(key=lambda candidate: candidate['container_priority'], reverse=True)
+
+        targets = [self.host(host_name) for host_name in self.host_names() if host_name not in self.draining]
+        engine = PlacementEngine(
+            targets + [source],
+            use_numpy=self.default_params.get('placement_engine', 'numpy') == 'numpy',
+            network_weight=self.network_weight
+        )
+        placed = set()
+        for placement in engine.plan(candidates, stop_when_relieved=False):
+            if self.move(placement['candidate']['container_id'], name, placement['target_host']):
+                placed.add(placement['candidate']['container_id'])
+        self.unplaced += [(name, candidate['container_id']) for candidate in candidates if candidate['container_id'] not in placed]
+        return self
+
+    def balance_score(self, host):
+        return (host.load_signal / host.cpu_threshold * CPU_WEIGHT
+                + host.memory_signal / host.memory_threshold * MEMORY_WEIGHT
+                + host.network_utilization / host.network_threshold * self.network_weight)
+
+    def evaluate(self):
+        """
+        :return: Dictionary with the scenario 'name', the projected 'balance_scores' of every host
+                 (host name -> score), 'peak_score', the 'overloaded' hosts, the 'overcommitted' hosts
+                 (projected to need more memory than they have; cores may be overcommitted), the
+                 'unplaced' containers ((host, vmid) pairs), the 'moves', the 'errors', the 'newly_overloaded'
+                 hosts (overloaded in the scenario but not in the collected state) and 'feasible': True when
+                 every container was placed, no move failed and no host is overcommitted or newly overloaded.
+        """
+        hosts = [self.host(name) for name in self.host_names()]
+        scores = {host.name: self.balance_score(host) for host in hosts}
+        overloaded = [host.name for host in hosts if _overloaded(host)]
+        newly_overloaded = [name for name in overloaded if name not in self.base or not _overloaded(self.base[name])]
+        overcommitted = [host.name for host in hosts if host.free_memory < 0]
+        return {
+            'name': self.name,
+            'balance_scores': scores,
+            'peak_score': max(scores.values(), default=0.0),
+            'overloaded': overloaded,
+            'newly_overloaded': newly_overloaded,
+            'overcommitted': overcommitted,
+            'unplaced': list(self.unplaced),
+            'moves': list(self.moves),
+            'errors': list(self.errors),
+            'feasible': not self.unplaced and not self.errors and not overcommitted and not newly_overloaded,
+        }
+
+def parse_scenario(spec):
+    """
+    Parse a scenario given on the command line: steps separated by '+', each one of
+    'evacuate:<host>', 'add:<host>:<cores>:<memory MB>' or 'plan' (apply the suggested migrations).
+    :return: List of (step, arguments) tuples.
+    :raises ValueError: On an unknown or malformed step.
+    """
+    steps = []
+    for step in spec.split('+'):
+        parts = step.strip().split(':')
+        if parts[0] == 'evacuate' and len(parts) == 2:
+            steps.append(('evacuate', (parts[1],)))
+        elif parts[0] == 'add' and len(parts) == 4:
+            steps.append(('add', (parts[1], int(parts[2]), int(parts[3]))))
+        elif parts == ['plan']:
+            steps.append(('plan', ()))
+        else:
+            raise ValueError(f"Invalid scenario step: {step!r}")
+    return steps
+
+def run_scenario(base, spec, suggestions=None):
+    """
+    Evaluate a scenario spec (see parse_scenario) on a fork of a base scenario.
+    :param base: Scenario of the current cluster state.
+    :param suggestions: Migration suggestions applied by the 'plan' step.
+    :return: Result of Scenario.evaluate().
+    """
+    scenario = base.fork(spec)
+    for step, arguments in parse_scenario(spec):
+        if step == 'evacuate':
+            scenario.evacuate(*arguments)
+        elif step == 'add':
+            scenario.add_host(*arguments)
+        else:
+            scenario.apply_plan(suggestions or [])
+    return scenario.evaluate()
@@ -0,0 +1,136 @@
+import heapq
+import threading
+import time
+
+class PollingScheduler:
+    """
+    Adaptive per-host polling schedule for daemon mode.
+    Every host has its own interval: hosts that are hot (overloaded or close to their thresholds)
+    or whose balance score moved are polled every `min_interval`/`interval` seconds, while hosts
+    that stay idle and stable back off geometrically up to `max_interval`.
+    """
+
+    def __init__(self, interval=30, min_interval=10, max_interval=300, backoff=1.5, change_threshold=0.05,
+                 hot_score=0.9, clock=time.monotonic):
+        """
+        :param interval: Base seconds between two polls of a host.
+        :param min_interval: Seconds between polls of a hot host.
+        :param max_interval: Upper bound of the interval of a stable host.
+        :param backoff: Factor the interval of a stable host grows by after every unchanged poll.
+        :param change_threshold: Change of the balance score between two polls that counts as a change.
+        :param hot_score: Balance score from which a host is considered hot.
+        :param clock: Monotonic clock function, replaceable for testing.
+        """
+        self.interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.backoff = backoff
+        self.change_threshold = change_threshold
+        self.hot_score = hot_score
+        self._clock = clock
+        self._intervals = {}
+        self._scores = {}
+        self._queue = []     # Heap of (due time, host name)
+        self._due = {}       # Host name -> due time (entries in the heap with another time are stale)
+        self._lock = threading.Lock()
+
+    def add(self, name, due=None):
+        """
+        Schedule a host (immediately by default). Re-adding a known host keeps its interval.
+        """
+        with self._lock:
+            self._intervals.setdefault(name, self.interval)
+            self._schedule(name, self._clock() if due is None else due)
+
+    def remove(self, name):
+        with self._lock:
+            self._intervals.pop(name, None)
+            self._scores.pop(name, None)
+            self._due.pop(name, None)
+
+    def hosts(self):
+        return list(self._intervals)
+
+    def _schedule(self, name, due):
+        self._due[name] = due
+        heapq.heappush(self._queue, (due, name))
+
+    def pop_due(self, now=None):
+        """
+        :return: Names of the hosts whose poll is due, most overdue first. They stay unscheduled until record() or failed().
+        """
+        now = self._clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                when, name = heapq.heappop(self._queue)
+                if self._due.get(name) == when:
+                    del self._due[name]
+                    due.append(name)
+        return due
+
+    def next_due(self):
+        """
+        :return: Time of the next scheduled poll, or None if nothing is scheduled.
+        """
+        with self._lock:
+            while self._queue and self._due.get(self._queue[0][1]) != self._queue[0][0]:
+                heapq.heappop(self._queue)
+            return self._queue[0][0] if self._queue else None
+
+    def record(self, name, score, overloaded=False, now=None):
+        """
+        Adapt the interval of a host after a successful poll and schedule its next poll.
+        :param name: Host name.
+        :param score: Current balance score of the host.
+        :param overloaded: Whether the host is over any of its thresholds.
+        :return: The new interval in seconds.
+        """
+        now = self._clock() if now is None else now
+        with self._lock:
+            if name not in self._intervals:
+                return None
+            previous = self._scores.get(name)
+            self._scores[name] = score
+            if overloaded or score >= self.hot_score:
+                interval = self.min_interval
+            elif previous is None or abs(score - previous) > self.change_threshold:
+                interval = self.interval
+            else:
+                interval = min(self._intervals[name] * self.backoff, self.max_interval)
+            self._intervals[name] = interval
+            self._schedule(name, now + interval)
+            return interval
+
+    def failed(self, name, now=None):
+        """
+        Schedule a quick retry of a host that could not be polled.
+        """
+        now = self._clock() if now is None else now
+        with self._lock:
+            if name in self._intervals:
+                self._intervals[name] = self.min_interval
+                self._schedule(name, now + self.min_interval)
+
+    def intervals(self):
+        """
+        :return: Dictionary of host name -> current polling interval.
+        """
+        with self._lock:
+            return dict(self._intervals)
+
+def plan_changed(previous, current, threshold):
+    """
+    Decide whether the cluster changed enough since the last plan to plan again.
+    :param previous: Dictionary of host name -> (balance score, overloaded) at the last plan, or None.
+    :param current: Same for the current cluster state.
+    :param threshold: Change of a host's balance score that counts as meaningful.
+    :return: True if hosts were added or removed, a host's overload state flipped or its score moved by more than the threshold.
+    """
+    if previous is None or previous.keys() != current.keys():
+        return True
+    for name, (score, overloaded) in current.items():
+        previous_score, previous_overloaded = previous[name]
+        if overloaded != previous_overloaded or abs(score - previous_score) > threshold:
+            return True
+    return False
@@ -1,24 +1,24 @@
 import paramiko
+from functions import run_command
 
-def check_cpu_load(cpu_load, threshold=1.0):
+def check_cpu_load(load_1_min, threshold=1.0):
     """
     Check if the CPU load exceeds a given threshold.
-    :param cpu_load: Load average string (e.g., "1.23 0.98 0.67")
+    :param load_1_min: 1-minute load average (e.g., 1.23)
     :param threshold: The threshold for the 1-minute load average.
     :return: True if the load exceeds the threshold, False otherwise.
     """
-    load_1_min = float(cpu_load.split()[0])
     return load_1_min > threshold
 
-def check_memory_usage(memory_info, threshold=80):
+def check_memory_usage(used, total, threshold=80):
     """
     Check if the memory usage exceeds a given threshold.
-    :param memory_info: Memory usage string (e.g., "4096 8192" for used and total memory in MB)
+    :param used: Used memory in MB.
+    :param total: Total memory in MB.
     :param threshold: The threshold percentage for memory usage.
     :return: True if the memory usage exceeds the threshold, False otherwise.
     """
-    used, total = map(int, memory_info.split())
-    usage_percentage = (used / total) * 100
+    usage_percentage = (used / total) * 100 if total else 0
     return usage_percentage > threshold
 
 def get_container_cpu_load(ssh, vmid, threshold=1.0):
@@ -30,14 +30,14 @@ def get_container_cpu_load(ssh, vmid, threshold=1.0):
     :return: True if the load exceeds the threshold, False otherwise.
     """
     cmd = f"pct exec {vmid} -- cat /proc/loadavg"
-    stdin, stdout, stderr = ssh.exec_command(cmd)
-    cpu_load = stdout.read().decode().strip()
+    cpu_load, error = run_command(ssh, cmd, 'pct_exec_cpu')
+    cpu_load = cpu_load.strip()
 
-    if stderr.read().decode().strip():
+    if error.strip():
         print(f"Error fetching CPU load for container {vmid}")
         return False
 
-    return check_cpu_load(cpu_load, threshold)
+    return check_cpu_load(float(cpu_load.split()[0]), threshold)
 
 def get_container_memory_usage(ssh, vmid, threshold=80):
     """
@@ -48,29 +48,32 @@ def get_container_memory_usage(ssh, vmid, threshold=80):
     :return: True if the memory usage exceeds the threshold, False otherwise.
     """
     cmd = f"pct exec {vmid} -- free -m | grep Mem | awk '{{print $3, $2}}'"
-    stdin, stdout, stderr = ssh.exec_command(cmd)
-    memory_info = stdout.read().decode().strip()
+    memory_info, error = run_command(ssh, cmd, 'pct_exec_memory')
+    memory_info = memory_info.strip()
 
-    if stderr.read().decode().strip():
+    if error.strip():
         print(f"Error fetching memory usage for container {vmid}")
         return False
 
-    return check_memory_usage(memory_info, threshold)
+    used, total = map(int, memory_info.split())
+    return check_memory_usage(used, total, threshold)
 
-def get_host_cpu_load(cpu_load, threshold=1.0):
+def get_host_cpu_load(host, threshold=None):
     """
     Wrapper function to check the CPU load for a host.
-    :param cpu_load: Load average string from the host.
-    :param threshold: The threshold for the 1-minute load average.
+    :param host: HostState of the host.
+    :param threshold: The threshold for the 1-minute load average (defaults to the host's cpu_threshold).
     :return: True if the load exceeds the threshold, False otherwise.
     """
-    return check_cpu_load(cpu_load, threshold)
+    return check_cpu_load(host.load_1, host.cpu_threshold if threshold is None else threshold)
 
-def get_host_memory_usage(memory_info, threshold=80):
+def get_host_memory_usage(host, threshold=None):
     """
     Wrapper function to check the memory usage for a host.
-    :param memory_info: Memory usage string from the host.
-    :param threshold: The threshold percentage for memory usage.
+    :param host: HostState of the host.
+    :param threshold: The threshold percentage for memory usage (defaults to the host's memory_threshold).
     :return: True if the memory usage exceeds the threshold, False otherwise.
     """
-    return check_memory_usage(memory_info, threshold)
+    if threshold is None:
+        threshold = host.memory_threshold * 100
+    return check_memory_usage(host.memory_used, host.memory_total, threshold)
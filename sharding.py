@@ -0,0 +1,227 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from model import HostState
+from placement import PlacementEngine, relieved
+from planner import GlobalPlanner
+
+def host_groups(hosts_config, shard_by):
+    """
+    :param hosts_config: List of host entries from the configuration.
+    :param shard_by: Host configuration key to group the hosts by (e.g. 'zone'), or 'auto'.
+    :return: Dictionary of host name -> group, or None for automatic groups.
+    """
+    if not shard_by or shard_by == 'auto':
+        return None
+    return {host['name']: host.get(shard_by) for host in hosts_config}
+
+def shard_hosts(hosts, groups=None, shard_size=50):
+    """
+    Split the hosts into planning groups.
+    :param hosts: List of HostState sorted by balance score, highest first.
+    :param groups: Dictionary of host name -> group (see host_groups); hosts without a group share one.
+                   Without it the hosts are split in groups of `shard_size`, dealt round-robin from the
+                   sorted hosts so every group gets hot and cold hosts.
+    :param shard_size: Hosts per automatic group.
+    :return: List of lists of HostState.
+    """
+    if groups is not None:
+        shards = {}
+        for host in hosts:
+            shards.setdefault(groups.get(host.name), []).append(host)
+        return list(shards.values())
+    count = max(1, -(-len(hosts) // max(1, shard_size)))
+    shards = [[] for _ in range(count)]
+    for i, host in enumerate(hosts):
+        shards[i % count].append(host)
+    return [shard for shard in shards if shard]
+
+def planning_copy(host):
+    """
+    :return: A light copy of a HostState with only what the planners read (no containers, no connection),
+             cheap to send to a worker process.
+    """
+    copy = HostState(
+        host.name, host.address, None, host.cpu_threshold, host.memory_threshold,
+        cpu_cores=host.cpu_cores, memory_used=host.memory_used, memory_total=host.memory_total,
+        network_threshold=host.network_threshold, network_capacity=host.network_capacity
+    )
+    for field in ('load_signal', 'memory_signal', 'network_utilization', 'used_cores', 'free_cores',
+                  'total_container_memory', 'total_container_cpu_load', 'free_memory', 'balance_score'):
+        setattr(copy, field, getattr(host, field))
+    return copy
+
+def plan_shard(hosts, candidates, strategy, params):
+    """
+    Plan the migrations inside one group of hosts (runs in a worker process).
+    :param hosts: Planning copies of the group's hosts.
+    :param candidates: Migration candidates whose source host is in the group.
+    :param strategy: 'load_based' or 'global'.
+    :param params: Planner settings: use_numpy, network_weight, max_migrations, max_bytes_moved, time_budget.
+    :return: List of placements (see PlacementEngine.plan).
+    """
+    if strategy == 'global':
+        planner = GlobalPlanner(
+            hosts, candidates,
+            max_migrations=params.get('max_migrations'),
+            max_bytes_moved=params.get('max_bytes_moved'),
+            time_budget=params.get('time_budget', 2.0),
+            network_weight=params.get('network_weight', 0.0)
+        )
+        return planner.plan()
+    engine = PlacementEngine(hosts, use_numpy=params.get('use_numpy', True), network_weight=params.get('network_weight', 0.0))
+    return engine.plan(candidates)
+
+def _needs_relief(host, moves_out=0):
+    # A network-only overload is relieved by NETWORK_MOVES_PER_PLAN moves (see placement.relieved)
+    return not relieved(host.load_signal, host.cpu_threshold, host.memory_signal, host.memory_threshold,
+                        host.network_overloaded, moves_out)
+
+def _project(hosts, placement):
+    # Apply a planned move to the planning copies
+    candidate = placement['candidate']
+    for name, sign in ((placement['target_host'], 1), (candidate['source_host'], -1)):
+        host = hosts[name]
+        host.load_signal += sign * candidate['container_cpu_load']
+        host.memory_signal += sign * candidate['container_memory'] / (host.memory_total or 1)
+        host.free_memory -= sign * candidate['container_memory']
+        host.free_cores -= sign * candidate['container_cores']
+
+def shard_headroom(shard):
+    """
+    Aggregate spare capacity of a group: load below the CPU thresholds, and free memory.
+    :return: Tuple of (spare load, free memory in MB).
+    """
+    return (sum(max(0.0, host.cpu_threshold - host.load_signal) for host in shard if not host.network_overloaded),
+            sum(max(0, host.free_memory) for host in shard if not host.network_overloaded))
+
+def planning_context():
+    """
+    :return: Multiprocessing context of the planning workers. They are never forked from the balancer
+             itself: its SSH transports, stream readers and metrics server threads may hold locks that
+             a forked child would inherit locked.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+class PlanningPool:
+    """
+    Worker processes of the sharded planner, started on first use and kept until close(), so a
+    long-running process pays their start-up once instead of on every planning round.
+    """
+
+    def __init__(self, workers=None):
+        """
+        :param workers: Number of worker processes (defaults to the CPU count).
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=planning_context())
+            return self._executor
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+class ShardedPlanner:
+    """
+    Plans very large clusters in groups of hosts on a process pool.
+
+    1. The hosts are split into groups (by a configured key or automatically, see shard_hosts) and every group
+       is planned on its own in a worker process, with the configured strategy.
+    2. A reconciliation pass then handles what could not be solved inside a group: containers of
+       hosts that are still overloaded after their group's plan are placed on the groups with the
+       most aggregate spare capacity (`reconcile_shards` of them), with the load_based engine.
+    """
+
+    def __init__(self, hosts, strategy='load_based', groups=None, shard_size=50, workers=None,
+                 reconcile_shards=2, params=None, pool=None):
+        """
+        :param hosts: List of HostState with the allocation fields filled in, sorted by balance score.
+        :param strategy: Strategy used inside the groups ('load_based' or 'global').
+        :param groups: Dictionary of host name -> group, or None for automatic groups (see shard_hosts).
+        :param shard_size: Hosts per automatic group.
+        :param workers: Number of worker processes (defaults to the CPU count).
+        :param reconcile_shards: Number of groups, by spare capacity, that receive cross-group moves.
+        :param params: Planner settings (see plan_shard).
+        :param pool: Optional PlanningPool kept by the caller; without it a pool is started for this plan only.
+        """
+        self.hosts = [planning_copy(host) for host in hosts]
+        self.by_name = {host.name: host for host in self.hosts}
+        self.strategy = strategy
+        self.shards = shard_hosts(self.hosts, groups, shard_size)
+        self.pool = pool
+        self.workers = pool.workers if pool is not None else workers or os.cpu_count() or 1
+        self.reconcile_shards = reconcile_shards
+        self.params = params or {}
+        self.in_shard = 0
+        self.cross_shard = 0
+
+    def plan(self, candidates):
+        """
+        :param candidates: Migration candidates sorted by priority.
+        :return: List of placements: the in-group placements of every group, then the cross-group ones.
+        """
+        shard_of = {host.name: index for index, shard in enumerate(self.shards) for host in shard}
+        shard_candidates = [[] for _ in self.shards]
+        for candidate in candidates:
+            if candidate['source_host'] in shard_of:
+                shard_candidates[shard_of[candidate['source_host']]].append(candidate)
+
+        jobs = [(shard, shard_candidates[index]) for index, shard in enumerate(self.shards)
+                if shard_candidates[index] and any(_needs_relief(host) for host in shard)]
+        if len(jobs) > 1 and self.workers > 1:
+            arguments = zip(*[(shard, shard_candidates_, self.strategy, self.params) for shard, shard_candidates_ in jobs])
+            if self.pool is not None:
+                results = list(self.pool.executor().map(plan_shard, *arguments))
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs)), mp_context=planning_context()) as executor:
+                    results = list(executor.map(plan_shard, *arguments))
+        else:
+            results = [plan_shard(shard, shard_candidates_, self.strategy, self.params) for shard, shard_candidates_ in jobs]
+
+        placements = []
+        moved = set()
+        moves_out = {}
+        for shard_placements in results:
+            for placement in shard_placements:
+                _project(self.by_name, placement)
+                source = placement['candidate']['source_host']
+                moved.add((source, placement['candidate']['container_id']))
+                moves_out[source] = moves_out.get(source, 0) + 1
+                placements.append(placement)
+        self.in_shard = len(placements)
+
+        # Cross-group reconciliation for the hosts their own group could not relieve
+        residual = [candidate for candidate in candidates
+                    if (candidate['source_host'], candidate['container_id']) not in moved
+                    and candidate['source_host'] in self.by_name
+                    and _needs_relief(self.by_name[candidate['source_host']], moves_out.get(candidate['source_host'], 0))]
+        max_migrations = self.params.get('max_migrations')
+        if residual and (max_migrations is None or len(placements) < max_migrations):
+            sources = {candidate['source_host'] for candidate in residual}
+            receiving = sorted(
+                (index for index, shard in enumerate(self.shards) if not all(host.name in sources for host in shard)),
+                key=lambda index: shard_headroom(self.shards[index]), reverse=True
+            )[:self.reconcile_shards]
+            targets = [host for index in receiving for host in self.shards[index]]
+            engine_hosts = targets + [self.by_name[name] for name in sorted(sources) if self.by_name[name] not in targets]
+            engine = PlacementEngine(engine_hosts, use_numpy=self.params.get('use_numpy', True),
+                                     network_weight=self.params.get('network_weight', 0.0))
+            cross = engine.plan(residual)
+            if max_migrations is not None:
+                cross = cross[:max(0, max_migrations - len(placements))]
+            placements += cross
+            self.cross_shard = len(cross)
+
+        if max_migrations is not None:
+            placements = placements[:max_migrations]
+        return placements
@@ -0,0 +1,401 @@
+import io
+import json
+import random
+import re
+import threading
+import time
+
+GB = 1024 * 1024 * 1024
+MB = 1024 * 1024
+
+class SimulatedContainer:
+    __slots__ = ('vmid', 'name', 'status', 'cores', 'cpu_load', 'memory_used', 'memory_limit', 'usage_usec', 'config_mtime')
+
+    def __init__(self, vmid, name, status, cores, cpu_load, memory_used, memory_limit, rng=random):
+        self.vmid = vmid
+        self.name = name
+        self.status = status
+        self.cores = cores
+        self.cpu_load = cpu_load          # Cores in use
+        self.memory_used = memory_used    # MB
+        self.memory_limit = memory_limit  # MB
+        self.usage_usec = rng.randint(0, 10 ** 12)
+        self.config_mtime = rng.randint(1_600_000_000, 1_700_000_000)  # Of /etc/pve/lxc/<vmid>.conf
+
+class SimulatedHost:
+    __slots__ = ('name', 'address', 'cores', 'memory_total', 'base_memory', 'base_load', 'disk_used', 'disk_total', 'interfaces', 'containers')
+
+    def __init__(self, name, address, cores, memory_total, base_memory, base_load, rng=random):
+        self.name = name
+        self.address = address
+        self.cores = cores
+        self.memory_total = memory_total  # MB
+        self.base_memory = base_memory    # MB used by the host itself
+        self.base_load = base_load        # Load not caused by containers
+        self.disk_used = rng.randint(10, 200)
+        self.disk_total = 500
+        self.interfaces = {'eno1': [rng.randint(0, 10 ** 12), rng.randint(0, 10 ** 12)],
+                           'vmbr0': [rng.randint(0, 10 ** 12), rng.randint(0, 10 ** 12)]}
+        self.containers = {}
+
+    def running(self):
+        return [container for container in self.containers.values() if container.status == 'running']
+
+    def load(self):
+        return self.base_load + sum(container.cpu_load for container in self.running())
+
+    def memory_used(self):
+        return min(self.base_memory + sum(container.memory_used for container in self.running()), self.memory_total)
+
+class SimulatedCluster:
+    """
+    Synthetic Proxmox cluster model used to benchmark collection and planning without real hosts.
+    `connect` has the signature of `functions.ssh_connect` and returns FakeSSHClient objects that
+    answer the commands the balancer runs from this model, with configurable latency.
+    """
+
+    def __init__(self, hosts=3, containers=30, seed=0, hot_fraction=0.2, latency=0.0, command_latency=None, handshake_latency=0.0):
+        """
+        :param hosts: Number of hosts.
+        :param containers: Total number of containers, spread over the hosts (hot hosts get more).
+        :param seed: Random seed, so runs are reproducible.
+        :param hot_fraction: Fraction of hosts that receive a larger share of containers.
+        :param latency: Default latency of every command in seconds.
+        :param command_latency: Dictionary of command kind (see FakeSSHClient.classify) -> latency.
+        :param handshake_latency: Latency of every SSH connection in seconds.
+        """
+        rng = self.rng = random.Random(seed)
+        self.latency = latency
+        self.command_latency = command_latency or {}
+        self.handshake_latency = handshake_latency
+        self.host_latency = {}  # Host name -> extra latency of every command on that host (e.g. a hung node)
+        self.calls = {}
+        self.handshakes = 0
+        self.full_records = 0  # Full records written by the streaming agents (not remote calls)
+        self._lock = threading.Lock()
+
+        self.hosts = {}
+        for i in range(hosts):
+            name = f"pve{i + 1}"
+            host = SimulatedHost(
+                name,
+                f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+                cores=rng.choice((16, 32, 64)),
+                memory_total=rng.choice((65536, 131072, 262144)),
+                base_memory=rng.randint(2048, 8192),
+                base_load=rng.uniform(0.1, 1.0),
+                rng=rng
+            )
+            self.hosts[name] = host
+        self.by_address = {host.address: host for host in self.hosts.values()}
+
+        names = list(self.hosts)
+        hot = names[:max(1, int(len(names) * hot_fraction))]
+        for index in range(containers):
+            host = self.hosts[rng.choice(hot) if rng.random() < 0.4 else rng.choice(names)]
+            limit = rng.choice((512, 1024, 2048, 4096, 8192))
+            host.containers[str(100 + index)] = SimulatedContainer(
+                str(100 + index),
+                f"ct{100 + index}",
+                'running' if rng.random() < 0.9 else 'stopped',
+                cores=rng.choice((1, 1, 2, 2, 4)),
+                cpu_load=round(rng.uniform(0.0, 1.5), 2),
+                memory_used=rng.randint(limit // 8, limit),
+                memory_limit=limit,
+                rng=rng
+            )
+
+    def hosts_config(self, load_per_core=None, memory_threshold=None):
+        """
+        :param load_per_core: If set, each host's cpu_threshold is its core count times this value.
+        :param memory_threshold: If set, the memory_threshold of every host.
+        :return: `proxmox_hosts` configuration entries for the simulated hosts.
+        """
+        entries = []
+        for host in self.hosts.values():
+            entry = {'name': host.name, 'address': host.address, 'user': 'root', 'password': 'simulated'}
+            if load_per_core is not None:
+                entry['cpu_threshold'] = host.cores * load_per_core
+            if memory_threshold is not None:
+                entry['memory_threshold'] = memory_threshold
+            entries.append(entry)
+        return entries
+
+    def connect(self, host, user, password=None, key_path=None):
+        if self.handshake_latency:
+            time.sleep(self.handshake_latency)
+        with self._lock:
+            self.handshakes += 1
+        return FakeSSHClient(self, self.by_address[host])
+
+    def record(self, kind):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.handshakes = 0
+            self.full_records = 0
+
+    def advance(self, seconds=1.0, jitter=0.2):
+        """
+        Let simulated time pass: counters grow and container loads drift.
+        """
+        for host in self.hosts.values():
+            for counters in host.interfaces.values():
+                counters[0] += int(self.rng.uniform(1, 50) * MB * seconds)
+                counters[1] += int(self.rng.uniform(1, 50) * MB * seconds)
+            for container in host.running():
+                container.usage_usec += int(container.cpu_load * seconds * 1_000_000)
+                container.cpu_load = max(0.0, round(container.cpu_load * self.rng.uniform(1 - jitter, 1 + jitter), 2))
+
+    def cluster_resources(self):
+        """
+        :return: The model as a Proxmox /cluster/resources document.
+        """
+        resources = []
+        for host in self.hosts.values():
+            resources.append({
+                'type': 'node', 'node': host.name, 'status': 'online',
+                'cpu': min(host.load() / host.cores, 1.0), 'maxcpu': host.cores,
+                'mem': host.memory_used() * MB, 'maxmem': host.memory_total * MB,
+                'disk': host.disk_used * GB, 'maxdisk': host.disk_total * GB
+            })
+            for container in host.containers.values():
+                resources.append({
+                    'type': 'lxc', 'node': host.name, 'vmid': int(container.vmid), 'name': container.name,
+                    'status': container.status, 'maxcpu': container.cores,
+                    'cpu': container.cpu_load / container.cores if container.status == 'running' else 0,
+                    'mem': container.memory_used * MB if container.status == 'running' else 0,
+                    'maxmem': container.memory_limit * MB
+                })
+        return resources
+
+class FakeSSHClient:
+    """
+    Stand-in for paramiko.SSHClient that answers the balancer's commands from a SimulatedCluster.
+    """
+    _VMID = re.compile(r'pct (?:exec|config|migrate) (\d+)')
+    _AWK_FIELDS = re.compile(r"awk '\{print ([^}]*)\}'")
+
+    def __init__(self, cluster, host):
+        self.cluster = cluster
+        self.host = host
+        self.active = True
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+    def open_session(self):
+        return FakeChannel(self)
+
+    def close(self):
+        self.active = False
+
+    @staticmethod
+    def classify(command):
+        """
+        :return: Short name of the command kind, used for latency settings and call counters.
+        """
+        if 'while :; do' in command:
+            return 'stream'
+        if command.startswith("echo '@@cpu_cores'"):
+            return 'host_batch'
+        if '@@cpu0' in command:
+            return 'cgroup_batch'
+        if command.startswith('pvesh get /cluster/resources'):
+            return 'pvesh'
+        if command.startswith('stat -c'):
+            return 'config_mtimes'
+        for kind in ('pct exec', 'pct config', 'pct list', 'pct migrate', 'nproc', 'free', 'df', 'loadavg', 'net/dev'):
+            if kind in command:
+                return kind.replace(' ', '_').replace('/', '_')
+        return 'other'
+
+    def exec_command(self, command, timeout=None):
+        kind = self.classify(command)
+        self.cluster.record(kind)
+        latency = self.cluster.command_latency.get(kind, self.cluster.latency) + self.cluster.host_latency.get(self.host.name, 0.0)
+        if timeout is not None and latency > timeout:
+            # Like a paramiko channel that stays silent past its timeout
+            time.sleep(timeout)
+            raise TimeoutError(f"{kind} on {self.host.name} timed out")
+        if latency:
+            time.sleep(latency)
+        output, error = self._answer(kind, command)
+        if '@@exit' in command:
+            # `<command> 2>&1; echo "@@exit $?"`
+            output = f"{output}{error}\n@@exit {1 if error else 0}\n"
+            error = ''
+        return io.BytesIO(), io.BytesIO(output.encode()), io.BytesIO(error.encode())
+
+    def _awk(self, command, line):
+        # Apply the `awk '{print $a, $b}'` at the end of a command to a line of output
+        match = self._AWK_FIELDS.findall(command)
+        if not match:
+            return line
+        fields = line.split()
+        selected = []
+        for field in match[-1].split(','):
+            index = int(field.strip().lstrip('$'))
+            selected.append(fields[index - 1] if index <= len(fields) else '')
+        return ' '.join(selected)
+
+    def _free_line(self, used, total):
+        return f"Mem: {total} {used} {total - used} 0 0 {total - used}"
+
+    def _loadavg_line(self, load):
+        return f"{load:.2f} {load * 0.9:.2f} {load * 0.8:.2f} 1/500 12345"
+
+    def _netdev_lines(self):
+        return [f"{iface}: {rx} 0 0 0 0 0 0 0 {tx} 0 0 0 0 0 0 0" for iface, (rx, tx) in self.host.interfaces.items()]
+
+    def _pct_list(self):
+        return '\n'.join(f"{c.vmid} {c.status} {c.name}" for c in self.host.containers.values())
+
+    def _config_mtimes(self):
+        return '\n'.join(f"{c.config_mtime} /etc/pve/lxc/{c.vmid}.conf" for c in self.host.containers.values())
+
+    def _answer(self, kind, command):
+        host = self.host
+        if kind == 'host_batch':
+            return '\n'.join([
+                '@@cpu_cores', str(host.cores),
+                '@@loadavg', self._loadavg_line(host.load()),
+                '@@free', '              total        used', self._free_line(host.memory_used(), host.memory_total),
+                '@@df', f"/dev/mapper/pve-root {host.disk_total}G {host.disk_used}G {host.disk_total - host.disk_used}G 10% /",
+                '@@netdev', *self._netdev_lines(),
+                '@@containers', self._pct_list(),
+                '@@confmtime', self._config_mtimes(),
+                '@@end'
+            ]) + '\n', ''
+        if kind == 'cgroup_batch':
+            return self._cgroup_output(command), ''
+        if kind == 'pvesh':
+            return json.dumps(self.cluster.cluster_resources()), ''
+        if kind == 'nproc':
+            return str(host.cores), ''
+        if kind == 'loadavg' and 'pct exec' not in command:
+            return self._awk(command, self._loadavg_line(host.load())), ''
+        if kind == 'free':
+            return self._awk(command, self._free_line(host.memory_used(), host.memory_total)), ''
+        if kind == 'df':
+            return self._awk(command, f"/dev/mapper/pve-root {host.disk_total}G {host.disk_used}G {host.disk_total - host.disk_used}G 10% /"), ''
+        if kind == 'net_dev':
+            if '{print $1}' in command:
+                return '\n'.join(host.interfaces), ''
+            iface = re.search(r"/\^(\w+)/", command).group(1)
+            rx, tx = host.interfaces.get(iface, (0, 0))
+            return f"{iface}: {rx} {tx}", ''
+        if kind == 'pct_list':
+            return self._pct_list(), ''
+        if kind == 'config_mtimes':
+            return self._config_mtimes(), ''
+
+        match = self._VMID.search(command)
+        container = host.containers.get(match.group(1)) if match else None
+        if container is None:
+            return '', f"Configuration file 'nodes/{host.name}/lxc/{match.group(1) if match else '?'}.conf' does not exist"
+        if kind == 'pct_config':
+            return self._awk(command, f"cores: {container.cores}"), ''
+        if kind == 'pct_exec':
+            if container.status != 'running':
+                return '', f"CT {container.vmid} not running"
+            if 'loadavg' in command:
+                return self._awk(command, self._loadavg_line(container.cpu_load)), ''
+            return self._awk(command, self._free_line(container.memory_used, container.memory_limit)), ''
+        if kind == 'pct_migrate':
+            return self._migrate(container, command)
+        return '', f"unknown command: {command}"
+
+    def _cgroup_output(self, command):
+        interval = float(re.search(r'sleep ([\d.]+)', command).group(1))
+        running = self.host.running()
+        uptime = 1_000_000.0
+        lines = ['@@t0', f"{uptime:.2f} 0", '@@cpu0']
+        lines += [f"{c.vmid}/cpu.stat:usage_usec {c.usage_usec}" for c in running]
+        lines += ['@@t1', f"{uptime + interval:.2f} 0", '@@cpu1']
+        lines += [f"{c.vmid}/cpu.stat:usage_usec {c.usage_usec + int(c.cpu_load * interval * 1_000_000)}" for c in running]
+        lines.append('@@memory')
+        for c in running:
+            lines.append(f"{c.vmid}/memory.current:{c.memory_used * MB}")
+            lines.append(f"{c.vmid}/memory.max:{c.memory_limit * MB}")
+        lines.append('@@config')
+        for c in self.host.containers.values():
+            lines.append(f"/etc/pve/lxc/{c.vmid}.conf:cores: {c.cores}")
+            lines.append(f"/etc/pve/lxc/{c.vmid}.conf:memory: {c.memory_limit}")
+        lines.append('@@end')
+        return '\n'.join(lines) + '\n'
+
+    def _migrate(self, container, command):
+        target_name = command.split()[3]
+        target = self.cluster.hosts.get(target_name)
+        if target is None:
+            return '', f"no such cluster node '{target_name}'"
+        del self.host.containers[container.vmid]
+        target.containers[container.vmid] = container
+        container.config_mtime = int(time.time())  # The config file moves to the target node
+        return f"migration finished successfully (CT {container.vmid} -> {target_name})", ''
+
+class FakeChannel:
+    """
+    Stand-in for a paramiko session channel running the streaming agent: every `interval`
+    seconds readline() returns a record built from the current state of the simulated host.
+    Like the agent, it only writes a full record (counted in full_records) every `full_every`
+    records or when the running containers change.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.command = None
+        self.interval = 1.0
+        self.full_every = 1
+        self.countdown = 0
+        self.running = None
+        self.closed = threading.Event()
+
+    def exec_command(self, command):
+        self.client.cluster.record(FakeSSHClient.classify(command))
+        self.command = command
+        match = re.search(r'sleep ([\d.]+)', command)
+        self.interval = float(match.group(1)) if match else 1.0
+        match = re.search(r'every=(\d+)', command)
+        self.full_every = int(match.group(1)) if match else 1
+
+    def makefile(self, mode='r', bufsize=-1):
+        return self
+
+    def readline(self):
+        if self.closed.wait(self.interval) or not self.client.active:
+            return b''
+        running = sorted(c.vmid for c in self.client.host.running())
+        cgroups = self.client._cgroup_output(self.command)
+        if self.countdown <= 0 or running != self.running:
+            with self.client.cluster._lock:
+                self.client.cluster.full_records += 1
+            self.countdown = self.full_every
+            self.running = running
+            output = '@@full\n' + self.client._answer('host_batch', '')[0] + cgroups
+        else:
+            host = self.client.host
+            output = '\n'.join([
+                '@@loadavg', self.client._loadavg_line(host.load()),
+                '@@meminfo', f"MemTotal: {host.memory_total * 1024} kB", f"MemAvailable: {(host.memory_total - host.memory_used()) * 1024} kB",
+                '@@netdev', *self.client._netdev_lines(), ''
+            ]) + cgroups.split('@@config')[0] + '@@end\n'
+        self.countdown -= 1
+        return output.rstrip('\n').replace('\n', '\x1e').encode() + b'\n'
+
+    def close(self):
+        self.closed.set()
+
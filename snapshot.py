@@ -0,0 +1,257 @@
+import math
+import os
+import struct
+import time
+import zlib
+from array import array
+from model import ContainerState, HostState
+
+MAGIC = b'PCBS'
+VERSION = 1
+_HEADER = struct.Struct('<4sHd')  # magic, version, saved at (wall clock)
+_HOST = struct.Struct('<Iddddqqqq')  # cores, load 1/5/15, network utilization, memory used/total, disk used/total
+_CONTAINER = struct.Struct('<idqqq')  # cores, cpu load, memory used/total, config mtime (-1 / NaN = unknown)
+_COUNTERS = struct.Struct('<QQ')
+_NETWORK = struct.Struct('<QQd')
+_CONFIG = struct.Struct('<qi')
+_EWMA = struct.Struct('<d')
+_COUNT = struct.Struct('<I')
+
+class _Writer:
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, fmt, *values):
+        self.parts.append(fmt.pack(*values))
+
+    def count(self, value):
+        self.parts.append(_COUNT.pack(value))
+
+    def text(self, value):
+        data = str(value).encode()
+        self.count(len(data))
+        self.parts.append(data)
+
+    def floats(self, values):
+        self.count(len(values))
+        self.parts.append(array('d', values).tobytes())
+
+    def getvalue(self):
+        return b''.join(self.parts)
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def count(self):
+        return self.unpack(_COUNT)[0]
+
+    def text(self):
+        size = self.count()
+        value = self.data[self.offset:self.offset + size].decode()
+        self.offset += size
+        return value
+
+    def floats(self):
+        size = self.count()
+        values = array('d')
+        values.frombytes(self.data[self.offset:self.offset + 8 * size])
+        self.offset += 8 * size
+        return values.tolist()
+
+def _optional(value, missing):
+    return missing if value is None else value
+
+def _value(value, missing):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return None if value == missing else value
+
+class ClusterSnapshot:
+    """
+    Cluster state as saved at the end of a cycle: the collected hosts and containers, the
+    configured cores of every container with the modification time of its config file, the
+    metrics history and the network counters.
+    """
+
+    def __init__(self, saved_at, hosts, configs=None, history=None, network=None):
+        """
+        :param saved_at: Wall clock time the snapshot was taken.
+        :param hosts: Dictionary of host name -> HostState (without connection or thresholds).
+        :param configs: Dictionary of (host, vmid) -> (config mtime, cores) (see ContainerMetricsCache.configs).
+        :param history: Dictionary of series key -> (samples, EWMA) (see MetricsHistory.state).
+        :param network: Dictionary of (host, interface) -> (rx_bytes, tx_bytes, timestamp) (see NetworkRateSampler.state).
+        """
+        self.saved_at = saved_at
+        self.hosts = hosts
+        self.configs = configs or {}
+        self.history = history or {}
+        self.network = network or {}
+
+    @property
+    def age(self):
+        return time.time() - self.saved_at
+
+def save_snapshot(path, hosts, cache=None, history=None, network=None):
+    """
+    Write a compact binary snapshot of the cluster state. The file is replaced atomically.
+    :param path: Snapshot file.
+    :param hosts: Dictionary of host name -> HostState. Stale hosts are saved with the data they had.
+    :param cache: Optional ContainerMetricsCache whose config entries are saved.
+    :param history: Optional MetricsHistory. It is not saved when it lives in memory-mapped files already.
+    :param network: Optional NetworkRateSampler.
+    :return: Size of the snapshot in bytes.
+    """
+    writer = _Writer()
+    writer.count(len(hosts))
+    for host in hosts.values():
+        writer.text(host.name)
+        writer.text(host.address)
+        writer.pack(_HOST, host.cpu_cores, host.load_1, host.load_5, host.load_15, host.network_utilization,
+                    host.memory_used, host.memory_total, host.disk_used, host.disk_total)
+        writer.count(len(host.network))
+        for iface, (rx_bytes, tx_bytes) in host.network.items():
+            writer.text(iface)
+            writer.pack(_COUNTERS, rx_bytes, tx_bytes)
+        writer.count(len(host.containers))
+        for container in host.containers:
+            for value in (container.vmid, container.name, container.status, container.lock):
+                writer.text(value)
+            writer.pack(_CONTAINER, _optional(container.cores, -1), _optional(container.cpu_load, math.nan),
+                        _optional(container.memory_used, -1), _optional(container.memory_total, -1),
+                        _optional(container.config_mtime, -1))
+
+    configs = cache.configs() if cache is not None else {}
+    writer.count(len(configs))
+    for (host_name, vmid), (mtime, cores) in configs.items():
+        writer.text(host_name)
+        writer.text(vmid)
+        writer.pack(_CONFIG, mtime, cores)
+
+    series = history.state() if history is not None and not history.directory else {}
+    writer.count(len(series))
+    for key, (values, ewma) in series.items():
+        writer.count(len(key))
+        for part in key:
+            writer.text(part)
+        writer.pack(_EWMA, _optional(ewma, math.nan))
+        writer.floats(values)
+
+    counters = network.state() if network is not None else {}
+    writer.count(len(counters))
+    for (host_name, iface), (rx_bytes, tx_bytes, timestamp) in counters.items():
+        writer.text(host_name)
+        writer.text(iface)
+        writer.pack(_NETWORK, rx_bytes, tx_bytes, timestamp)
+
+    data = _HEADER.pack(MAGIC, VERSION, time.time()) + zlib.compress(writer.getvalue())
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+    return len(data)
+
+def load_snapshot(path):
+    """
+    Read a snapshot written by save_snapshot.
+    :param path: Snapshot file.
+    :return: ClusterSnapshot, or None if the file is missing, from another version or unreadable.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, saved_at = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+        reader = _Reader(zlib.decompress(data[_HEADER.size:]))
+    except (OSError, struct.error, zlib.error):
+        return None
+
+    hosts = {}
+    for _ in range(reader.count()):
+        name = reader.text()
+        address = reader.text()
+        cores, load_1, load_5, load_15, utilization, memory_used, memory_total, disk_used, disk_total = reader.unpack(_HOST)
+        network = {}
+        for _ in range(reader.count()):
+            iface = reader.text()
+            network[iface] = reader.unpack(_COUNTERS)
+        containers = []
+        for _ in range(reader.count()):
+            vmid, container_name, status, lock = reader.text(), reader.text(), reader.text(), reader.text()
+            container_cores, cpu_load, container_memory_used, container_memory_total, mtime = reader.unpack(_CONTAINER)
+            containers.append(ContainerState(
+                vmid, container_name, status, lock, _value(container_cores, -1), _value(cpu_load, None),
+                _value(container_memory_used, -1), _value(container_memory_total, -1), _value(mtime, -1)
+            ))
+        host = HostState(name, address, None, 0.0, 0.0, cpu_cores=cores, load_1=load_1, load_5=load_5, load_15=load_15,
+                         memory_used=memory_used, memory_total=memory_total, disk_used=disk_used, disk_total=disk_total,
+                         network=network, containers=containers)
+        host.network_utilization = utilization
+        hosts[name] = host
+
+    configs = {}
+    for _ in range(reader.count()):
+        host_name, vmid = reader.text(), reader.text()
+        configs[(host_name, vmid)] = reader.unpack(_CONFIG)
+
+    history = {}
+    for _ in range(reader.count()):
+        key = tuple(reader.text() for _ in range(reader.count()))
+        ewma = reader.unpack(_EWMA)[0]
+        history[key] = (reader.floats(), None if math.isnan(ewma) else ewma)
+
+    network = {}
+    for _ in range(reader.count()):
+        host_name, iface = reader.text(), reader.text()
+        network[(host_name, iface)] = reader.unpack(_NETWORK)
+
+    return ClusterSnapshot(saved_at, hosts, configs, history, network)
+
+def restore_snapshot(snapshot, hosts_config, default_params, cache=None, history=None, network=None):
+    """
+    Warm start from a snapshot: fill the cache, history and network sampler, and rebuild the hosts
+    that are still configured. The hosts are marked stale: they can be reported right away, but are
+    not planned with until they have been collected again.
+    :param snapshot: ClusterSnapshot from load_snapshot.
+    :param hosts_config: List of HostConfig (see config.compile_config).
+    :param default_params: Default parameters from the configuration.
+    :return: Dictionary of host name -> stale HostState, in configuration order.
+    """
+    if cache is not None:
+        cache.restore_configs(snapshot.configs)
+    if history is not None:
+        history.restore(snapshot.history)
+    if network is not None:
+        network.restore(snapshot.network)
+
+    hosts = {}
+    for entry in hosts_config:
+        saved = snapshot.hosts.get(entry['name'])
+        if saved is None:
+            continue
+        host = HostState(
+            saved.name,
+            entry['address'],
+            {key: entry.get(key) for key in ('name', 'address', 'user', 'password', 'key_path')},
+            entry.cpu_threshold,
+            entry.memory_threshold,
+            cpu_cores=saved.cpu_cores, load_1=saved.load_1, load_5=saved.load_5, load_15=saved.load_15,
+            memory_used=saved.memory_used, memory_total=saved.memory_total,
+            disk_used=saved.disk_used, disk_total=saved.disk_total,
+            network=saved.network, containers=saved.containers,
+            network_threshold=entry.network_threshold,
+            network_capacity=entry.network_capacity_mbps
+        )
+        host.network_utilization = saved.network_utilization
+        host.stale = True
+        hosts[host.name] = host
+    return hosts
@@ -0,0 +1,204 @@
+import logging
+import threading
+import time
+from collectors import Collector
+from functions import streaming_agent_script, parse_stream_record, build_host_state, build_container_state
+from instrumentation import METRICS
+
+class HostStream:
+    """
+    Long-lived metrics stream of one host.
+    The agent script is started once on its own channel of the pooled SSH transport; a reader
+    thread keeps the latest record line, prefixed with the latest full record so the container
+    list and configuration it carries stay known between full records. When the channel breaks
+    the stream is restarted after `retry` seconds.
+    """
+
+    def __init__(self, pool, host, script, logger=None, retry=5.0, clock=time.monotonic):
+        """
+        :param pool: SSHConnectionPool the channel is opened on.
+        :param host: Host entry from the configuration.
+        :param script: Agent script (see functions.streaming_agent_script).
+        :param logger: Logger instance.
+        :param retry: Seconds to wait before restarting a broken stream.
+        :param clock: Monotonic clock function, replaceable for testing.
+        """
+        self.pool = pool
+        self.host = host
+        self.script = script
+        self.logger = logger or logging.getLogger(__name__)
+        self.retry = retry
+        self._clock = clock
+        self._stop = threading.Event()
+        self._first = threading.Event()
+        self._lock = threading.Lock()
+        self._channel = None
+        self.line = None
+        self.full = None
+        self.received = None
+        self.records = 0
+        self.restarts = 0
+        self._thread = threading.Thread(target=self._run, name=f"stream-{host['name']}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            channel = None
+            try:
+                channel = self.pool.open_channel(self.host)
+                with self._lock:
+                    self._channel = channel
+                    self.full = None
+                channel.exec_command(self.script)
+                stream = channel.makefile('rb')
+                self.logger.info(f"📡 Streaming metrics from {self.host['name']}")
+                previous = self._clock()
+                while not self._stop.is_set():
+                    line = stream.readline()
+                    if not line:
+                        break
+                    now = self._clock()
+                    METRICS.observe_command(self.host['name'], 'stream_record', now - previous, len(line))
+                    previous = now
+                    line = (line.decode() if isinstance(line, bytes) else line).rstrip('\n')
+                    with self._lock:
+                        if line.startswith('@@full'):
+                            self.full = line
+                            self.line = line
+                        elif self.full is not None:
+                            self.line = f"{self.full}\x1e{line}"
+                        else:
+                            continue  # The agent starts with a full record; wait for it
+                        self.received = now
+                        self.records += 1
+                    self._first.set()
+            except Exception as e:
+                if not self._stop.is_set():
+                    self.logger.error(f"❌ Metrics stream of {self.host['name']} failed: {str(e)}")
+                    METRICS.observe_command(self.host['name'], 'stream_record', 0.0, error=True)
+                    self.pool.discard(self.host)
+            finally:
+                with self._lock:
+                    self._channel = None
+                if channel is not None:
+                    _safe_close(channel)
+            if not self._stop.is_set():
+                self.restarts += 1
+                self._stop.wait(self.retry)
+
+    def latest(self):
+        """
+        :return: Tuple of (record line, age in seconds), or (None, None) before the first record.
+        """
+        with self._lock:
+            if self.line is None:
+                return None, None
+            return self.line, self._clock() - self.received
+
+    def wait_first(self, timeout):
+        return self._first.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            channel = self._channel
+        if channel is not None:
+            _safe_close(channel)  # Unblocks the reader
+        self._thread.join(timeout=5)
+
+def _safe_close(channel):
+    try:
+        channel.close()
+    except Exception:
+        pass
+
+class StreamingCollector(Collector):
+    """
+    Collects the cluster from persistent per-host metric streams instead of polling.
+    The first collect() starts the agent on every host; afterwards collect() only parses the
+    latest record of each stream, so a cycle sends no remote commands at all. Host and container
+    metrics come in the same record, so no per-container fetch is needed either.
+    """
+    name = 'stream'
+
+    def __init__(self, default_params, pool, logger=None):
+        """
+        :param default_params: Default parameters from the configuration (`stream_interval`, `stream_max_age`,
+                               `stream_full_interval`).
+        :param pool: SSHConnectionPool the streams are opened on.
+        :param logger: Logger instance.
+        """
+        self.default_params = default_params
+        self.pool = pool
+        self.logger = logger or logging.getLogger(__name__)
+        self.interval = default_params.get('stream_interval', 1.0)
+        self.max_age = default_params.get('stream_max_age', max(self.interval * 5, 10))
+        full_every = round(default_params.get('stream_full_interval', 60) / self.interval)
+        self.script = streaming_agent_script(self.interval, full_every=full_every)
+        self.streams = {}
+
+    def start(self, hosts):
+        """
+        Start the streams of the hosts that do not have one yet.
+        """
+        for host in hosts:
+            if host['name'] not in self.streams:
+                stream = HostStream(self.pool, host, self.script, self.logger, retry=self.default_params.get('stream_retry', 5.0))
+                self.streams[host['name']] = stream
+                stream.start()
+
+    def collect(self, hosts):
+        self.start(hosts)
+        # Right after start-up, give every stream the time to deliver its first record
+        deadline = time.monotonic() + self.interval + self.default_params.get('stream_start_timeout', 10)
+        for host in hosts:
+            self.streams[host['name']].wait_first(max(0.0, deadline - time.monotonic()))
+
+        states = {}
+        for host in hosts:
+            line, age = self.streams[host['name']].latest()
+            if line is None:
+                self.logger.error(f"❌ No metrics received yet from {host['name']}")
+                continue
+            if age > self.max_age:
+                self.logger.error(f"❌ Metrics of {host['name']} are {age:.0f}s old, ignoring the host")
+                continue
+            try:
+                states[host['name']] = stream_host_state(host, line, self.default_params)
+            except Exception as e:
+                self.logger.error(f"❌ Invalid metrics record from {host['name']}: {str(e)}")
+        return states
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.stop()
+        self.streams.clear()
+
+    def forget(self, names):
+        # The streams are started again (with the new settings) by the next collect() of the host
+        for name in names:
+            stream = self.streams.pop(name, None)
+            if stream is not None:
+                stream.stop()
+
+def stream_host_state(host, line, default_params):
+    """
+    Build the HostState of a stream record, with the container metrics filled in.
+    :param host: Host entry from the configuration.
+    :param line: Record line (see functions.streaming_agent_script).
+    :param default_params: Default parameters from the configuration.
+    :return: HostState object.
+    """
+    host_metrics, container_metrics = parse_stream_record(line)
+    state = build_host_state(host['name'], host, host_metrics, default_params)
+    containers = []
+    for container in state.containers:
+        metrics = container_metrics.get(container.vmid)
+        if metrics is not None:
+            # No core limit means the container may use all host cores
+            container = build_container_state(container, {'cores': metrics['cores']}, metrics, default_cores=state.cpu_cores) or container
+        containers.append(container)
+    state.containers = containers
+    return state
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The balancer modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import functions
+
+@pytest.fixture
+def command_timeout():
+    """
+    Set the remote command timeout for one test and restore it afterwards.
+    """
+    previous = functions.COMMAND_TIMEOUT
+    yield functions.set_command_timeout
+    functions.COMMAND_TIMEOUT = previous
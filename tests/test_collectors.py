@@ -0,0 +1,118 @@
+import os
+import shutil
+import ssl
+import subprocess
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from collectors import ProxmoxAPICollector, create_collector
+from config import compile_config
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'cluster_resources.json')
+TOKEN_ID = 'balancer@pve!collector'
+TOKEN_SECRET = '8c4b5b0e-3f5d-4a43-9c43-0c5e3e5d2f11'
+
+class ResourcesHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        if self.path != '/api2/json/cluster/resources':
+            self.send_error(404)
+            return
+        with open(FIXTURE, 'rb') as file:
+            body = file.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(context=None):
+    ResourcesHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ResourcesHandler)
+    if context is not None:
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def http_server():
+    server = serve()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def https_server(tmp_path):
+    if shutil.which('openssl') is None:
+        pytest.skip("openssl is not installed")
+    cert, key = tmp_path / 'cert.pem', tmp_path / 'key.pem'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=pve1',
+                    '-keyout', str(key), '-out', str(cert)], check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(cert), str(key))
+    server = serve(context)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def api_config(url, **overrides):
+    return compile_config({
+        'default_params': {'cpu_threshold': 8.0, 'memory_threshold': 0.8, 'collector': 'api'},
+        'proxmox_hosts': [{'name': 'pve1', 'address': '10.0.0.1', 'user': 'root'},
+                          {'name': 'pve2', 'address': '10.0.0.2', 'user': 'root', 'cpu_threshold': 4.0},
+                          {'name': 'pve3', 'address': '10.0.0.3', 'user': 'root'}],
+        'api': {'transport': 'rest', 'url': url, 'token_id': TOKEN_ID, 'token_secret': TOKEN_SECRET, **overrides},
+    })
+
+def test_rest_collector_maps_cluster_resources(http_server):
+    config = api_config(f"http://127.0.0.1:{http_server.server_port}/")
+    collector = create_collector(config, config['default_params'], pool=None)
+    assert isinstance(collector, ProxmoxAPICollector)
+
+    states = collector.collect(config['proxmox_hosts'])
+
+    (path, headers), = ResourcesHandler.requests
+    assert path == '/api2/json/cluster/resources'
+    assert headers['Authorization'] == f"PVEAPIToken={TOKEN_ID}={TOKEN_SECRET}"
+    assert headers['Accept'] == 'application/json'
+
+    # pve3 is offline
+    assert list(states) == ['pve1', 'pve2']
+    pve1, pve2 = states['pve1'], states['pve2']
+    assert (pve1.cpu_cores, pve1.load_1, pve1.memory_used, pve1.memory_total) == (16, 4.0, 32768, 65536)
+    assert (pve2.cpu_cores, pve2.load_1, pve2.memory_used, pve2.memory_total) == (8, 0.5, 8192, 32768)
+    assert (pve1.cpu_threshold, pve2.cpu_threshold) == (8.0, 4.0)
+
+    # Containers only, without templates and VMs
+    assert [container.vmid for container in pve1.containers] == ['101', '102']
+    assert [container.vmid for container in pve2.containers] == ['103']
+    web1, db1 = pve1.containers
+    assert (web1.name, web1.status, web1.cores, web1.cpu_load, web1.memory_used, web1.memory_total) == \
+        ('web1', 'running', 2, 1.0, 1024, 2048)
+    assert (db1.lock, db1.cores, db1.cpu_load) == ('backup', 4, 1.0)
+
+def test_rest_collector_verifies_certificates_by_default(https_server):
+    config = api_config(f"https://127.0.0.1:{https_server.server_port}")
+    collector = create_collector(config, config['default_params'], pool=None)
+
+    with pytest.raises(urllib.error.URLError) as error:
+        collector.collect(config['proxmox_hosts'])
+    assert isinstance(error.value.reason, ssl.SSLCertVerificationError)
+
+def test_rest_collector_accepts_self_signed_certificates_when_verify_ssl_is_off(https_server):
+    config = api_config(f"https://127.0.0.1:{https_server.server_port}", verify_ssl=False)
+    collector = create_collector(config, config['default_params'], pool=None)
+
+    states = collector.collect(config['proxmox_hosts'])
+
+    assert list(states) == ['pve1', 'pve2']
+    (_, headers), = ResourcesHandler.requests
+    assert headers['Authorization'] == f"PVEAPIToken={TOKEN_ID}={TOKEN_SECRET}"
@@ -0,0 +1,92 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from connections import SSHConnectionPool
+from simulator import SimulatedCluster
+from triggers import MigrationExecutor
+
+def running_container(cluster, host_name, index=0):
+    return [container for container in cluster.hosts[host_name].containers.values() if container.status == 'running'][index]
+
+def test_slow_migration_is_not_cut_by_the_command_timeout(command_timeout):
+    cluster = SimulatedCluster(hosts=2, containers=6, command_latency={'pct_migrate': 0.5})
+    command_timeout(0.1)
+    container = running_container(cluster, 'pve1')
+
+    with SSHConnectionPool(connect=cluster.connect) as pool:
+        results = MigrationExecutor(pool, cluster.hosts_config()).run(
+            [{'container_id': container.vmid, 'source_host': 'pve1', 'target_host': 'pve2'}])
+
+    assert results[0]['status'] == 'done'
+    assert results[0]['seconds'] >= 0.5
+    assert container.vmid in cluster.hosts['pve2'].containers
+
+def test_failed_migration_reports_elapsed_time_and_stops_the_plan(command_timeout):
+    cluster = SimulatedCluster(hosts=2, containers=12, command_latency={'pct_migrate': 0.3})
+    command_timeout(0.1)
+    first, second = [container for container in cluster.hosts['pve1'].containers.values() if container.status == 'running'][:2]
+
+    with SSHConnectionPool(connect=cluster.connect) as pool:
+        results = MigrationExecutor(pool, cluster.hosts_config(), max_parallel=1).run([
+            {'container_id': first.vmid, 'source_host': 'pve1', 'target_host': 'nowhere'},
+            {'container_id': second.vmid, 'source_host': 'pve1', 'target_host': 'pve2'},
+        ])
+
+    assert results[0]['status'] == 'failed'
+    assert results[0]['seconds'] >= 0.3
+    assert 'no such cluster node' in results[0]['output']
+    assert results[1]['status'] == 'cancelled'
+    assert second.vmid in cluster.hosts['pve1'].containers
+
+class TrackingExecutor(MigrationExecutor):
+    """
+    Records the highest number of migrations running at once, per source and per target host.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.running = Counter()
+        self.peak = Counter()
+
+    def _run_job(self, job):
+        keys = [('source', job['source_host']), ('target', job['target_host']), ('all', None)]
+        with self.lock:
+            for key in keys:
+                self.running[key] += 1
+                self.peak[key] = max(self.peak[key], self.running[key])
+        try:
+            return super()._run_job(job)
+        finally:
+            with self.lock:
+                for key in keys:
+                    self.running[key] -= 1
+
+@pytest.mark.parametrize('max_per_source', [1, 2])
+def test_migrations_out_of_a_host_respect_max_per_source(max_per_source):
+    cluster = SimulatedCluster(hosts=5, containers=40, command_latency={'pct_migrate': 0.1})
+    moves = [running_container(cluster, 'pve1', i) for i in range(4)]
+
+    with SSHConnectionPool(connect=cluster.connect) as pool:
+        executor = TrackingExecutor(pool, cluster.hosts_config(), max_parallel=4, max_per_source=max_per_source, max_per_target=4)
+        results = executor.run([{'container_id': container.vmid, 'source_host': 'pve1', 'target_host': f"pve{i + 2}"}
+                                for i, container in enumerate(moves)])
+
+    assert [result['status'] for result in results] == ['done'] * 4
+    assert executor.peak[('source', 'pve1')] == max_per_source
+
+@pytest.mark.parametrize('max_per_target', [1, 2])
+def test_migrations_into_a_host_respect_max_per_target(max_per_target):
+    cluster = SimulatedCluster(hosts=5, containers=40, command_latency={'pct_migrate': 0.1})
+    moves = [(f"pve{i}", running_container(cluster, f"pve{i}")) for i in range(1, 5)]
+
+    with SSHConnectionPool(connect=cluster.connect) as pool:
+        executor = TrackingExecutor(pool, cluster.hosts_config(), max_parallel=4, max_per_source=4, max_per_target=max_per_target)
+        results = executor.run([{'container_id': container.vmid, 'source_host': source, 'target_host': 'pve5'}
+                                for source, container in moves])
+
+    assert [result['status'] for result in results] == ['done'] * 4
+    assert executor.peak[('target', 'pve5')] == max_per_target
+    assert all(container.vmid in cluster.hosts['pve5'].containers for _, container in moves)
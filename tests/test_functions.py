@@ -0,0 +1,17 @@
+import os
+
+from functions import read_container_cgroup_metrics
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'lxc')
+
+def test_cgroup_metrics_read_the_current_config_and_not_its_snapshots():
+    containers = read_container_cgroup_metrics(os.path.join(FIXTURES, 'cgroup'), os.path.join(FIXTURES, 'config'))
+
+    assert set(containers) == {'101', '102'}
+    # The snapshot sections configure 8 and 1 cores, 16384 and 512 MB
+    assert containers['101']['cores'] == 2
+    assert containers['102']['cores'] == 4
+    assert containers['101']['memory'] == '512 2048'
+    # No memory limit in the cgroup nor in the current config: the total is the usage
+    assert containers['102']['memory'] == '1024 1024'
+    assert containers['101']['cpu'] == '0.00'
@@ -0,0 +1,26 @@
+from network import COUNTER_32BIT, NetworkRateSampler
+
+GIGABIT = 1_000_000_000 / 8  # Bytes per second at 1000 Mbit/s
+
+def test_counter_close_to_the_32bit_limit_wraps():
+    previous = COUNTER_32BIT - 1000
+    assert NetworkRateSampler.counter_delta(previous, 500, max_delta=GIGABIT) == 1500
+
+def test_counter_drop_that_cannot_be_a_wrap_is_a_reset():
+    # Wrapping from the middle of the 32-bit range would take ~17 s at 1 Gbit/s, not 1 s
+    previous = COUNTER_32BIT // 2 + 1000
+    assert NetworkRateSampler.counter_delta(previous, 500, max_delta=GIGABIT) == 500
+
+def test_counter_drop_is_a_reset_without_a_line_rate():
+    assert NetworkRateSampler.counter_delta(COUNTER_32BIT - 1000, 500) == 500
+
+def test_64bit_counter_drop_is_a_reset():
+    assert NetworkRateSampler.counter_delta(COUNTER_32BIT + 1000, 500, max_delta=10 * COUNTER_32BIT) == 500
+
+def test_sample_uses_the_link_capacity_for_wraps():
+    sampler = NetworkRateSampler()
+    sampler.sample('pve1', {'eth0': (COUNTER_32BIT - 1000, COUNTER_32BIT // 2)}, timestamp=100.0)
+    rates = sampler.sample('pve1', {'eth0': (1000, 2000)}, timestamp=102.0, capacity_mbps=1000)
+
+    # RX wrapped (2000 bytes), TX was reset: half the 32-bit range is too much for 2 s at 1 Gbit/s
+    assert rates == {'eth0': (1000.0, 1000.0)}
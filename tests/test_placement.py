@@ -0,0 +1,55 @@
+import pytest
+
+from model import HostState
+from incremental import IncrementalPlanner
+from placement import NETWORK_MOVES_PER_PLAN, PlacementEngine, np
+from sharding import ShardedPlanner
+
+ENGINES = [pytest.param(False, id='python'),
+           pytest.param(True, id='numpy', marks=pytest.mark.skipif(np is None, reason="NumPy is not installed"))]
+
+def host(name, load=1.0, network_utilization=0.0):
+    state = HostState(name, name, None, cpu_threshold=8.0, memory_threshold=0.8, cpu_cores=16, load_1=load,
+                      memory_used=16384, memory_total=65536)
+    state.network_utilization = network_utilization
+    return state
+
+def candidates(source, count):
+    return [{'container_id': str(100 + i), 'source_host': source, 'container_cpu_load': 0.2,
+             'container_memory': 512, 'container_cores': 1} for i in range(count)]
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+def test_network_only_overload_moves_a_bounded_number_of_containers(use_numpy):
+    hosts = [host('a', network_utilization=0.95), host('b'), host('c')]
+    placements = PlacementEngine(hosts, use_numpy=use_numpy).plan(candidates('a', 10))
+
+    assert len(placements) == NETWORK_MOVES_PER_PLAN
+    assert all(placement['target_host'] != 'a' for placement in placements)
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+def test_cpu_overload_stops_once_the_source_is_relieved(use_numpy):
+    hosts = [host('a', load=9.1, network_utilization=0.95), host('b'), host('c')]
+    placements = PlacementEngine(hosts, use_numpy=use_numpy).plan(candidates('a', 10))
+
+    # 9.1 - 6 x 0.2 is back under the 8.0 threshold
+    assert len(placements) == 6
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+def test_incremental_planner_bounds_network_only_moves(use_numpy):
+    planner = IncrementalPlanner(use_numpy=use_numpy)
+    hosts = [host('a', network_utilization=0.95), host('b'), host('c')]
+
+    for _ in range(2):  # Replanning the unchanged cluster gives the same bounded plan
+        placements = planner.plan(hosts, candidates('a', 10))
+        assert len(placements) == NETWORK_MOVES_PER_PLAN
+
+@pytest.mark.parametrize('use_numpy', ENGINES)
+def test_sharded_planner_does_not_reconcile_relieved_network_sources(use_numpy):
+    hosts = [host('a', network_utilization=0.95), host('b'), host('c'), host('d')]
+    groups = {'a': 'rack1', 'b': 'rack1', 'c': 'rack2', 'd': 'rack2'}
+    planner = ShardedPlanner(hosts, groups=groups, workers=1, params={'use_numpy': use_numpy})
+    placements = planner.plan(candidates('a', 10))
+
+    # The in-group move relieves the source, so reconciliation has nothing left to move
+    assert len(placements) == NETWORK_MOVES_PER_PLAN
+    assert planner.cross_shard == 0
@@ -0,0 +1,77 @@
+import random
+
+from model import HostState
+from planner import GlobalPlanner
+
+def host(name, load, free_memory, cores=16, memory_total=16384):
+    state = HostState(name, name, None, cpu_threshold=8.0, memory_threshold=0.8, cpu_cores=cores, load_1=load,
+                      memory_used=memory_total - free_memory, memory_total=memory_total)
+    state.free_memory = free_memory
+    state.free_cores = cores // 2
+    return state
+
+def container(vmid, source, cpu, memory, cores=1):
+    return {'container_id': vmid, 'source_host': source, 'container_cpu_load': cpu,
+            'container_memory': memory, 'container_cores': cores}
+
+def assert_runs_in_order(hosts, placements):
+    # Replay the plan one migration at a time: every target must have room when its move runs
+    free_memory = {host.name: host.free_memory for host in hosts}
+    free_cores = {host.name: host.free_cores for host in hosts}
+    location = {}
+    for placement in placements:
+        candidate, target = placement['candidate'], placement['target_host']
+        assert free_memory[target] >= candidate['container_memory']
+        assert free_cores[target] >= candidate['container_cores']
+        assert (placement['free_memory'], placement['free_cores']) == (free_memory[target], free_cores[target])
+        source = location.get(candidate['container_id'], candidate['source_host'])
+        free_memory[source] += candidate['container_memory']
+        free_cores[source] += candidate['container_cores']
+        free_memory[target] -= candidate['container_memory']
+        free_cores[target] -= candidate['container_cores']
+        location[candidate['container_id']] = target
+
+def test_swap_runs_the_leg_that_fits_first():
+    # 'hot' is over its CPU threshold; its container only fits 'cool' once the small one has left
+    hosts = [host('hot', 10.0, free_memory=4096), host('cool', 1.0, free_memory=2048)]
+    candidates = [container('101', 'hot', 4.0, 4096), container('201', 'cool', 0.5, 4096)]
+
+    planner = GlobalPlanner(hosts, candidates)
+    placements = planner.plan()
+
+    assert [(placement['candidate']['container_id'], placement['target_host']) for placement in placements] == \
+        [('201', 'hot'), ('101', 'cool')]
+    assert planner.skipped == 0
+    assert_runs_in_order(hosts, placements)
+
+def test_swap_between_full_hosts_is_not_planned():
+    # Neither host has room for the other's container before its own has left
+    hosts = [host('hot', 10.0, free_memory=0), host('cool', 1.0, free_memory=0)]
+    candidates = [container('101', 'hot', 4.0, 4096), container('201', 'cool', 0.5, 4096)]
+
+    planner = GlobalPlanner(hosts, candidates)
+
+    assert planner.plan() == []
+    assert planner.final_peak == planner.start_peak
+
+def test_moves_that_cannot_be_ordered_are_skipped():
+    hosts = [host('a', 10.0, free_memory=0), host('b', 1.0, free_memory=0)]
+    candidates = [container('101', 'a', 4.0, 4096), container('201', 'b', 0.5, 4096)]
+    planner = GlobalPlanner(hosts, candidates)
+    # A plan that only works if both migrations run at the same time
+    planner._move(0, 1)
+    planner._move(1, 0)
+
+    assert planner._placements() == []
+    assert planner.skipped == 2
+    assert planner.location == planner.origin
+
+def test_global_plans_always_run_in_order():
+    generator = random.Random(7)
+    for _ in range(50):
+        hosts = [host(f"pve{j}", generator.uniform(0.5, 14.0), free_memory=generator.choice([0, 1024, 2048, 4096, 8192]))
+                 for j in range(5)]
+        candidates = [container(f"{j}{i:02d}", f"pve{j}", generator.uniform(0.1, 3.0), generator.choice([512, 1024, 2048, 4096]))
+                      for j in range(5) for i in range(4)]
+        placements = GlobalPlanner(hosts, candidates).plan()
+        assert_runs_in_order(hosts, placements)
@@ -0,0 +1,58 @@
+import logging
+
+import pytest
+
+import main
+from cache import ContainerMetricsCache
+from collectors import create_collector
+from config import compile_config
+from connections import SSHConnectionPool
+from simulator import SimulatedCluster
+
+@pytest.fixture
+def cluster():
+    return SimulatedCluster(hosts=4, containers=40, hot_fraction=0.25)
+
+def collect(cluster, pool, **params):
+    config = compile_config({
+        'default_params': {'cpu_threshold': 1.0, 'memory_threshold': 0.8, 'container_metrics_source': 'cgroup', **params},
+        'proxmox_hosts': cluster.hosts_config(load_per_core=0.02),
+    })
+    default_params = config['default_params']
+    cache = ContainerMetricsCache(ttl=default_params['container_cache_ttl'])
+    collector = create_collector(config, default_params, pool)
+    hosts = main.collect_cluster(collector, config['proxmox_hosts'], default_params, logging.getLogger(__name__), cache)
+    return hosts, default_params, cache
+
+def test_host_timeout_while_fetching_containers_leaves_the_host_out(cluster, command_timeout):
+    command_timeout(0.2)
+    with SSHConnectionPool(connect=cluster.connect) as pool:
+        hosts, default_params, cache = collect(cluster, pool, host_timeout=0.3)
+        cluster.host_latency['pve1'] = 1.0  # The host hangs once its metrics are collected
+
+        suggestions = main.suggest_migrations(hosts, default_params, pool=pool, cache=cache)
+
+    assert hosts['pve1'].stale
+    assert suggestions
+    assert all('pve1' not in (suggestion['source_host'], suggestion['target_host']) for suggestion in suggestions)
+
+def test_candidate_pass_does_not_fetch_the_containers_again(cluster, command_timeout, monkeypatch):
+    command_timeout(0.2)
+    fetched = set()
+    fetch = main.fetch_container_stats
+
+    def fetch_once(pool, host, containers, default_params, cache):
+        # A second fetch of a host would be a remote command outside the first pass's timeout handling
+        if host.name in fetched:
+            raise TimeoutError(f"{host.name} fetched twice")
+        fetched.add(host.name)
+        return fetch(pool, host, containers, default_params, cache)
+
+    monkeypatch.setattr(main, 'fetch_container_stats', fetch_once)
+    with SSHConnectionPool(connect=cluster.connect) as pool:
+        hosts, default_params, cache = collect(cluster, pool, container_cache_ttl=0)
+        for strategy in ('load_based', 'global'):
+            fetched.clear()
+            suggestions = main.suggest_migrations(hosts, {**default_params, 'migration_strategy': strategy}, pool=pool, cache=cache)
+            assert suggestions
+            assert not any(host.stale for host in hosts.values())
@@ -0,0 +1,71 @@
+import pytest
+
+from model import ContainerState, HostState
+from scenario import Scenario, run_scenario
+
+DEFAULT_PARAMS = {'cpu_threshold': 8.0, 'memory_threshold': 0.8, 'placement_engine': 'python'}
+
+def host(name, load, containers, cores=16, memory_total=65536):
+    state = HostState(name, name, None, cpu_threshold=8.0, memory_threshold=0.8, cpu_cores=cores, load_1=load,
+                      memory_used=8192 + sum(container.memory_used for container in containers),
+                      memory_total=memory_total, containers=containers)
+    state.used_cores = sum(container.cores for container in containers)
+    state.free_cores = cores - state.used_cores
+    state.total_container_memory = sum(container.memory_used for container in containers)
+    state.total_container_cpu_load = sum(container.cpu_load for container in containers)
+    state.free_memory = memory_total - state.total_container_memory
+    return state
+
+def containers(first, count):
+    return [ContainerState(str(vmid), status='running', cores=2, cpu_load=1.0, memory_used=2048, memory_total=4096)
+            for vmid in range(first, first + count)]
+
+@pytest.fixture
+def cluster():
+    return {'pve1': host('pve1', 6.0, containers(101, 4)), 'pve2': host('pve2', 6.0, containers(201, 2))}
+
+def snapshot(hosts):
+    return {name: (host.load_signal, host.memory_signal, host.free_memory, host.free_cores, host.used_cores,
+                   host.total_container_memory, host.total_container_cpu_load, [c.vmid for c in host.containers])
+            for name, host in hosts.items()}
+
+def test_evacuation_that_overloads_a_host_is_not_feasible(cluster):
+    before = snapshot(cluster)
+    result = run_scenario(Scenario(cluster, DEFAULT_PARAMS), 'evacuate:pve1')
+
+    # pve2 has the memory for the 4 containers but ends at a load of 10 for a threshold of 8
+    assert result['unplaced'] == [] and result['overcommitted'] == []
+    assert result['newly_overloaded'] == ['pve2']
+    assert not result['feasible']
+    assert snapshot(cluster) == before
+
+def test_added_host_threshold_follows_its_cores(cluster):
+    before = snapshot(cluster)
+    base = Scenario(cluster, DEFAULT_PARAMS)
+    scenario = base.fork('add').add_host('pve9', 32, 131072)
+
+    # Twice the cores of the collected hosts, twice their threshold
+    assert scenario.host('pve9').cpu_threshold == 16.0
+    assert base.host('pve9') is None
+
+    result = run_scenario(base, 'add:pve9:32:131072+evacuate:pve1')
+    assert result['newly_overloaded'] == []
+    assert result['feasible']
+    assert snapshot(cluster) == before
+
+def test_plan_on_a_fork_leaves_the_base_unchanged(cluster):
+    before = snapshot(cluster)
+    base = Scenario(cluster, DEFAULT_PARAMS)
+    suggestions = [{'container_id': '101', 'source_host': 'pve1', 'target_host': 'pve2'}]
+
+    first = base.fork('first')
+    first.apply_plan(suggestions)
+    second = first.fork('second')
+    second.apply_plan([{'container_id': '201', 'source_host': 'pve2', 'target_host': 'pve1'}])
+
+    assert [c.vmid for c in first.host('pve2').containers] == ['201', '202', '101']
+    assert [c.vmid for c in second.host('pve2').containers] == ['202', '101']
+    assert first.host('pve2').load_signal == 7.0
+    assert snapshot(cluster) == before
+    assert run_scenario(base, 'plan', suggestions)['feasible']
+    assert snapshot(cluster) == before
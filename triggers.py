@@ -1,7 +1,181 @@
-def trigger_migration(container_id, source_host, target_host):
-    # Example: Trigger migration of a container to balance load
-    print(f"Triggering migration of container {container_id} from {source_host} to {target_host}")
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functions import run_command
+
+def migration_command(container_id, target_host, online=False, restart=True, timeout=None):
+    """
+    Build the `pct migrate` command line. The exit status is appended as an '@@exit <code>' line.
+    :param online: Pass --online (live migration, where the storage allows it).
+    :param restart: Pass --restart (restart migration: shut down, move, start on the target).
+    :param timeout: Seconds to wait for the container to shut down with --restart.
+    """
+    command = f"pct migrate {container_id} {target_host}"
+    if online:
+        command += " --online"
+    if restart:
+        command += " --restart"
+        if timeout:
+            command += f" --timeout {int(timeout)}"
+    return command + ' 2>&1; echo "@@exit $?"'
+
+def trigger_migration(container_id, source_host, target_host, ssh=None, online=False, restart=True, timeout=None):
+    """
+    Trigger the migration of a container to balance load.
+    Without an SSH connection this is a dry run that only prints the migration.
+    :param ssh: SSH connection to the source host, which runs `pct migrate`. The command is not bounded by the
+                command timeout: a restart or storage migration stays silent for as long as it takes.
+    :return: Tuple of (success, seconds taken, command output).
+    """
+    if ssh is None:
+        print(f"Triggering migration of container {container_id} from {source_host} to {target_host}")
+        return True, 0.0, ''
+
+    start = time.monotonic()
+    output, _ = run_command(ssh, migration_command(container_id, target_host, online, restart, timeout), 'pct_migrate',
+                            bounded=False)
+    lines = output.rstrip().splitlines()
+    status = lines[-1].split()[1] if lines and lines[-1].startswith('@@exit ') else None
+    return status == '0', time.monotonic() - start, '\n'.join(lines[:-1] if status is not None else lines)
 
 def send_alert(host, metric, value, threshold):
     # Example: Send an alert if a metric exceeds the threshold
     print(f"Alert! {host} has exceeded the threshold for {metric}: {value} (Threshold: {threshold})")
+
+class MigrationExecutor:
+    """
+    Runs a list of migration suggestions through a job queue.
+
+    At most `max_parallel` migrations run at once across the cluster, `max_per_source` per source
+    host and `max_per_target` per target host. A migration into a host waits until the planned
+    migrations out of that host are done, so capacity is freed before it is needed (unless the
+    moves form a cycle, e.g. a swap, which then runs in plan order). With `stop_on_failure` the
+    first failed migration cancels every migration that has not started yet.
+    """
+
+    def __init__(self, pool, hosts, max_parallel=2, max_per_source=1, max_per_target=1,
+                 online=False, restart=True, timeout=None, stop_on_failure=True, logger=None):
+        """
+        :param pool: SSHConnectionPool used to reach the source hosts.
+        :param hosts: List of host entries from the configuration.
+        :param online: Pass --online to `pct migrate`.
+        :param restart: Pass --restart to `pct migrate`.
+        :param timeout: Shutdown timeout of restart migrations in seconds.
+        :param stop_on_failure: Cancel the migrations that have not started when one fails.
+        :param logger: Logger instance.
+        """
+        self.pool = pool
+        self.hosts = {host['name']: host for host in hosts}
+        self.max_parallel = max(1, max_parallel)
+        self.max_per_source = max(1, max_per_source)
+        self.max_per_target = max(1, max_per_target)
+        self.online = online
+        self.restart = restart
+        self.timeout = timeout
+        self.stop_on_failure = stop_on_failure
+        self.logger = logger or logging.getLogger(__name__)
+
+    def _run_job(self, job):
+        start = time.monotonic()
+        try:
+            ssh = self.pool.get(self.hosts[job['source_host']])
+            return trigger_migration(job['container_id'], job['source_host'], job['target_host'],
+                                     ssh=ssh, online=self.online, restart=self.restart, timeout=self.timeout)
+        except Exception as e:
+            self.pool.discard(self.hosts[job['source_host']])
+            return False, time.monotonic() - start, str(e) or type(e).__name__
+
+    def _eligible(self, job, running):
+        if sum(1 for other in running if other['source_host'] == job['source_host']) >= self.max_per_source:
+            return False
+        if sum(1 for other in running if other['target_host'] == job['target_host']) >= self.max_per_target:
+            return False
+        return True
+
+    @staticmethod
+    def _waits_for_capacity(job, pending, running):
+        # Migrations out of the target that have not finished yet free capacity this job needs
+        return any(other['source_host'] == job['target_host'] for other in pending + running if other is not job)
+
+    def _next_jobs(self, pending, running):
+        slots = self.max_parallel - len(running)
+        selected = []
+        deferred = []
+        for job in pending:
+            if len(selected) >= slots:
+                break
+            if not self._eligible(job, running + selected):
+                continue
+            if self._waits_for_capacity(job, pending, running + selected):
+                deferred.append(job)
+                continue
+            selected.append(job)
+        if not selected and not running and deferred:
+            # Every job waits for another one (a cycle such as a swap): run in plan order
+            selected.append(deferred[0])
+        return selected
+
+    def run(self, suggestions):
+        """
+        Execute the migrations.
+        :param suggestions: Migration suggestions as returned by suggest_migrations.
+        :return: List of results, one per suggestion, in plan order: the suggestion's container_id,
+                 source_host and target_host plus 'status' ('done', 'failed', 'cancelled' or 'skipped'),
+                 'seconds' and 'output'.
+        """
+        results = []
+        pending = []
+        for suggestion in suggestions:
+            result = {
+                'container_id': suggestion['container_id'],
+                'source_host': suggestion['source_host'],
+                'target_host': suggestion['target_host'],
+                'status': 'pending',
+                'seconds': 0.0,
+                'output': '',
+            }
+            results.append(result)
+            if result['source_host'] not in self.hosts:
+                result['status'] = 'skipped'
+                result['output'] = f"Unknown source host {result['source_host']}"
+            else:
+                pending.append(result)
+
+        total = len(pending)
+        finished = 0
+        failed = False
+        started = time.monotonic()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix='migration') as executor:
+            while pending or running:
+                if not failed:
+                    for job in self._next_jobs(pending, list(running.values())):
+                        pending.remove(job)
+                        job['status'] = 'running'
+                        self.logger.info(f"🚚 Migrating container {job['container_id']} from {job['source_host']} to {job['target_host']}...")
+                        running[executor.submit(self._run_job, job)] = job
+                if not running:
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    success, seconds, output = future.result()
+                    job['status'] = 'done' if success else 'failed'
+                    job['seconds'] = seconds
+                    job['output'] = output
+                    finished += 1
+                    if success:
+                        self.logger.info(f"✅ [{finished}/{total}] Container {job['container_id']} migrated from {job['source_host']} to {job['target_host']} in {seconds:.1f}s")
+                    else:
+                        self.logger.error(f"❌ [{finished}/{total}] Migration of container {job['container_id']} from {job['source_host']} to {job['target_host']} failed after {seconds:.1f}s: {output.strip()[-500:]}")
+                        if self.stop_on_failure and not failed:
+                            failed = True
+                            self.logger.error(f"🛑 Stopping the plan: {len(pending)} pending migrations cancelled")
+
+            for job in pending:
+                job['status'] = 'cancelled'
+
+        done_count = sum(1 for result in results if result['status'] == 'done')
+        self.logger.info(f"🏁 Migration plan finished in {time.monotonic() - started:.1f}s: {done_count}/{len(results)} migrations done")
+        return results
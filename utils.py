@@ -6,15 +6,25 @@ def calculate_load_imbalance(cpu_loads):
 def format_metrics_for_logging(metrics):
     """
     Utility function to format metrics for easier logging.
+    Accepts a metrics dictionary or a typed HostState.
     Masks sensitive information like user and password, only includes container VMIDs.
     """
     formatted_metrics = []
 
-    for key, value in metrics.items():
+    if hasattr(metrics, '__slots__'):
+        items = ((key, getattr(metrics, key)) for key in metrics.__slots__)
+    else:
+        items = metrics.items()
+
+    for key, value in items:
         if key == 'containers' and isinstance(value, list):
             # Only extract vmid from each container
-            container_vmids = [container['vmid'] for container in value if 'vmid' in container]
+            container_vmids = [container.vmid if hasattr(container, 'vmid') else container['vmid']
+                               for container in value if hasattr(container, 'vmid') or 'vmid' in container]
             formatted_metrics.append(f'containers: {container_vmids}')
+        elif key == 'connection':
+            # Connection details hold credentials, never log them
+            continue
         elif key in ['user', 'password']:
             # Mask sensitive information
             formatted_metrics.append(f'{key}: ***')